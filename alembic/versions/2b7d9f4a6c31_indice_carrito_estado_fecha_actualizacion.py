@@ -0,0 +1,28 @@
+"""Indice carritocompra estado y fecha_actualizacion
+
+Revision ID: 2b7d9f4a6c31
+Revises: 8a4c2e6f0b13
+Create Date: 2026-10-18 21:42:09.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7d9f4a6c31'
+down_revision: Union[str, None] = '8a4c2e6f0b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_carritocompra_estado_fecha_actualizacion', 'carritocompra', ['estado', 'fecha_actualizacion'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_carritocompra_estado_fecha_actualizacion', table_name='carritocompra')
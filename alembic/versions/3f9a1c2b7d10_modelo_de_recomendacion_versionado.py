@@ -0,0 +1,58 @@
+"""Modelo de recomendacion versionado
+
+Revision ID: 3f9a1c2b7d10
+Revises: de0b6019ee78
+Create Date: 2026-10-18 09:12:44.103512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2b7d10'
+down_revision: Union[str, None] = 'de0b6019ee78'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('modelorecomendacion',
+    sa.Column('id_modelo', sa.Integer(), nullable=False),
+    sa.Column('version', sa.String(), nullable=True),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+    sa.Column('num_transacciones', sa.Integer(), nullable=False),
+    sa.Column('num_reglas', sa.Integer(), nullable=False),
+    sa.Column('duracion_segundos', sa.Float(), nullable=True),
+    sa.Column('estado', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id_modelo'),
+    sa.UniqueConstraint('version')
+    )
+    op.create_index('ix_modelorecomendacion_id_modelo', 'modelorecomendacion', ['id_modelo'], unique=False)
+    op.create_index('ix_modelorecomendacion_estado', 'modelorecomendacion', ['estado'], unique=False)
+    op.create_table('reglaasociacion',
+    sa.Column('id_regla', sa.Integer(), nullable=False),
+    sa.Column('id_modelo', sa.Integer(), nullable=False),
+    sa.Column('antecedentes', sa.String(), nullable=False),
+    sa.Column('consecuentes', sa.String(), nullable=False),
+    sa.Column('soporte', sa.Float(), nullable=False),
+    sa.Column('confianza', sa.Float(), nullable=False),
+    sa.Column('lift', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['id_modelo'], ['modelorecomendacion.id_modelo'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_regla')
+    )
+    op.create_index('ix_reglaasociacion_id_regla', 'reglaasociacion', ['id_regla'], unique=False)
+    op.create_index('ix_reglaasociacion_id_modelo', 'reglaasociacion', ['id_modelo'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reglaasociacion_id_modelo', table_name='reglaasociacion')
+    op.drop_index('ix_reglaasociacion_id_regla', table_name='reglaasociacion')
+    op.drop_table('reglaasociacion')
+    op.drop_index('ix_modelorecomendacion_estado', table_name='modelorecomendacion')
+    op.drop_index('ix_modelorecomendacion_id_modelo', table_name='modelorecomendacion')
+    op.drop_table('modelorecomendacion')
@@ -0,0 +1,40 @@
+"""Conjuntos frecuentes por modelo
+
+Revision ID: 5d7f3b9e1c24
+Revises: c41d7e9a2f58
+Create Date: 2026-10-18 19:02:13.418206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d7f3b9e1c24'
+down_revision: Union[str, None] = 'c41d7e9a2f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conjuntofrecuente',
+    sa.Column('id_conjunto', sa.Integer(), nullable=False),
+    sa.Column('id_modelo', sa.Integer(), nullable=False),
+    sa.Column('productos', sa.String(), nullable=False),
+    sa.Column('tamano', sa.Integer(), nullable=False),
+    sa.Column('soporte', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['id_modelo'], ['modelorecomendacion.id_modelo'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id_conjunto')
+    )
+    op.create_index('ix_conjuntofrecuente_id_conjunto', 'conjuntofrecuente', ['id_conjunto'], unique=False)
+    op.create_index('ix_conjuntofrecuente_id_modelo', 'conjuntofrecuente', ['id_modelo'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conjuntofrecuente_id_modelo', table_name='conjuntofrecuente')
+    op.drop_index('ix_conjuntofrecuente_id_conjunto', table_name='conjuntofrecuente')
+    op.drop_table('conjuntofrecuente')
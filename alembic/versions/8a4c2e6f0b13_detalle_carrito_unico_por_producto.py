@@ -0,0 +1,48 @@
+"""Detalle de carrito único por producto
+
+Revision ID: 8a4c2e6f0b13
+Revises: 5d7f3b9e1c24
+Create Date: 2026-10-18 20:11:47.302915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a4c2e6f0b13'
+down_revision: Union[str, None] = '5d7f3b9e1c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Los carritos existentes pueden tener el mismo producto repetido: se suman sus cantidades
+    # y subtotales en la fila más antigua y se borran las demás antes de crear la restricción
+    op.execute("""
+        UPDATE detallecarrito AS d
+        SET cantidad = t.cantidad, subtotal = t.subtotal
+        FROM (
+            SELECT MIN(id_detalle_carrito) AS id, SUM(cantidad) AS cantidad, SUM(subtotal) AS subtotal
+            FROM detallecarrito
+            GROUP BY id_carrito, id_producto
+            HAVING COUNT(*) > 1
+        ) AS t
+        WHERE d.id_detalle_carrito = t.id
+    """)
+    op.execute("""
+        DELETE FROM detallecarrito AS d
+        USING detallecarrito AS o
+        WHERE d.id_carrito = o.id_carrito
+          AND d.id_producto = o.id_producto
+          AND d.id_detalle_carrito > o.id_detalle_carrito
+    """)
+    op.create_unique_constraint('uq_detallecarrito_carrito_producto', 'detallecarrito', ['id_carrito', 'id_producto'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_detallecarrito_carrito_producto', 'detallecarrito', type_='unique')
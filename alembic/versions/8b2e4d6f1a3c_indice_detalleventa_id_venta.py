@@ -0,0 +1,28 @@
+"""Indice detalleventa.id_venta
+
+Revision ID: 8b2e4d6f1a3c
+Revises: 3f9a1c2b7d10
+Create Date: 2026-10-18 11:02:17.584213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a3c'
+down_revision: Union[str, None] = '3f9a1c2b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_detalleventa_id_venta', 'detalleventa', ['id_venta'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_detalleventa_id_venta', table_name='detalleventa')
@@ -0,0 +1,28 @@
+"""Indice venta.fecha_venta
+
+Revision ID: c41d7e9a2f58
+Revises: 8b2e4d6f1a3c
+Create Date: 2026-10-18 18:20:41.305127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e9a2f58'
+down_revision: Union[str, None] = '8b2e4d6f1a3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_venta_fecha_venta', 'venta', ['fecha_venta'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_venta_fecha_venta', table_name='venta')
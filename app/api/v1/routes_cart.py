@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from app.db.session import get_db
-from app.services import cart_service
+from app.models.user import User
+from app.services import cart_service, cart_store, cart_sweeper
+from app.services.dependencies import get_current_user_with_permissions
 from app.schemas.cart import CartOut, CartCreate, CartUpdate
-from app.schemas.cart_item import CartItemCreate, CartItemOut, CartItemUpdate
-from typing import List
+from app.schemas.cart_item import CartBulkOperations, CartItemCreate, CartItemOut, CartItemUpdate
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -32,6 +34,15 @@ def add_cart_item(item: CartItemCreate, db: Session = Depends(get_db)):
     """
     return cart_service.add_item_to_cart(db, item)
 
+# 3b. Agregar, cambiar y quitar varios items en un solo request
+@router.post("/{cart_id}/items/bulk", response_model=dict)
+def apply_cart_operations(cart_id: int, data: CartBulkOperations, db: Session = Depends(get_db)):
+    """
+    Aplica una lista de operaciones (agregar, cantidad, quitar) por id de producto en una sola
+    transacción y devuelve el carrito resultante con su subtotal e items.
+    """
+    return cart_service.apply_cart_operations(db, cart_id, data)
+
 # 4. Actualizar un item del carrito
 @router.patch("/cart-items/{item_id}", response_model=dict)
 def update_cart_item(item_id: int, item_data: CartItemUpdate, db: Session = Depends(get_db)):
@@ -68,4 +79,32 @@ def clear_cart_by_user(user_id: int, db: Session = Depends(get_db)):
     try:
         return cart_service.clear_cart_by_user(db, user_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 8. Conciliar los subtotales de los carritos con la suma de sus items
+@router.post("/reconcile", response_model=dict)
+def reconcile_cart_subtotals(
+    cart_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_with_permissions(["admin"]))
+):
+    """
+    Corrige los carritos activos y guardados (o solo cart_id) cuyo subtotal no coincide con sus items (solo admins).
+    """
+    return cart_service.reconcile_cart_subtotals(db, cart_id=cart_id)
+
+# 9. Estado de los carritos en memoria
+@router.get("/store", response_model=dict)
+def get_cart_store_stats(current_user: User = Depends(get_current_user_with_permissions(["admin"]))):
+    """
+    Carritos en memoria, cambios pendientes de escribir y escrituras hechas (solo admins).
+    """
+    return cart_store.stats()
+
+# 10. Métricas del barrido de carritos abandonados
+@router.get("/sweeper", response_model=dict)
+def get_cart_sweeper_stats(current_user: User = Depends(get_current_user_with_permissions(["admin"]))):
+    """
+    Carritos marcados como abandonados, archivados y borrados por el barrido, y su última corrida (solo admins).
+    """
+    return cart_sweeper.stats()
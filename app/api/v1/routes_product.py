@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.product import Product
 from app.schemas.product import ProductCreate, ProductOut, ProductUpdate
+from app.services import product_hydration
 
 router = APIRouter()
 
@@ -11,6 +12,7 @@ def create_product(data: ProductCreate, db: Session = Depends(get_db)):
     product = Product(**data.dict())
     db.add(product)
     db.commit()
+    product_hydration.invalidate()
     db.refresh(product)
     return product
 
@@ -32,6 +34,7 @@ def delete_product(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     db.delete(product)
     db.commit()
+    product_hydration.invalidate()
 
 @router.put("/{product_id}", response_model=ProductOut)
 def update_product(product_id: int, data: ProductUpdate, db: Session = Depends(get_db)):
@@ -44,5 +47,6 @@ def update_product(product_id: int, data: ProductUpdate, db: Session = Depends(g
         setattr(product, key, value)
 
     db.commit()
+    product_hydration.invalidate()
     db.refresh(product)
     return product
\ No newline at end of file
@@ -1,18 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from typing import List, Dict, Any
-from app.db.session import get_db
-from app.services import recommendation_service
+from app.db.session import SessionLocal
+from app.models.user import User
+from app.services import personalization, recommendation_cache, recommendation_executor, recommendation_jobs, recommendation_model, recommendation_service, single_flight
+from app.services.dependencies import get_current_user, get_current_user_with_permissions
 
 router = APIRouter()
 
+MODEL_VERSION_HEADER = "X-Recommendation-Model-Version"
+
+def _train_in_background():
+    try:
+        recommendation_jobs.retrain_rules()
+    except Exception as e:
+        print(f"Error entrenando el modelo de recomendaciones: {str(e)}")
+
+# Se ejecuta en el pool de recomendaciones con su propia sesión (no la del request)
+def _recommend(func, *args, get_model=recommendation_model.get_active_model):
+    db = SessionLocal()
+    try:
+        model = get_model(db)
+        return model, func(db, *args, model=model)
+    finally:
+        db.close()
+
+def _model_headers(model, response: Response):
+    response.headers[MODEL_VERSION_HEADER] = model.version if model else "ninguno"
+    if model is None and not recommendation_model.is_training():
+        # Primer uso sin modelo guardado: lo entrena el planificador, uno a la vez
+        recommendation_jobs.request_retrain("sin modelo")
+
 @router.get("/product/{product_id}", response_model=List[Dict[str, Any]])
-def get_recommendations_for_product(product_id: int, max_recommendations: int = 4, db: Session = Depends(get_db)):
+async def get_recommendations_for_product(product_id: int, response: Response,
+                                          max_recommendations: int = 4):
     """
     Obtiene recomendaciones para un producto específico utilizando el algoritmo Apriori
     """
     try:
-        return recommendation_service.get_recommendations_for_product(db, product_id, max_recommendations)
+        model, recommendations = await recommendation_executor.run(
+            _recommend, recommendation_service.get_recommendations_for_product, product_id, max_recommendations
+        )
+        _model_headers(model, response)
+        return recommendations
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error obteniendo recomendaciones: {str(e)}"
+        )
+
+@router.post("/products", response_model=Dict[int, List[Dict[str, Any]]])
+async def get_recommendations_for_products(product_ids: List[int], response: Response,
+                                           max_recommendations: int = 4):
+    """
+    Obtiene recomendaciones para varios productos en una sola llamada (por ejemplo, una página de categoría)
+    """
+    try:
+        model, recommendations = await recommendation_executor.run(
+            _recommend, recommendation_service.get_recommendations_for_products, product_ids, max_recommendations
+        )
+        _model_headers(model, response)
+        return recommendations
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -22,16 +71,122 @@ def get_recommendations_for_product(product_id: int, max_recommendations: int =
         )
 
 @router.post("/cart", response_model=List[Dict[str, Any]])
-def get_recommendations_for_cart(cart_items: List[int], max_recommendations: int = 4, db: Session = Depends(get_db)):
+async def get_recommendations_for_cart(cart_items: List[int], response: Response,
+                                       max_recommendations: int = 4):
     """
     Obtiene recomendaciones basadas en los productos que ya están en el carrito
     """
     try:
-        return recommendation_service.get_recommendations_for_cart(db, cart_items, max_recommendations)
+        model, recommendations = await recommendation_executor.run(
+            _recommend, recommendation_service.get_recommendations_for_cart, cart_items, max_recommendations
+        )
+        _model_headers(model, response)
+        return recommendations
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error obteniendo recomendaciones para el carrito: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@router.post("/cart/personal", response_model=List[Dict[str, Any]])
+async def get_personalized_recommendations(cart_items: List[int], response: Response,
+                                           max_recommendations: int = 4,
+                                           current_user: User = Depends(get_current_user)):
+    """
+    Recomendaciones para el carrito del usuario autenticado, mezcladas con lo que suele comprar
+    """
+    try:
+        model, recommendations = await recommendation_executor.run(
+            _recommend, recommendation_service.get_personalized_recommendations,
+            current_user.id, cart_items, max_recommendations
+        )
+        _model_headers(model, response)
+        return recommendations
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error obteniendo recomendaciones personalizadas: {str(e)}"
+        )
+
+@router.get("/bundles/{product_id}", response_model=List[Dict[str, Any]])
+async def get_bundles_for_product(product_id: int, response: Response,
+                                  max_bundles: int = 5):
+    """
+    Combos que suelen comprarse junto con el producto (conjuntos frecuentes precalculados),
+    con su soporte y el precio del combo completo
+    """
+    try:
+        model, bundles = await recommendation_executor.run(
+            _recommend, recommendation_service.get_bundles_for_product, product_id, max_bundles,
+            get_model=recommendation_model.get_rule_model
+        )
+        _model_headers(model, response)
+        return bundles
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error obteniendo combos: {str(e)}"
+        )
+
+def _model_info():
+    db = SessionLocal()
+    try:
+        model = recommendation_model.get_active_model(db)
+    finally:
+        db.close()
+    if not model:
+        raise HTTPException(status_code=404, detail="Todavía no hay un modelo de recomendaciones entrenado")
+    store = personalization.get_store()
+    return {
+        **model.info(),
+        "entrenando": recommendation_model.is_training(),
+        "personalizacion": store.info() if store is not None else None,
+    }
+
+@router.get("/model", response_model=Dict[str, Any])
+async def get_model_info():
+    """
+    Devuelve la versión del modelo de reglas que está sirviendo recomendaciones
+    """
+    return await recommendation_executor.run(_model_info)
+
+@router.get("/cache", response_model=Dict[str, Any])
+async def get_cache_stats():
+    """
+    Devuelve el tamaño y la tasa de aciertos de la caché de respuestas de recomendaciones
+    """
+    return recommendation_cache.stats()
+
+@router.get("/executor", response_model=Dict[str, Any])
+async def get_executor_stats():
+    """
+    Devuelve la ocupación del pool de recomendaciones: requests en cola, en curso y rechazados
+    """
+    return recommendation_executor.stats()
+
+@router.get("/coalescing", response_model=Dict[str, Any])
+async def get_coalescing_stats():
+    """
+    Devuelve, por cálculo coalescido (entrenamiento de reglas, ranking de populares), cuántas veces se
+    ejecutó y cuántas llamadas concurrentes esperaron el resultado en curso en lugar de repetirlo
+    """
+    return single_flight.stats()
+
+@router.post("/model/train", status_code=status.HTTP_202_ACCEPTED, response_model=Dict[str, Any])
+def train_model(
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user_with_permissions(["admin"]))
+):
+    """
+    Lanza el entrenamiento de una versión nueva del modelo sin bloquear el request (solo admins)
+    """
+    if recommendation_model.is_training():
+        return {"message": "Ya hay un entrenamiento en curso"}
+    background_tasks.add_task(_train_in_background)
+    return {"message": "Entrenamiento iniciado"}
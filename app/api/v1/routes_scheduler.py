@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+from typing import Dict, Any
+from app.models.user import User
+from app.services.dependencies import get_current_user_with_permissions
+from app.services.scheduler import scheduler, worker_scheduler
+
+router = APIRouter()
+
+@router.get("/", response_model=Dict[str, Any])
+def get_scheduler_status(
+    current_user: User = Depends(get_current_user_with_permissions(["admin"]))
+):
+    """
+    Estado de los trabajos en segundo plano: última ejecución, duración y próxima ejecución (solo admins).
+    por_worker son los trabajos que corre cada worker (se muestra el que atiende el request)
+    """
+    return {**scheduler.status(), "por_worker": worker_scheduler.status()}
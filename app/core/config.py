@@ -1,3 +1,6 @@
+import os
+import tempfile
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -11,6 +14,75 @@ class Settings(BaseSettings):
     stripe_publishable_key: str
     stripe_webhook_secret: str | None = None  # si no estás usando webhook aún
 
+    # Recomendaciones
+    recommendation_engine: str = "apriori"  # "apriori", "fpgrowth" o "pairwise"
+    recommendation_min_support: float = 0.01
+    recommendation_min_confidence: float = 0.1
+    recommendation_model_refresh_seconds: int = 60  # cada cuánto se busca una versión nueva del modelo
+    recommendation_models_to_keep: int = 3  # versiones anteriores que se conservan en la base
+    recommendation_index_max_per_product: int = 50  # consecuentes por producto en el índice en memoria
+    recommendation_bundles_per_product: int = 20  # combos (conjuntos frecuentes) por producto en memoria
+    recommendation_mode: str = "modelo"  # "modelo" (reglas precalculadas), "incremental" (conteos por venta) o "similitud" (MinHash LSH)
+    recommendation_track_triples: bool = False  # en modo incremental, contar también tríos de productos
+    recommendation_incremental_sync_seconds: int = 5
+    similarity_lsh_bands: int = 32  # modo similitud: bandas MinHash (más bandas = más recall y más memoria)
+    similarity_lsh_rows: int = 1  # modo similitud: hashes por banda (más filas = cubetas más chicas y menos recall)
+    recommendation_popularity_half_life_days: float = 0.0  # 0 = sin decaimiento en el ranking de más vendidos
+    recommendation_cache_enabled: bool = True  # caché de respuestas por producto y por carrito
+    recommendation_cache_max_entries: int = 10000
+    recommendation_cache_ttl_seconds: int = 60
+    recommendation_window_days: int = 0  # minar solo las ventas de los últimos N días (0 = todo el historial)
+    recommendation_decay_half_life_days: float = 0.0  # peso de cada venta a la mitad cada N días (0 = sin pesos; requiere pairwise)
+    recommendation_retrain_interval_seconds: int = 3600  # 0 = sin reentrenamiento periódico
+    recommendation_retrain_after_sales: int = 0  # reentrenar tras N ventas nuevas (0 = desactivado)
+    recommendation_training_processes: int = 1  # procesos para minar (0 = en el mismo proceso)
+    recommendation_data_source: str = "base"  # "base" (tablas de ventas) o "exportacion" (archivos Arrow de sales_export_dir)
+    recommendation_executor_workers: int = 4  # hilos propios para calcular recomendaciones en los requests
+    recommendation_executor_max_queue: int = 64  # requests esperando un hilo antes de responder 503
+    recommendation_warm_up: bool = True  # construir modelo en memoria y populares al iniciar, no en el primer request
+    personalization_enabled: bool = False  # candidatos por cliente según su historial de compras
+    personalization_refresh_seconds: int = 3600  # cada worker calcula y refresca sus propios candidatos
+    personalization_neighbors: int = 50  # productos parecidos que se guardan por producto
+    personalization_candidates: int = 20  # candidatos que se guardan por cliente
+    product_snapshot_enabled: bool = True  # copia en memoria del catálogo para armar las respuestas
+    product_snapshot_ttl_seconds: int = 60
+
+    # Exportación columnar de ventas (Arrow IPC por mes, requiere pyarrow)
+    sales_export_dir: str = "exports/ventas"
+    sales_export_interval_seconds: int = 0  # 0 = sin exportación periódica
+
+    # Carritos (el subtotal se mantiene por diferencias y se concilia con la suma de los items)
+    cart_reconcile_interval_seconds: int = 3600  # 0 = sin conciliación periódica
+    cart_reconcile_batch_size: int = 1000
+    cart_store_enabled: bool = False  # carritos en memoria con escritura diferida (un solo worker o sesiones fijas)
+    cart_store_flush_seconds: float = 2.0
+    cart_store_max_carts: int = 10000  # carritos sin cambios pendientes que se conservan en memoria
+    cart_sweep_interval_seconds: int = 3600  # barrido de carritos abandonados; 0 = desactivado
+    cart_abandon_after_hours: int = 72  # carritos activos sin cambios desde hace tanto pasan a "abandonado"
+    cart_purge_after_days: int = 0  # abandonados hace más de estos días se archivan y borran; 0 = nunca
+    cart_archive_dir: str = "exports/carritos"  # "" = borrar sin archivar
+    cart_sweep_batch_size: int = 500
+    cart_sweep_max_batches: int = 200  # por paso y por corrida
+    cart_sweep_pause_seconds: float = 0.1  # pausa entre lotes
+
+    # Trabajos en segundo plano
+    # Con varios workers en la misma máquina solo el que toma scheduler_lock_file corre los trabajos
+    # (reentrenamiento, exportación, barridos); con varias máquinas, activarlo en una sola
+    scheduler_enabled: bool = True
+    scheduler_lock_file: str = os.path.join(tempfile.gettempdir(), "pos-scheduler.lock")  # "" = cada worker corre los trabajos
+    scheduler_check_seconds: int = 30  # cada cuánto se consultan los disparadores por volumen
+    scheduler_workers: int = 2
+
+    # Apriori y FP-Growth (mlxtend) no admiten pesos por venta: el decaimiento sin pairwise no tendría efecto
+    @model_validator(mode="after")
+    def check_decay_engine(self):
+        if self.recommendation_decay_half_life_days > 0 and self.recommendation_engine != "pairwise":
+            raise ValueError(
+                "recommendation_decay_half_life_days > 0 requiere recommendation_engine = \"pairwise\" "
+                f"(configurado: \"{self.recommendation_engine}\")"
+            )
+        return self
+
     class Config:
         env_file = ".env"
 
@@ -12,6 +12,11 @@ from app.models.proveedor import Proveedor
 from app.models.producto_proveedor import ProductoProveedor
 from app.models.sale import Venta
 from app.models.sale_detail import DetalleVenta
+from app.models.cart import CarritoCompra
+from app.models.cart_item import DetalleCarrito
+from app.models.recommendation_model import ModeloRecomendacion
+from app.models.association_rule import ReglaAsociacion
+from app.models.frequent_itemset import ConjuntoFrecuente
 
 
 
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
@@ -13,7 +14,30 @@ from app.api.v1.routes_cart import router as cart_router
 from app.api.v1.routes_recommendations import router as recommendations_router
 from app.api.v1.routes_stripe import router as stripe_router
 from app.api.v1.routes_sale import router as sale_router
-app = FastAPI()
+from app.api.v1.routes_scheduler import router as scheduler_router
+from app.services import cart_jobs, cart_store, recommendation_executor, recommendation_jobs
+from app.services.scheduler import scheduler, worker_scheduler
+
+# Trabajos en segundo plano: se inician con la app y se detienen al apagarla
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    recommendation_jobs.start_warm_up()
+    # En todos los workers, aunque scheduler_enabled esté desactivado: cada uno necesita sus candidatos
+    recommendation_jobs.register_worker_jobs(worker_scheduler)
+    if worker_scheduler.jobs:
+        worker_scheduler.start()
+    if settings.scheduler_enabled:
+        recommendation_jobs.register_jobs(scheduler)
+        cart_jobs.register_jobs(scheduler)
+        scheduler.start()
+    yield
+    scheduler.stop(wait=False)
+    worker_scheduler.stop(wait=False)
+    cart_store.shutdown()
+    recommendation_jobs.shutdown_pool()
+    recommendation_executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Middleware CORS
 app.add_middleware(
@@ -40,6 +64,7 @@ app.include_router(cart_router, prefix="/api/v1/carts", tags=["Carritos"])
 app.include_router(recommendations_router, prefix="/api/v1/recommendations", tags=["Recomendaciones"])
 app.include_router(stripe_router, prefix="/api/v1/stripe", tags=["Stripe"])
 app.include_router(sale_router, prefix="/api/v1/sales", tags=["Ventas"])
+app.include_router(scheduler_router, prefix="/api/v1/scheduler", tags=["Tareas programadas"])
 
 # 👉 Custom OpenAPI para habilitar el botón Authorize con JWT Bearer
 def custom_openapi():
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+
+class ReglaAsociacion(Base):
+    __tablename__ = "reglaasociacion"
+
+    id_regla = Column(Integer, primary_key=True, index=True)
+    id_modelo = Column(Integer, ForeignKey("modelorecomendacion.id_modelo", ondelete="CASCADE"), nullable=False, index=True)
+    antecedentes = Column(String, nullable=False)  # ids de productos separados por coma
+    consecuentes = Column(String, nullable=False)
+    soporte = Column(Float, nullable=False)
+    confianza = Column(Float, nullable=False)
+    lift = Column(Float, nullable=False)
+
+    # Relaciones
+    modelo = relationship("ModeloRecomendacion", back_populates="reglas")
@@ -1,10 +1,14 @@
 import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
 class CarritoCompra(Base):
     __tablename__ = "carritocompra"
+    __table_args__ = (
+        # Búsqueda de carritos por estado sin cambios desde una fecha (barrido de abandonados)
+        Index("ix_carritocompra_estado_fecha_actualizacion", "estado", "fecha_actualizacion"),
+    )
 
     id_carrito = Column(Integer, primary_key=True, index=True)
     id_usuario = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, Float, ForeignKey
+from sqlalchemy import Column, Integer, Float, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
 class DetalleCarrito(Base):
     __tablename__ = "detallecarrito"
+    __table_args__ = (
+        # Un producto aparece una sola vez por carrito (clave del ON CONFLICT de cart_service y cart_store)
+        UniqueConstraint("id_carrito", "id_producto", name="uq_detallecarrito_carrito_producto"),
+    )
 
     id_detalle_carrito = Column(Integer, primary_key=True, index=True)
     id_carrito = Column(Integer, ForeignKey("carritocompra.id_carrito"), nullable=False)
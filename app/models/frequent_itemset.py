@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+
+class ConjuntoFrecuente(Base):
+    __tablename__ = "conjuntofrecuente"
+
+    id_conjunto = Column(Integer, primary_key=True, index=True)
+    id_modelo = Column(Integer, ForeignKey("modelorecomendacion.id_modelo", ondelete="CASCADE"), nullable=False, index=True)
+    productos = Column(String, nullable=False)  # ids de productos separados por coma, ordenados
+    tamano = Column(Integer, nullable=False)
+    soporte = Column(Float, nullable=False)
+
+    # Relaciones
+    modelo = relationship("ModeloRecomendacion", back_populates="conjuntos")
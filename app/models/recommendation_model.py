@@ -0,0 +1,19 @@
+import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy.orm import relationship
+from app.db.base import Base
+
+class ModeloRecomendacion(Base):
+    __tablename__ = "modelorecomendacion"
+
+    id_modelo = Column(Integer, primary_key=True, index=True)
+    version = Column(String, unique=True, nullable=True)
+    fecha_creacion = Column(DateTime, default=datetime.datetime.utcnow)
+    num_transacciones = Column(Integer, nullable=False, default=0)
+    num_reglas = Column(Integer, nullable=False, default=0)
+    duracion_segundos = Column(Float, nullable=True)
+    estado = Column(String, default="activo", index=True)  # "activo", "inactivo"
+
+    # Relaciones
+    reglas = relationship("ReglaAsociacion", back_populates="modelo", cascade="all, delete-orphan")
+    conjuntos = relationship("ConjuntoFrecuente", back_populates="modelo", cascade="all, delete-orphan")
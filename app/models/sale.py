@@ -21,7 +21,7 @@ class Venta(Base):
     id_venta = Column(Integer, primary_key=True, index=True, autoincrement=True)
     numero_factura = Column(String, nullable=False)
     id_usuario = Column(Integer, ForeignKey("users.id"), nullable=False)
-    fecha_venta = Column(DateTime, nullable=False)
+    fecha_venta = Column(DateTime, nullable=False, index=True)
     subtotal = Column(DECIMAL(10, 2), nullable=False)
     descuento = Column(DECIMAL(10, 2), nullable=False, default=0)
     total = Column(DECIMAL(10, 2), nullable=False)
@@ -6,7 +6,7 @@ class DetalleVenta(Base):
     __tablename__ = "detalleventa"
 
     id_detalle_venta = Column(Integer, primary_key=True, index=True)
-    id_venta = Column(Integer, ForeignKey("venta.id_venta"), nullable=False)
+    id_venta = Column(Integer, ForeignKey("venta.id_venta"), nullable=False, index=True)
     id_producto = Column(Integer, ForeignKey("products.id"), nullable=False)
     cantidad = Column(Integer, nullable=False)
     precio_unitario = Column(DECIMAL(10, 2), nullable=False)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
 
 class CartItemBase(BaseModel):
     id_carrito: int
@@ -12,7 +12,7 @@ class CartItemBase(BaseModel):
 class CartItemCreate(BaseModel):
     id_carrito: int
     id_producto: int
-    cantidad: int = 1
+    cantidad: int = Field(1, gt=0)
     descuento: Optional[float] = 0.0
 
 class CartItemUpdate(BaseModel):
@@ -26,4 +26,24 @@ class CartItemOut(CartItemBase):
     imagen_producto: Optional[str] = None
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True 
+
+# Operación de un lote sobre un carrito: "agregar" suma unidades, "cantidad" fija la cantidad
+# (0 quita el producto) y "quitar" elimina el producto del carrito
+class CartItemOperation(BaseModel):
+    op: Literal["agregar", "cantidad", "quitar"]
+    id_producto: int
+    cantidad: Optional[int] = Field(None, ge=0)
+    descuento: Optional[float] = None
+
+    @model_validator(mode="after")
+    def check_cantidad(self):
+        # Sin cantidad, "agregar" suma 1; "cantidad" la necesita
+        if self.op == "agregar" and self.cantidad == 0:
+            raise ValueError("La cantidad a agregar debe ser mayor que 0")
+        if self.op == "cantidad" and self.cantidad is None:
+            raise ValueError("La operación 'cantidad' requiere cantidad")
+        return self
+
+class CartBulkOperations(BaseModel):
+    operaciones: List[CartItemOperation] = Field(..., min_length=1, max_length=500)
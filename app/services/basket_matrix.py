@@ -0,0 +1,138 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.core.config import settings
+from app.services import sales_export
+from app.services.sales_history import iter_sale_dates, iter_sale_product_pairs
+
+# Matriz de canastas en formato disperso (CSR): filas = ventas, columnas = productos
+class BasketMatrix:
+    """
+    Matriz booleana ventas x productos. Solo guarda las celdas en 1, así que la memoria
+    crece con el número de líneas de venta y no con ventas x productos.
+    weights (opcional) da un peso a cada venta, alineado con venta_ids.
+    """
+    def __init__(self, matrix: sparse.csr_matrix, venta_ids: np.ndarray, product_ids: np.ndarray, weights: np.ndarray = None):
+        self.matrix = matrix
+        self.venta_ids = venta_ids
+        self.product_ids = product_ids
+        self.weights = weights
+
+    @property
+    def num_transacciones(self):
+        return self.matrix.shape[0]
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def total_weight(self):
+        """
+        Número de ventas, o suma de sus pesos si la matriz es ponderada
+        """
+        if self.weights is None:
+            return len(self)
+        return float(self.weights.sum())
+
+    def nbytes(self):
+        m = self.matrix
+        total = m.data.nbytes + m.indices.nbytes + m.indptr.nbytes + self.venta_ids.nbytes + self.product_ids.nbytes
+        return total + (self.weights.nbytes if self.weights is not None else 0)
+
+    def item_counts(self):
+        """
+        Número de ventas (o suma de pesos) en las que aparece cada producto (alineado con product_ids)
+        """
+        if self.weights is not None:
+            return np.asarray(self.weights @ self.matrix.astype(np.float64)).ravel()
+        return np.asarray(self.matrix.sum(axis=0)).ravel().astype(np.int64)
+
+    def pair_counts(self):
+        """
+        Co-ocurrencias de pares de productos con un producto de matrices dispersas (X^T X,
+        o X^T W X si hay pesos). La diagonal contiene el soporte de cada producto.
+        """
+        if self.weights is not None:
+            x = self.matrix.astype(np.float64)
+            return (x.T @ sparse.diags(self.weights) @ x).tocsr()
+        x = self.matrix.astype(np.int32)
+        return (x.T @ x).tocsr()
+
+    def with_decay(self, dates: np.ndarray, half_life_days: float):
+        """
+        Pondera cada venta por 0.5 ** (antigüedad / half_life_days); la más reciente pesa 1.
+        dates es datetime64 alineado con venta_ids.
+        """
+        if len(self) == 0:
+            return self
+        age_days = (dates.max() - dates).astype('timedelta64[s]').astype(np.float64) / 86400
+        return BasketMatrix(self.matrix, self.venta_ids, self.product_ids, np.power(0.5, age_days / half_life_days))
+
+    def to_dataframe(self):
+        """
+        DataFrame booleano disperso que acepta mlxtend (apriori/fpgrowth).
+        Las columnas son posiciones 0..n-1; usar product_ids para traducirlas.
+        """
+        frame = pd.DataFrame.sparse.from_spmatrix(self.matrix.astype(np.uint8), columns=range(self.matrix.shape[1]))
+        return frame.astype(pd.SparseDtype(bool, False))
+
+# Función para construir la matriz a partir de pares
+def build_basket_matrix(pair_chunks):
+    """
+    Construye la matriz CSR a partir de bloques (ids_venta, ids_producto).
+    Las líneas repetidas de un mismo producto en una venta cuentan una sola vez.
+    """
+    venta_chunks, product_chunks = [], []
+    for venta_ids, product_ids in pair_chunks:
+        venta_chunks.append(np.asarray(venta_ids, dtype=np.int64))
+        product_chunks.append(np.asarray(product_ids, dtype=np.int64))
+
+    if not venta_chunks or sum(len(c) for c in venta_chunks) == 0:
+        return BasketMatrix(
+            sparse.csr_matrix((0, 0), dtype=bool), np.empty(0, np.int64), np.empty(0, np.int64)
+        )
+
+    venta_ids, rows = np.unique(np.concatenate(venta_chunks), return_inverse=True)
+    product_ids, cols = np.unique(np.concatenate(product_chunks), return_inverse=True)
+    del venta_chunks, product_chunks
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=bool), (rows.astype(np.int32), cols.astype(np.int32))),
+        shape=(len(venta_ids), len(product_ids))
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = True
+    return BasketMatrix(matrix, venta_ids, product_ids)
+
+def load_basket_matrix(db: Session, since: datetime = None, half_life_days: float = 0, source: str = None):
+    """
+    Matriz de las ventas completadas (desde since, si se indica), ponderada por antigüedad
+    si half_life_days > 0. source (por defecto recommendation_data_source) elige entre las
+    tablas de ventas ("base") y los archivos de la exportación columnar ("exportacion").
+    """
+    if (source or settings.recommendation_data_source) == "exportacion":
+        pairs = sales_export.iter_sale_product_pairs(since=since)
+        sale_dates = lambda: sales_export.iter_sale_dates(since=since)
+    else:
+        pairs = iter_sale_product_pairs(db, since=since)
+        sale_dates = lambda: iter_sale_dates(db, since=since)
+
+    basket = build_basket_matrix(pairs)
+    if not half_life_days or len(basket) == 0:
+        return basket
+
+    # Fechas alineadas con las filas de la matriz (venta_ids está ordenado)
+    dates = np.full(len(basket), np.datetime64('NaT'), dtype='datetime64[s]')
+    for venta_ids, fechas in sale_dates():
+        positions = np.searchsorted(basket.venta_ids, venta_ids)
+        positions = np.minimum(positions, len(basket) - 1)
+        found = basket.venta_ids[positions] == venta_ids
+        dates[positions[found]] = fechas[found]
+    # Ventas borradas entre las dos consultas: se toman como las más recientes
+    missing = np.isnat(dates)
+    if missing.all():
+        return basket
+    dates[missing] = dates[~missing].max()
+    return basket.with_decay(dates, half_life_days)
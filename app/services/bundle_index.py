@@ -0,0 +1,76 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Índice de combos (conjuntos frecuentes): producto -> combos que lo contienen, por soporte
+class BundleIndex:
+    """
+    Guarda los conjuntos frecuentes en arreglos contiguos: los productos del combo i son
+    items[indptr[i]:indptr[i+1]] y su soporte supports[i]. Para cada producto se guardan los ids
+    de sus `max_per_product` combos de mayor soporte, así una consulta es un acceso al diccionario.
+    """
+    def __init__(self, indptr: np.ndarray, items: np.ndarray, supports: np.ndarray, offsets: dict, members: np.ndarray):
+        self._indptr = indptr
+        self._items = items
+        self._supports = supports
+        self._offsets = offsets
+        self._members = members
+
+    @classmethod
+    def from_itemsets(cls, itemsets: pd.DataFrame, max_per_product: int = 20):
+        if itemsets is None or itemsets.empty:
+            return cls(np.zeros(1, np.int64), np.empty(0, np.int32), np.empty(0, np.float32), {}, np.empty(0, np.int32))
+
+        # Combos más frecuentes primero; a igual soporte, los más grandes
+        sizes = itemsets['items'].apply(len).to_numpy()
+        supports = itemsets['support'].to_numpy(dtype=np.float64)
+        order = np.lexsort((-sizes, -supports))
+        items = [itemsets['items'].iloc[i] for i in order]
+        sizes = sizes[order]
+        indptr = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        flat = np.fromiter((p for combo in items for p in combo), dtype=np.int32, count=int(indptr[-1]))
+
+        # Una fila por (producto, combo) en el orden de los combos; se conservan los primeros de cada producto
+        bundle_ids = np.repeat(np.arange(len(items), dtype=np.int32), sizes)
+        by_product = np.lexsort((bundle_ids, flat))
+        products, combos = flat[by_product], bundle_ids[by_product]
+        keys, starts, counts = np.unique(products, return_index=True, return_counts=True)
+        counts = np.minimum(counts, max_per_product)
+        keep = np.concatenate([np.arange(start, start + count) for start, count in zip(starts, counts)])
+        members = combos[keep]
+        ends = np.cumsum(counts)
+        offsets = {int(key): (int(end - count), int(end)) for key, end, count in zip(keys, ends, counts)}
+        return cls(indptr, flat, supports[order].astype(np.float32), offsets, members)
+
+    def __len__(self):
+        return len(self._supports)
+
+    def __contains__(self, product_id: int):
+        return product_id in self._offsets
+
+    def bundles_for(self, product_id: int, limit: int = 5):
+        """
+        [(ids de producto, soporte)] de los combos que contienen el producto, de mayor a menor soporte
+        """
+        bounds = self._offsets.get(product_id)
+        if bounds is None:
+            return []
+        start, end = bounds
+        return [
+            (self._items[self._indptr[b]:self._indptr[b + 1]].tolist(), float(self._supports[b]))
+            for b in self._members[start:min(end, start + limit)].tolist()
+        ]
+
+    def memory_bytes(self):
+        arrays = self._indptr.nbytes + self._items.nbytes + self._supports.nbytes + self._members.nbytes
+        offsets = sys.getsizeof(self._offsets) + sum(
+            sys.getsizeof(key) + sys.getsizeof(bounds) for key, bounds in self._offsets.items()
+        )
+        return arrays + offsets
+
+    def stats(self):
+        return {
+            "combos": len(self),
+            "productos": len(self._offsets),
+            "memoria_bytes": self.memory_bytes(),
+        }
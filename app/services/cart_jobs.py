@@ -0,0 +1,34 @@
+from app.db.session import SessionLocal
+from app.core.config import settings
+from app.services import cart_service, cart_sweeper
+
+# Trabajos en segundo plano de los carritos
+
+RECONCILE_JOB = "conciliar_subtotales_carrito"
+SWEEP_JOB = "barrer_carritos_abandonados"
+
+# Función para conciliar los subtotales de todos los carritos abiertos
+def reconcile_subtotals():
+    db = SessionLocal()
+    try:
+        return cart_service.reconcile_cart_subtotals(db, batch_size=settings.cart_reconcile_batch_size)
+    finally:
+        db.close()
+
+# Función para marcar (y, si corresponde, archivar y borrar) los carritos abandonados
+def sweep_abandoned():
+    db = SessionLocal()
+    try:
+        return cart_sweeper.sweep(db)
+    finally:
+        db.close()
+
+def register_jobs(scheduler):
+    """
+    Registra la conciliación de subtotales cada cart_reconcile_interval_seconds y el barrido
+    de carritos abandonados cada cart_sweep_interval_seconds
+    """
+    if settings.cart_reconcile_interval_seconds:
+        scheduler.register(RECONCILE_JOB, reconcile_subtotals, interval_seconds=settings.cart_reconcile_interval_seconds)
+    if settings.cart_sweep_interval_seconds:
+        scheduler.register(SWEEP_JOB, sweep_abandoned, interval_seconds=settings.cart_sweep_interval_seconds)
@@ -1,17 +1,26 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert as insert_core, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from app.models.cart import CarritoCompra
 from app.models.cart_item import DetalleCarrito
 from app.models.product import Product
 from app.schemas.cart import CartCreate
 from app.models.cart import CarritoCompra
 from app.models.cart_item import DetalleCarrito
-from app.schemas.cart_item import CartItemCreate, CartItemUpdate
+from app.schemas.cart_item import CartBulkOperations, CartItemCreate, CartItemUpdate
+from app.services import cart_store, product_hydration
 from fastapi import HTTPException
 import datetime
 import traceback
 
 def get_active_cart_for_user(db: Session, user_id: int):
     try:
+        store = cart_store.get_store()
+        if store is not None:
+            return store.active_cart(db, user_id)
+        
         cart = db.query(CarritoCompra).filter(
             CarritoCompra.id_usuario == user_id,
             CarritoCompra.estado == "activo"
@@ -51,6 +60,10 @@ def get_cart_by_id(db: Session, cart_id: int):
 
 def get_cart_items(db: Session, cart_id: int):
     try:
+        store = cart_store.get_store()
+        if store is not None:
+            return _with_products(db, store.items(db, cart_id))
+        
         # Asegurar que el carrito existe
         cart = get_cart_by_id(db, cart_id)
         
@@ -89,61 +102,112 @@ def get_cart_items(db: Session, cart_id: int):
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error al obtener los items del carrito: {str(e)}")
 
+def _insert(db: Session):
+    # INSERT con ON CONFLICT del motor en uso (PostgreSQL en producción, SQLite en los benchmarks)
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert
+    return postgresql_insert
+
+def _item_dict(item, product):
+    return {
+        "id": item["id_detalle_carrito"],
+        "id_carrito": item["id_carrito"],
+        "id_producto": item["id_producto"],
+        "cantidad": item["cantidad"],
+        "precio_unitario": item["precio_unitario"],
+        "descuento": item["descuento"],
+        "subtotal": item["subtotal"],
+        "nombre_producto": product["nombre"] if product else None,
+        "imagen_producto": product["imagen"] if product else None
+    }
+
+_ITEM_COLUMNS = (
+    DetalleCarrito.id_detalle_carrito, DetalleCarrito.id_carrito, DetalleCarrito.id_producto,
+    DetalleCarrito.cantidad, DetalleCarrito.precio_unitario, DetalleCarrito.descuento, DetalleCarrito.subtotal
+)
+
+def _with_products(db: Session, items):
+    # Nombre e imagen de cada item desde la copia del catálogo
+    products = {p["id"]: p for p in product_hydration.hydrate_products(db, [item["id_producto"] for item in items])}
+    return [_item_dict(item, products.get(item["id_producto"])) for item in items]
+
+# Función para sumar al subtotal del carrito la diferencia de una línea, dentro de la transacción en curso
+def _apply_subtotal_delta(db: Session, cart_id: int, delta: float):
+    """
+    El total se mantiene por diferencias (costo constante sin importar cuántos items tenga el carrito);
+    reconcile_cart_subtotals lo compara con la suma de los items. Devuelve el subtotal nuevo
+    o None si el carrito no existe.
+    """
+    return db.execute(
+        update(CarritoCompra)
+        .where(CarritoCompra.id_carrito == cart_id)
+        .values(subtotal=func.coalesce(CarritoCompra.subtotal, 0.0) + delta,
+                fecha_actualizacion=datetime.datetime.utcnow())
+        .returning(CarritoCompra.subtotal)
+    ).scalar()
+
+def _sum_items(cart_id):
+    return select(func.coalesce(func.sum(DetalleCarrito.subtotal), 0.0))\
+        .where(DetalleCarrito.id_carrito == cart_id)\
+        .scalar_subquery()
+
 def add_item_to_cart(db: Session, item_data: CartItemCreate):
+    """
+    Agrega el producto al carrito (o suma la cantidad si ya estaba) y actualiza el subtotal del
+    carrito en la misma transacción
+    """
     try:
-        # Verificar si el producto existe
-        product = db.query(Product).filter(Product.id == item_data.id_producto).first()
-        if not product:
-            raise HTTPException(status_code=404, detail="Producto no encontrado")
-        
-        # Verificar si el carrito existe
-        cart = get_cart_by_id(db, item_data.id_carrito)
-        
-        # Verificar si el item ya existe en el carrito
-        existing_item = db.query(DetalleCarrito).filter(
-            DetalleCarrito.id_carrito == item_data.id_carrito,
-            DetalleCarrito.id_producto == item_data.id_producto
-        ).first()
-        
-        if existing_item:
-            # Actualizar cantidad y subtotal si ya existe
-            existing_item.cantidad += item_data.cantidad
-            existing_item.subtotal = (existing_item.precio_unitario * existing_item.cantidad) - existing_item.descuento
-            db.commit()
-            db.refresh(existing_item)
-            item = existing_item
-        else:
-            # Crear nuevo item con el precio actual del producto
-            precio = product.precio_venta
-            subtotal = (precio * item_data.cantidad) - item_data.descuento
-            
-            item = DetalleCarrito(
-                id_carrito=item_data.id_carrito,
-                id_producto=item_data.id_producto,
-                cantidad=item_data.cantidad,
-                precio_unitario=precio,
-                descuento=item_data.descuento,
-                subtotal=subtotal
-            )
-            db.add(item)
-            db.commit()
-            db.refresh(item)
-        
-        # Actualizar el subtotal del carrito
-        cart = update_cart_subtotal(db, cart.id_carrito)
+        store = cart_store.get_store()
+        if store is not None:
+            item = store.add_item(db, item_data.id_carrito, item_data.id_producto, item_data.cantidad, item_data.descuento or 0.0)
+            return _item_dict(item, product_hydration.get_product(db, item["id_producto"]))
+        
+        # Si la línea ya existe se suman las unidades a su precio: el carrito sube precio_unitario * cantidad
+        cantidad = DetalleCarrito.cantidad + item_data.cantidad
+        add_to_line = update(DetalleCarrito)\
+            .where(DetalleCarrito.id_carrito == item_data.id_carrito, DetalleCarrito.id_producto == item_data.id_producto)\
+            .values(cantidad=cantidad, subtotal=DetalleCarrito.precio_unitario * cantidad - DetalleCarrito.descuento)\
+            .returning(*_ITEM_COLUMNS)\
+            .execution_options(synchronize_session=False)
+        row = db.execute(add_to_line).first()
+        delta = row.precio_unitario * item_data.cantidad if row is not None else None
+        
+        if row is None:
+            # Línea nueva: el precio sale del producto en la misma sentencia; si el producto no existe
+            # no se inserta nada. El carrito sube el subtotal de la línea
+            source = select(
+                literal(item_data.id_carrito), Product.id, literal(item_data.cantidad), Product.precio_venta,
+                literal(item_data.descuento or 0.0),
+                Product.precio_venta * item_data.cantidad - (item_data.descuento or 0.0)
+            ).where(Product.id == item_data.id_producto)
+            stmt = _insert(db)(DetalleCarrito).from_select(
+                ["id_carrito", "id_producto", "cantidad", "precio_unitario", "descuento", "subtotal"], source
+            ).on_conflict_do_nothing(
+                index_elements=[DetalleCarrito.id_carrito, DetalleCarrito.id_producto]
+            ).returning(*_ITEM_COLUMNS)
+            try:
+                row = db.execute(stmt).first()
+            except IntegrityError:
+                # PostgreSQL rechaza la clave foránea de un carrito inexistente
+                db.rollback()
+                raise HTTPException(status_code=404, detail="Carrito no encontrado")
+            if row is not None:
+                delta = row.subtotal
+            else:
+                # Otra transacción creó la misma línea entre medio, o el producto no existe
+                row = db.execute(add_to_line).first()
+                if row is None:
+                    db.rollback()
+                    raise HTTPException(status_code=404, detail="Producto no encontrado")
+                delta = row.precio_unitario * item_data.cantidad
+        
+        if _apply_subtotal_delta(db, item_data.id_carrito, delta) is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Carrito no encontrado")
+        db.commit()
         
-        # Obtener datos adicionales del producto para la respuesta
-        return {
-            "id": item.id_detalle_carrito,
-            "id_carrito": item.id_carrito,
-            "id_producto": item.id_producto,
-            "cantidad": item.cantidad,
-            "precio_unitario": item.precio_unitario,
-            "descuento": item.descuento,
-            "subtotal": item.subtotal,
-            "nombre_producto": product.nombre,
-            "imagen_producto": product.imagen
-        }
+        # Nombre e imagen para la respuesta, de la copia del catálogo
+        return _item_dict(row._mapping, product_hydration.get_product(db, row.id_producto))
     except HTTPException:
         raise
     except Exception as e:
@@ -153,43 +217,38 @@ def add_item_to_cart(db: Session, item_data: CartItemCreate):
         raise HTTPException(status_code=500, detail=f"Error al agregar item al carrito: {str(e)}")
 
 def update_cart_item(db: Session, item_id: int, item_data: CartItemUpdate):
+    """
+    Cambia la cantidad y/o el descuento del item y el subtotal del carrito en una transacción
+    """
     try:
-        item = db.query(DetalleCarrito).filter(DetalleCarrito.id_detalle_carrito == item_id).first()
-        if not item:
+        store = cart_store.get_store()
+        if store is not None:
+            item = store.update_item(db, item_id, item_data.cantidad, item_data.descuento)
+            return _item_dict(item, product_hydration.get_product(db, item["id_producto"]))
+        
+        # Se bloquea la línea para conocer su subtotal anterior
+        old = db.execute(
+            select(*_ITEM_COLUMNS)
+            .where(DetalleCarrito.id_detalle_carrito == item_id)
+            .with_for_update()
+        ).first()
+        if old is None:
+            db.rollback()
             raise HTTPException(status_code=404, detail="Item no encontrado")
         
-        # Actualizar campos si se proporcionan
-        if item_data.cantidad is not None:
-            item.cantidad = item_data.cantidad
-        
-        if item_data.descuento is not None:
-            item.descuento = item_data.descuento
-        
-        # Calcular subtotal
-        item.subtotal = (item.precio_unitario * item.cantidad) - item.descuento
-        
+        cantidad = item_data.cantidad if item_data.cantidad is not None else old.cantidad
+        descuento = item_data.descuento if item_data.descuento is not None else old.descuento
+        subtotal = old.precio_unitario * cantidad - descuento
+        db.execute(
+            update(DetalleCarrito)
+            .where(DetalleCarrito.id_detalle_carrito == item_id)
+            .values(cantidad=cantidad, descuento=descuento, subtotal=subtotal)
+        )
+        _apply_subtotal_delta(db, old.id_carrito, subtotal - old.subtotal)
         db.commit()
-        db.refresh(item)
         
-        # Actualizar el subtotal del carrito
-        update_cart_subtotal(db, item.id_carrito)
-        
-        # Obtener datos adicionales del producto
-        product = db.query(Product).filter(Product.id == item.id_producto).first()
-        
-        result = {
-            "id": item.id_detalle_carrito,
-            "id_carrito": item.id_carrito,
-            "id_producto": item.id_producto,
-            "cantidad": item.cantidad,
-            "precio_unitario": item.precio_unitario,
-            "descuento": item.descuento,
-            "subtotal": item.subtotal,
-            "nombre_producto": product.nombre if product else None,
-            "imagen_producto": product.imagen if product else None
-        }
-        
-        return result
+        item = {**old._mapping, "cantidad": cantidad, "descuento": descuento, "subtotal": subtotal}
+        return _item_dict(item, product_hydration.get_product(db, old.id_producto))
     except HTTPException:
         raise
     except Exception as e:
@@ -199,19 +258,27 @@ def update_cart_item(db: Session, item_id: int, item_data: CartItemUpdate):
         raise HTTPException(status_code=500, detail=f"Error al actualizar el item: {str(e)}")
 
 def remove_cart_item(db: Session, item_id: int):
+    """
+    Quita el item y actualiza el subtotal del carrito en una transacción
+    """
     try:
-        item = db.query(DetalleCarrito).filter(DetalleCarrito.id_detalle_carrito == item_id).first()
-        if not item:
+        store = cart_store.get_store()
+        if store is not None:
+            store.remove_item(db, item_id)
+            return {"message": "Item eliminado correctamente"}
+        
+        row = db.execute(
+            delete(DetalleCarrito)
+            .where(DetalleCarrito.id_detalle_carrito == item_id)
+            .returning(DetalleCarrito.id_carrito, DetalleCarrito.subtotal)
+        ).first()
+        if row is None:
+            db.rollback()
             raise HTTPException(status_code=404, detail="Item no encontrado")
         
-        cart_id = item.id_carrito
-        
-        db.delete(item)
+        _apply_subtotal_delta(db, row.id_carrito, -row.subtotal)
         db.commit()
         
-        # Actualizar el subtotal del carrito
-        update_cart_subtotal(db, cart_id)
-        
         return {"message": "Item eliminado correctamente"}
     except HTTPException:
         raise
@@ -221,58 +288,198 @@ def remove_cart_item(db: Session, item_id: int):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error al eliminar el item: {str(e)}")
 
-def update_cart_subtotal(db: Session, cart_id: int):
+# Función para aplicar un lote de operaciones (agregar, fijar cantidad, quitar) a un carrito
+def apply_cart_operations(db: Session, cart_id: int, data: CartBulkOperations):
+    """
+    Aplica las operaciones en orden sobre una copia de las líneas del carrito y escribe solo el resultado:
+    un DELETE, un INSERT y un UPDATE por lote (los que hagan falta), una sola consulta de precios
+    para los productos nuevos y un solo commit. Devuelve el estado final del carrito.
+    """
     try:
-        cart = get_cart_by_id(db, cart_id)
-        
-        # Calcular subtotal sumando todos los items
-        # 1. Primero intentar con SQL directo para evitar errores con db.func
-        try:
-            result = db.execute(
-                "SELECT COALESCE(SUM(subtotal), 0) as total FROM detalle_carrito WHERE id_carrito = :cart_id",
-                {"cart_id": cart_id}
-            ).fetchone()
-            
-            if result and hasattr(result, 'total'):
-                subtotal = float(result.total)
+        store = cart_store.get_store()
+        if store is not None:
+            subtotal, items = store.apply_operations(db, cart_id, data.operaciones)
+            return {"id_carrito": cart_id, "subtotal": subtotal, "operaciones": len(data.operaciones),
+                    "items": _with_products(db, items)}
+        
+        # El carrito tiene que existir y no se puede borrar durante el lote. FOR KEY SHARE no choca con el
+        # UPDATE del subtotal de otros requests, así que el orden de bloqueo sigue siendo el de las
+        # operaciones de a un item: líneas y luego el subtotal del carrito
+        found = db.execute(
+            select(CarritoCompra.id_carrito)
+            .where(CarritoCompra.id_carrito == cart_id)
+            .with_for_update(read=True, key_share=True)
+        ).scalar()
+        if found is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Carrito no encontrado")
+
+        # Se bloquean las líneas actuales
+        current = {
+            row.id_producto: dict(row._mapping)
+            for row in db.execute(
+                select(*_ITEM_COLUMNS)
+                .where(DetalleCarrito.id_carrito == cart_id)
+                .with_for_update()
+            )
+        }
+
+        # Precio actual de todos los productos que el lote agrega o cambia, en una sola consulta: uno que
+        # ya está en el carrito también puede quitarse y volver a agregarse dentro del lote
+        product_ids = {op.id_producto for op in data.operaciones if op.op != "quitar"}
+        prices = {}
+        if product_ids:
+            prices = dict(db.execute(select(Product.id, Product.precio_venta).where(Product.id.in_(product_ids))).all())
+            missing = sorted(product_ids - prices.keys())
+            if missing:
+                db.rollback()
+                raise HTTPException(status_code=404, detail=f"Productos no encontrados: {missing}")
+
+        final = {pid: dict(item) for pid, item in current.items()}
+        for op in data.operaciones:
+            if op.op == "quitar" or (op.op == "cantidad" and op.cantidad == 0):
+                final.pop(op.id_producto, None)
+                continue
+            item = final.get(op.id_producto)
+            if item is None:
+                # Un producto quitado antes en el mismo lote vuelve como línea nueva pero en su fila de siempre
+                previous = current.get(op.id_producto)
+                item = {"id_detalle_carrito": previous["id_detalle_carrito"] if previous else None,
+                        "id_carrito": cart_id, "id_producto": op.id_producto,
+                        "cantidad": 0, "precio_unitario": prices[op.id_producto], "descuento": 0.0}
+                final[op.id_producto] = item
+            if op.op == "agregar":
+                item["cantidad"] += op.cantidad if op.cantidad is not None else 1
             else:
-                # 2. Alternativa: usar una suma manual en Python
-                items = db.query(DetalleCarrito).filter(DetalleCarrito.id_carrito == cart_id).all()
-                subtotal = sum(item.subtotal for item in items) if items else 0.0
-        except Exception as sql_error:
-            print(f"Error en SQL de subtotal, usando alternativa: {str(sql_error)}")
-            # 3. Alternativa en caso de error: usar una suma manual
-            items = db.query(DetalleCarrito).filter(DetalleCarrito.id_carrito == cart_id).all()
-            subtotal = sum(item.subtotal for item in items) if items else 0.0
-        
-        cart.subtotal = subtotal
-        cart.fecha_actualizacion = datetime.datetime.utcnow()
-        
+                item["cantidad"] = op.cantidad
+            if op.descuento is not None:
+                item["descuento"] = op.descuento
+            item["subtotal"] = item["precio_unitario"] * item["cantidad"] - item["descuento"]
+
+        removed = [pid for pid in current if pid not in final]
+        added = [item for item in final.values() if item["id_detalle_carrito"] is None]
+        changed = [
+            item for pid, item in final.items()
+            if pid in current and (item["cantidad"], item["precio_unitario"], item["descuento"])
+            != (current[pid]["cantidad"], current[pid]["precio_unitario"], current[pid]["descuento"])
+        ]
+
+        if removed:
+            db.execute(
+                delete(DetalleCarrito)
+                .where(DetalleCarrito.id_carrito == cart_id, DetalleCarrito.id_producto.in_(removed))
+            )
+        if added:
+            rows = db.execute(
+                insert_core(DetalleCarrito).returning(DetalleCarrito.id_producto, DetalleCarrito.id_detalle_carrito),
+                [{key: value for key, value in item.items() if key != "id_detalle_carrito"} for item in added]
+            ).all()
+            for pid, item_id in rows:
+                final[pid]["id_detalle_carrito"] = item_id
+        if changed:
+            # UPDATE por clave primaria en un solo executemany
+            db.execute(update(DetalleCarrito), [
+                {"id_detalle_carrito": item["id_detalle_carrito"], "cantidad": item["cantidad"],
+                 "precio_unitario": item["precio_unitario"], "descuento": item["descuento"], "subtotal": item["subtotal"]}
+                for item in changed
+            ])
+
+        delta = sum(item["subtotal"] for item in added + changed) \
+            - sum(current[pid]["subtotal"] for pid in removed) \
+            - sum(current[item["id_producto"]]["subtotal"] for item in changed)
+        subtotal = _apply_subtotal_delta(db, cart_id, delta)
+        if subtotal is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="Carrito no encontrado")
         db.commit()
-        db.refresh(cart)
-        
-        return cart
+
+        products = {p["id"]: p for p in product_hydration.hydrate_products(db, list(final))}
+        return {
+            "id_carrito": cart_id,
+            "subtotal": subtotal,
+            "operaciones": len(data.operaciones),
+            "items": [
+                _item_dict(item, products.get(item["id_producto"]))
+                for item in sorted(final.values(), key=lambda item: item["id_detalle_carrito"])
+            ]
+        }
     except HTTPException:
+        db.rollback()
         raise
+    except IntegrityError:
+        # Otro request agregó el mismo producto mientras se armaba el lote
+        db.rollback()
+        raise HTTPException(status_code=409, detail="El carrito cambió durante la operación, reintentar")
     except Exception as e:
-        print(f"Error en update_cart_subtotal: {str(e)}")
+        print(f"Error en apply_cart_operations: {str(e)}")
         print(traceback.format_exc())
         db.rollback()
-        
-        # En caso de error, intentar manejar silenciosamente para que la UI no se bloquee
-        try:
-            # Recuperar el carrito sin actualizar el subtotal
-            cart = db.query(CarritoCompra).filter(CarritoCompra.id_carrito == cart_id).first()
-            if cart:
-                return cart
-        except:
-            pass
-            
-        # Si todo falla, propagar el error
-        raise HTTPException(status_code=500, detail=f"Error al actualizar el subtotal: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al aplicar las operaciones al carrito: {str(e)}")
+
+# Función para comparar el subtotal mantenido por diferencias con la suma de los items
+def reconcile_cart_subtotals(db: Session, cart_id: int = None, batch_size: int = 1000, tolerance: float = 0.005):
+    """
+    Recorre los carritos activos y guardados (o solo cart_id) por bloques de id y corrige los que
+    difieren de la suma de sus items en más de tolerance. Devuelve cuántos revisó y cuáles corrigió.
+    """
+    try:
+        estados = ("activo", "guardado")
+        # Suma de los items por carrito, incluidos los carritos sin items
+        totals = select(
+            CarritoCompra.id_carrito,
+            CarritoCompra.subtotal,
+            func.coalesce(func.sum(DetalleCarrito.subtotal), 0.0).label("suma")
+        ).outerjoin(DetalleCarrito, DetalleCarrito.id_carrito == CarritoCompra.id_carrito)\
+            .group_by(CarritoCompra.id_carrito, CarritoCompra.subtotal)\
+            .order_by(CarritoCompra.id_carrito)\
+            .limit(batch_size)
+        if cart_id is not None:
+            totals = totals.where(CarritoCompra.id_carrito == cart_id)
+        else:
+            totals = totals.where(CarritoCompra.estado.in_(estados))
+
+        revisados, corregidos = 0, []
+        last_id = 0
+        while True:
+            rows = db.execute(totals.where(CarritoCompra.id_carrito > last_id)).all()
+            if not rows:
+                break
+            revisados += len(rows)
+            last_id = rows[-1].id_carrito
+            wrong = [row for row in rows if abs((row.subtotal or 0.0) - row.suma) > tolerance]
+            if wrong:
+                # Se recalcula en la misma sentencia (no con la suma leída) por si hubo cambios entre medio
+                db.execute(
+                    update(CarritoCompra)
+                    .where(CarritoCompra.id_carrito.in_([row.id_carrito for row in wrong]))
+                    .values(subtotal=_sum_items(CarritoCompra.id_carrito))
+                    .execution_options(synchronize_session=False)
+                )
+                db.commit()
+                corregidos.extend(
+                    {"id_carrito": row.id_carrito, "subtotal": row.subtotal, "suma_items": row.suma}
+                    for row in wrong
+                )
+            if len(rows) < batch_size:
+                break
+
+        if cart_id is not None and not revisados:
+            raise HTTPException(status_code=404, detail="Carrito no encontrado")
+        if corregidos:
+            print(f"Subtotales de carrito corregidos: {len(corregidos)} de {revisados}")
+        return {"revisados": revisados, "corregidos": len(corregidos), "diferencias": corregidos[:100]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error en reconcile_cart_subtotals: {str(e)}")
+        print(traceback.format_exc())
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al conciliar los subtotales: {str(e)}")
 
 def process_cart_checkout(db: Session, cart_id: int, metodo_pago: str):
     try:
+        # Con carritos en memoria: se escriben sus cambios pendientes y el checkout sigue en la base
+        cart_store.release(cart_id)
         cart = get_cart_by_id(db, cart_id)
         
         if cart.estado != "activo":
@@ -309,8 +516,15 @@ def clear_cart_by_user(db: Session, user_id: int):
     if not cart:
         return {"message": f"No hay carrito activo para el usuario {user_id}"}
 
+    store = cart_store.get_store()
+    if store is not None:
+        deleted = store.clear(db, cart.id_carrito)
+        return {"message": f"Se eliminaron {deleted} item(s) del carrito del usuario {user_id}"}
+
     # Borrar todos los ítems asociados
     deleted = db.query(DetalleCarrito).filter(DetalleCarrito.id_carrito == cart.id_carrito).delete()
+    cart.subtotal = 0.0
+    cart.fecha_actualizacion = datetime.datetime.utcnow()
     db.commit()
 
     return {
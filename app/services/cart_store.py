@@ -0,0 +1,578 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DataError, IntegrityError
+from fastapi import HTTPException
+import atexit
+import datetime
+import itertools
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.cart import CarritoCompra
+from app.models.cart_item import DetalleCarrito
+from app.services import product_hydration
+
+# Carritos en memoria con escritura diferida (cart_store_enabled).
+# Las lecturas y cambios de carrito se resuelven en este proceso; un hilo escribe cada
+# cart_store_flush_seconds los carritos modificados en carritocompra/detallecarrito, en una sola
+# transacción por tanda. Al apagar la app se escribe lo pendiente. Los carritos viven en el
+# proceso: con varios workers hay que enrutar cada carrito siempre al mismo.
+# Si la tanda falla por los datos de algún carrito, se reintenta de a un carrito y solo los que fallan
+# quedan pendientes; un carrito que falla FLUSH_MAX_FAILURES veces seguidas se descarta de la memoria.
+# Los carritos que ya no existen en la base (purgados o borrados) se descartan antes de escribir.
+
+FLUSH_CHUNK = 500
+FLUSH_MAX_FAILURES = 5
+
+_LINE_COLUMNS = (
+    DetalleCarrito.id_detalle_carrito, DetalleCarrito.id_producto, DetalleCarrito.cantidad,
+    DetalleCarrito.precio_unitario, DetalleCarrito.descuento, DetalleCarrito.subtotal
+)
+
+# Línea de un carrito en memoria
+class _Line:
+    """
+    id es el id de detallecarrito, o uno provisional (negativo) hasta que la línea se escribe;
+    el provisional sigue sirviendo después (aliases)
+    """
+    __slots__ = ("id", "aliases", "id_producto", "cantidad", "precio_unitario", "descuento", "subtotal")
+
+    def __init__(self, id, id_producto, cantidad, precio_unitario, descuento, subtotal):
+        self.id = id
+        self.aliases = []
+        self.id_producto = id_producto
+        self.cantidad = cantidad
+        self.precio_unitario = precio_unitario
+        self.descuento = descuento
+        self.subtotal = subtotal
+
+    def set(self, cantidad, descuento):
+        self.cantidad = cantidad
+        self.descuento = descuento
+        old = self.subtotal
+        self.subtotal = self.precio_unitario * cantidad - descuento
+        return self.subtotal - old
+
+    def as_dict(self, cart_id: int):
+        return {
+            "id_detalle_carrito": self.id,
+            "id_carrito": cart_id,
+            "id_producto": self.id_producto,
+            "cantidad": self.cantidad,
+            "precio_unitario": self.precio_unitario,
+            "descuento": self.descuento,
+            "subtotal": self.subtotal,
+        }
+
+# Carrito en memoria: cabecera, líneas por producto y lo que falta escribir
+class _Cart:
+    __slots__ = ("id_carrito", "id_usuario", "estado", "subtotal", "fecha_creacion", "fecha_actualizacion",
+                 "lines", "dirty", "removed", "header_dirty", "last_access", "failed_writes")
+
+    def __init__(self, row, lines):
+        self.id_carrito = row.id_carrito
+        self.id_usuario = row.id_usuario
+        self.estado = row.estado
+        self.subtotal = row.subtotal or 0.0
+        self.fecha_creacion = row.fecha_creacion
+        self.fecha_actualizacion = row.fecha_actualizacion
+        self.lines = {line.id_producto: line for line in lines}
+        self.dirty = set()    # productos con líneas para insertar o actualizar
+        self.removed = set()  # productos con líneas para borrar
+        self.header_dirty = False
+        self.last_access = time.monotonic()
+        self.failed_writes = 0
+
+    def pending(self):
+        return bool(self.dirty or self.removed or self.header_dirty)
+
+    def info(self):
+        return {
+            "id_carrito": self.id_carrito,
+            "id_usuario": self.id_usuario,
+            "estado": self.estado,
+            "subtotal": self.subtotal,
+            "fecha_creacion": self.fecha_creacion,
+            "fecha_actualizacion": self.fecha_actualizacion,
+        }
+
+class CartStore:
+    """
+    Guarda los carritos usados recientemente (hasta max_carts sin cambios pendientes) y acumula sus
+    cambios: varios cambios a la misma línea entre dos escrituras se escriben una sola vez.
+    """
+    def __init__(self, max_carts: int = 10000):
+        self.max_carts = max_carts
+        self._carts = {}
+        self._active_by_user = {}
+        self._line_index = {}  # id de línea (real o provisional) -> (id_carrito, id_producto)
+        self._provisional = itertools.count(-1, -1)
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._counters = {"lecturas": 0, "cargas": 0, "cambios": 0, "escrituras": 0,
+                          "lineas_escritas": 0, "carritos_escritos": 0, "errores": 0,
+                          "carritos_inexistentes": 0, "carritos_descartados": 0}
+
+    # Carga
+
+    def _index(self, cart: _Cart):
+        for pid, line in cart.lines.items():
+            for line_id in (line.id, *line.aliases):
+                self._line_index[line_id] = (cart.id_carrito, pid)
+
+    def _unindex(self, cart_id: int, line: _Line):
+        for line_id in (line.id, *line.aliases):
+            if self._line_index.get(line_id) == (cart_id, line.id_producto):
+                del self._line_index[line_id]
+
+    def _get(self, db: Session, cart_id: int):
+        with self._lock:
+            self._counters["lecturas"] += 1
+            cart = self._carts.get(cart_id)
+            if cart is not None:
+                cart.last_access = time.monotonic()
+                return cart
+
+        # Primera vez que se usa el carrito en este proceso: cabecera y líneas desde la base
+        row = db.query(CarritoCompra).filter(CarritoCompra.id_carrito == cart_id).first()
+        if row is None:
+            return None
+        lines = [_Line(*line) for line in db.execute(select(*_LINE_COLUMNS).where(DetalleCarrito.id_carrito == cart_id))]
+        loaded = _Cart(row, lines)
+        with self._lock:
+            cart = self._carts.setdefault(cart_id, loaded)
+            if cart is loaded:
+                self._counters["cargas"] += 1
+                self._index(cart)
+                if cart.estado == "activo" and cart.id_usuario is not None:
+                    self._active_by_user.setdefault(cart.id_usuario, cart_id)
+            return cart
+
+    def _require(self, db: Session, cart_id: int):
+        cart = self._get(db, cart_id)
+        if cart is None:
+            raise HTTPException(status_code=404, detail="Carrito no encontrado")
+        return cart
+
+    def _line_owner(self, db: Session, line_id: int):
+        with self._lock:
+            owner = self._line_index.get(line_id)
+        if owner is None and line_id > 0:
+            cart_id = db.execute(
+                select(DetalleCarrito.id_carrito).where(DetalleCarrito.id_detalle_carrito == line_id)
+            ).scalar()
+            if cart_id is not None and self._get(db, cart_id) is not None:
+                with self._lock:
+                    owner = self._line_index.get(line_id)
+        if owner is None:
+            raise HTTPException(status_code=404, detail="Item no encontrado")
+        return owner
+
+    def _changed(self, cart: _Cart, delta: float):
+        cart.subtotal += delta
+        cart.fecha_actualizacion = datetime.datetime.utcnow()
+        cart.header_dirty = True
+        cart.last_access = time.monotonic()
+        self._counters["cambios"] += 1
+
+    def _new_line(self, cart: _Cart, product: dict, cantidad: int, descuento: float):
+        precio = product["precio_venta"]
+        line = _Line(next(self._provisional), product["id"], cantidad, precio, descuento, precio * cantidad - descuento)
+        cart.lines[line.id_producto] = line
+        self._line_index[line.id] = (cart.id_carrito, line.id_producto)
+        return line
+
+    def _drop_line(self, cart: _Cart, pid: int):
+        line = cart.lines.pop(pid)
+        self._unindex(cart.id_carrito, line)
+        cart.dirty.discard(pid)
+        cart.removed.add(pid)
+        return line
+
+    # Lecturas
+
+    def active_cart(self, db: Session, user_id: int):
+        with self._lock:
+            cart = self._carts.get(self._active_by_user.get(user_id))
+            if cart is not None and cart.estado == "activo":
+                self._counters["lecturas"] += 1
+                cart.last_access = time.monotonic()
+                return cart.info()
+
+        cart_id = db.query(CarritoCompra.id_carrito).filter(
+            CarritoCompra.id_usuario == user_id,
+            CarritoCompra.estado == "activo"
+        ).scalar()
+        if cart_id is None:
+            # El id del carrito lo asigna la base: crear el carrito es la única escritura inmediata
+            now = datetime.datetime.utcnow()
+            row = CarritoCompra(id_usuario=user_id, estado="activo", subtotal=0.0,
+                                fecha_creacion=now, fecha_actualizacion=now)
+            db.add(row)
+            db.commit()
+            cart_id = row.id_carrito
+        cart = self._require(db, cart_id)
+        with self._lock:
+            self._active_by_user[user_id] = cart_id
+            return cart.info()
+
+    def items(self, db: Session, cart_id: int):
+        cart = self._require(db, cart_id)
+        with self._lock:
+            return [line.as_dict(cart_id) for line in cart.lines.values()]
+
+    # Cambios
+
+    def add_item(self, db: Session, cart_id: int, product_id: int, cantidad: int, descuento: float):
+        cart = self._require(db, cart_id)
+        with self._lock:
+            known = product_id in cart.lines
+        product = None if known else product_hydration.get_product(db, product_id)
+        with self._lock:
+            line = cart.lines.get(product_id)
+            if line is None:
+                if product is None:
+                    raise HTTPException(status_code=404, detail="Producto no encontrado")
+                line = self._new_line(cart, product, cantidad, descuento)
+                delta = line.subtotal
+            else:
+                delta = line.set(line.cantidad + cantidad, line.descuento)
+            cart.dirty.add(product_id)
+            cart.removed.discard(product_id)
+            self._changed(cart, delta)
+            return line.as_dict(cart_id)
+
+    def update_item(self, db: Session, line_id: int, cantidad: int = None, descuento: float = None):
+        cart_id, pid = self._line_owner(db, line_id)
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            line = cart.lines.get(pid) if cart is not None else None
+            if line is None:
+                raise HTTPException(status_code=404, detail="Item no encontrado")
+            delta = line.set(cantidad if cantidad is not None else line.cantidad,
+                             descuento if descuento is not None else line.descuento)
+            cart.dirty.add(pid)
+            self._changed(cart, delta)
+            return line.as_dict(cart_id)
+
+    def remove_item(self, db: Session, line_id: int):
+        cart_id, pid = self._line_owner(db, line_id)
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None or pid not in cart.lines:
+                raise HTTPException(status_code=404, detail="Item no encontrado")
+            line = self._drop_line(cart, pid)
+            self._changed(cart, -line.subtotal)
+
+    def apply_operations(self, db: Session, cart_id: int, operaciones):
+        """
+        Mismas reglas que cart_service.apply_cart_operations: se valida todo antes de cambiar el carrito
+        """
+        cart = self._require(db, cart_id)
+        # Todos los productos que el lote agrega o cambia (también los que ya están: se pueden quitar y
+        # volver a agregar en el mismo lote), antes de tocar el carrito
+        product_ids = {op.id_producto for op in operaciones if op.op != "quitar"}
+        products = {p["id"]: p for p in product_hydration.hydrate_products(db, sorted(product_ids))}
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Productos no encontrados: {missing}")
+
+        with self._lock:
+            delta = 0.0
+            dropped = {}
+            for op in operaciones:
+                line = cart.lines.get(op.id_producto)
+                if op.op == "quitar" or (op.op == "cantidad" and op.cantidad == 0):
+                    if line is not None:
+                        dropped[op.id_producto] = self._drop_line(cart, op.id_producto)
+                        delta -= dropped[op.id_producto].subtotal
+                    continue
+                if line is None:
+                    line = self._new_line(cart, products[op.id_producto], 0, 0.0)
+                    previous = dropped.pop(op.id_producto, None)
+                    if previous is not None:
+                        # Quitado y vuelto a agregar en el lote: los ids de la línea anterior siguen sirviendo
+                        line.aliases.extend((previous.id, *previous.aliases))
+                        for line_id in line.aliases:
+                            self._line_index[line_id] = (cart_id, op.id_producto)
+                cantidad = line.cantidad + (op.cantidad if op.cantidad is not None else 1) if op.op == "agregar" \
+                    else op.cantidad
+                delta += line.set(cantidad, op.descuento if op.descuento is not None else line.descuento)
+                cart.dirty.add(op.id_producto)
+                cart.removed.discard(op.id_producto)
+            self._changed(cart, delta)
+            return cart.subtotal, [line.as_dict(cart_id) for line in cart.lines.values()]
+
+    def clear(self, db: Session, cart_id: int):
+        cart = self._require(db, cart_id)
+        with self._lock:
+            removed = len(cart.lines)
+            for pid in list(cart.lines):
+                self._drop_line(cart, pid)
+            self._changed(cart, -cart.subtotal)
+            return removed
+
+    # Escritura
+
+    def _take_pending(self, cart_ids=None):
+        # Copia lo pendiente y lo marca como escrito; si la escritura falla se vuelve a marcar
+        with self._lock:
+            carts = self._carts.values() if cart_ids is None else [self._carts[c] for c in cart_ids if c in self._carts]
+            batch = []
+            for cart in carts:
+                if not cart.pending():
+                    continue
+                lines = [cart.lines[pid].as_dict(cart.id_carrito) for pid in cart.dirty]
+                batch.append((cart, cart.info(), lines, list(cart.removed)))
+                cart.dirty, cart.removed, cart.header_dirty = set(), set(), False
+            return batch
+
+    def _restore_pending(self, batch):
+        with self._lock:
+            for cart, _, lines, removed in batch:
+                cart.header_dirty = True
+                cart.dirty.update(line["id_producto"] for line in lines if line["id_producto"] in cart.lines)
+                cart.removed.update(pid for pid in removed if pid not in cart.lines)
+
+    def _write(self, db: Session, batch):
+        upsert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else postgresql_insert
+        removed = [(info["id_carrito"], pid) for _, info, _, pids in batch for pid in pids]
+        for i in range(0, len(removed), FLUSH_CHUNK):
+            db.execute(
+                delete(DetalleCarrito)
+                .where(tuple_(DetalleCarrito.id_carrito, DetalleCarrito.id_producto).in_(removed[i:i + FLUSH_CHUNK]))
+            )
+
+        rows = [{key: value for key, value in line.items() if key != "id_detalle_carrito"}
+                for _, _, lines, _ in batch for line in lines]
+        written = []
+        for i in range(0, len(rows), FLUSH_CHUNK):
+            stmt = upsert(DetalleCarrito).values(rows[i:i + FLUSH_CHUNK])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[DetalleCarrito.id_carrito, DetalleCarrito.id_producto],
+                set_={name: stmt.excluded[name] for name in ("cantidad", "precio_unitario", "descuento", "subtotal")}
+            ).returning(DetalleCarrito.id_carrito, DetalleCarrito.id_producto, DetalleCarrito.id_detalle_carrito)
+            written.extend(db.execute(stmt).all())
+
+        db.execute(update(CarritoCompra), [
+            # El estado no se escribe: lo cambian el checkout y el barrido de abandonados en la base
+            {"id_carrito": info["id_carrito"], "subtotal": info["subtotal"], "fecha_actualizacion": info["fecha_actualizacion"]}
+            for _, info, _, _ in batch
+        ])
+        return written, len(removed) + len(rows)
+
+    def _drop_missing(self, db: Session, batch):
+        # Los carritos borrados en la base no se pueden escribir: se olvidan con sus cambios
+        ids = [info["id_carrito"] for _, info, _, _ in batch]
+        existing = set()
+        for i in range(0, len(ids), FLUSH_CHUNK):
+            existing.update(db.execute(
+                select(CarritoCompra.id_carrito).where(CarritoCompra.id_carrito.in_(ids[i:i + FLUSH_CHUNK]))
+            ).scalars())
+        missing = [cart for cart, info, _, _ in batch if info["id_carrito"] not in existing]
+        if missing:
+            with self._lock:
+                for cart in missing:
+                    if self._carts.get(cart.id_carrito) is cart:
+                        self._forget(cart)
+                self._counters["carritos_inexistentes"] += len(missing)
+        return [entry for entry in batch if entry[1]["id_carrito"] in existing]
+
+    def _write_each(self, db: Session, batch):
+        # Un carrito por transacción: los que fallan no frenan a los demás
+        written, num_lines, failed = [], 0, []
+        for entry in batch:
+            try:
+                rows, lines = self._write(db, [entry])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                print(f"Error escribiendo el carrito {entry[1]['id_carrito']} en memoria: {str(e)}")
+                failed.append(entry)
+                continue
+            written.extend(rows)
+            num_lines += lines
+        return written, num_lines, failed
+
+    def _record_failures(self, failed):
+        self._restore_pending(failed)
+        with self._lock:
+            self._counters["errores"] += 1
+            for cart, *_ in failed:
+                cart.failed_writes += 1
+                if cart.failed_writes >= FLUSH_MAX_FAILURES and self._carts.get(cart.id_carrito) is cart:
+                    print(f"Se descartan los cambios del carrito {cart.id_carrito}: falló {cart.failed_writes} veces al escribirse")
+                    self._forget(cart)
+                    self._counters["carritos_descartados"] += 1
+
+    def flush(self, cart_ids=None):
+        """
+        Escribe los carritos con cambios pendientes (o solo cart_ids) en una transacción; si falla por
+        los datos, de a un carrito. Devuelve cuántos carritos y líneas escribió y cuántos fallaron.
+        """
+        with self._flush_lock:
+            batch = self._take_pending(cart_ids)
+            if not batch:
+                return {"carritos": 0, "lineas": 0, "fallidos": 0}
+            db = SessionLocal()
+            try:
+                batch = self._drop_missing(db, batch)
+                written, num_lines, failed = [], 0, []
+                if batch:
+                    try:
+                        written, num_lines = self._write(db, batch)
+                        db.commit()
+                    except (IntegrityError, DataError):
+                        db.rollback()
+                        written, num_lines, failed = self._write_each(db, batch)
+            except Exception:
+                # Error de la base (conexión, bloqueo): todo queda pendiente para la próxima tanda
+                db.rollback()
+                self._restore_pending(batch)
+                with self._lock:
+                    self._counters["errores"] += 1
+                raise
+            finally:
+                db.close()
+            if failed:
+                self._record_failures(failed)
+            failed_ids = {cart.id_carrito for cart, *_ in failed}
+            done = [entry for entry in batch if entry[1]["id_carrito"] not in failed_ids]
+
+            with self._lock:
+                for cart, *_ in done:
+                    cart.failed_writes = 0
+                # Las líneas nuevas reciben su id real; el provisional sigue resolviendo a la misma línea
+                for cart_id, pid, line_id in written:
+                    cart = self._carts.get(cart_id)
+                    line = cart.lines.get(pid) if cart is not None else None
+                    if line is not None and line.id != line_id:
+                        if line.id < 0:
+                            line.aliases.append(line.id)
+                        line.id = line_id
+                        self._line_index[line_id] = (cart_id, pid)
+                self._counters["escrituras"] += 1
+                self._counters["carritos_escritos"] += len(done)
+                self._counters["lineas_escritas"] += num_lines
+                self._evict()
+            return {"carritos": len(done), "lineas": num_lines, "fallidos": len(failed)}
+
+    def _evict(self):
+        # Se descartan los carritos sin cambios pendientes menos usados
+        excess = len(self._carts) - self.max_carts
+        if excess <= 0:
+            return
+        clean = sorted((cart for cart in self._carts.values() if not cart.pending()), key=lambda cart: cart.last_access)
+        for cart in clean[:excess]:
+            self._forget(cart)
+
+    def _forget(self, cart: _Cart):
+        del self._carts[cart.id_carrito]
+        for line in cart.lines.values():
+            self._unindex(cart.id_carrito, line)
+        if self._active_by_user.get(cart.id_usuario) == cart.id_carrito:
+            del self._active_by_user[cart.id_usuario]
+
+    def abandon(self, cutoff: datetime.datetime, mark):
+        """
+        Llama a mark(excluidos), que marca los carritos abandonados en la base (UPDATE y commit) y
+        devuelve sus ids, sin los carritos que en memoria cambiaron desde cutoff o tienen cambios sin
+        escribir. El lock queda tomado hasta el commit, así ningún cambio en memoria se cuela entre la
+        revisión y el UPDATE. Los carritos marcados se olvidan (el próximo uso lee la base).
+        """
+        with self._lock:
+            busy = [cart_id for cart_id, cart in self._carts.items()
+                    if cart.pending() or (cart.fecha_actualizacion is not None and cart.fecha_actualizacion >= cutoff)]
+            marked = mark(busy)
+            for cart_id in marked:
+                cart = self._carts.get(cart_id)
+                if cart is not None:
+                    self._forget(cart)
+            return marked
+
+    def release(self, cart_id: int):
+        """
+        Escribe los cambios pendientes del carrito y lo quita de la memoria, para operar sobre él
+        directamente en la base (checkout, carritos abandonados)
+        """
+        self.flush([cart_id])
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is not None and not cart.pending():
+                self._forget(cart)
+
+    def _run(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error escribiendo los carritos en memoria: {str(e)}")
+                print(traceback.format_exc())
+
+    def start(self, interval: float):
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="cart-store-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        # Última escritura de lo pendiente
+        return self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counters,
+                "carritos": len(self._carts),
+                "carritos_pendientes": sum(1 for cart in self._carts.values() if cart.pending()),
+                "lineas_pendientes": sum(len(cart.dirty) + len(cart.removed) for cart in self._carts.values()),
+            }
+
+_store = None
+_lock = threading.Lock()
+
+# Función para obtener la memoria de carritos (None si cart_store_enabled está desactivado)
+def get_store():
+    global _store
+    if not settings.cart_store_enabled:
+        return None
+    if _store is None:
+        with _lock:
+            if _store is None:
+                store = CartStore(settings.cart_store_max_carts)
+                store.start(settings.cart_store_flush_seconds)
+                _store = store
+    return _store
+
+def release(cart_id: int):
+    store = _store
+    if store is not None:
+        store.release(cart_id)
+
+def stats():
+    store = _store
+    return store.stats() if store is not None else {"activo": False}
+
+# Función para detener el hilo de escritura y escribir lo pendiente (al apagar la app)
+def shutdown():
+    global _store
+    with _lock:
+        store, _store = _store, None
+    if store is None:
+        return None
+    try:
+        return store.stop()
+    except Exception as e:
+        print(f"Error escribiendo los carritos en memoria al apagar: {str(e)}")
+        print(traceback.format_exc())
+
+# Si el proceso termina sin pasar por el lifespan de la app
+atexit.register(shutdown)
@@ -0,0 +1,206 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from datetime import datetime, timedelta
+import gzip
+import json
+import os
+import threading
+import time
+
+from app.core.config import settings
+from app.models.cart import CarritoCompra
+from app.models.cart_item import DetalleCarrito
+from app.services import cart_store
+
+# Barrido de carritos abandonados:
+# 1. Los carritos activos sin cambios desde hace cart_abandon_after_hours pasan a "abandonado".
+# 2. Si cart_purge_after_days > 0, los abandonados hace más de esos días se archivan (JSON Lines
+#    comprimido en cart_archive_dir, si está configurado) y se borran junto con sus items.
+# Todo por lotes de cart_sweep_batch_size carritos, un commit por lote y una pausa de
+# cart_sweep_pause_seconds entre lotes para no competir con el tráfico de la tienda.
+
+_lock = threading.Lock()
+_metrics = {
+    "corridas": 0,
+    "lotes": 0,
+    "carritos_abandonados": 0,
+    "carritos_archivados": 0,
+    "carritos_borrados": 0,
+    "items_borrados": 0,
+    "ultima_corrida": None,
+    "duracion_segundos": None,
+    "ultimo_resultado": None,
+}
+
+def _pause():
+    if settings.cart_sweep_pause_seconds > 0:
+        time.sleep(settings.cart_sweep_pause_seconds)
+
+# Función para marcar como abandonados los carritos activos sin movimiento
+def mark_abandoned(db: Session, cutoff: datetime, batch_size: int, max_batches: int):
+    """
+    Un UPDATE por lote: los batch_size primeros carritos (por id) activos con fecha_actualizacion
+    anterior a cutoff. Con la memoria de carritos activa, cada lote se marca con su lock tomado y sin
+    los carritos que cambiaron en memoria. Devuelve cuántos marcó y cuántos lotes usó.
+    """
+    store = cart_store.get_store()
+    marked, batches, last_id = 0, 0, 0
+    stale = (CarritoCompra.estado == "activo", CarritoCompra.fecha_actualizacion < cutoff)
+
+    def mark(busy=()):
+        ids = select(CarritoCompra.id_carrito)\
+            .where(CarritoCompra.id_carrito > last_id, CarritoCompra.id_carrito.notin_(busy), *stale)\
+            .order_by(CarritoCompra.id_carrito)\
+            .limit(batch_size)\
+            .scalar_subquery()
+        # Las condiciones se repiten en el UPDATE: un carrito usado entre medio no se toca
+        updated = db.execute(
+            update(CarritoCompra)
+            .where(CarritoCompra.id_carrito.in_(ids), *stale)
+            .values(estado="abandonado", fecha_actualizacion=datetime.utcnow())
+            .returning(CarritoCompra.id_carrito)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        db.commit()
+        return updated
+
+    while batches < max_batches:
+        updated = store.abandon(cutoff, mark) if store is not None else mark()
+        batches += 1
+        if not updated:
+            break
+        marked += len(updated)
+        last_id = max(updated)
+        if len(updated) < batch_size:
+            break
+        _pause()
+    return marked, batches
+
+def _archive_path(archive_dir: str):
+    os.makedirs(archive_dir, exist_ok=True)
+    return os.path.join(archive_dir, f"carritos-{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}.jsonl.gz")
+
+def _archive_rows(db: Session, cart_ids):
+    carts = db.query(CarritoCompra).filter(CarritoCompra.id_carrito.in_(cart_ids)).all()
+    items = {}
+    for item in db.query(DetalleCarrito).filter(DetalleCarrito.id_carrito.in_(cart_ids)).all():
+        items.setdefault(item.id_carrito, []).append({
+            "id_detalle_carrito": item.id_detalle_carrito,
+            "id_producto": item.id_producto,
+            "cantidad": item.cantidad,
+            "precio_unitario": item.precio_unitario,
+            "descuento": item.descuento,
+            "subtotal": item.subtotal,
+        })
+    return [{
+        "id_carrito": cart.id_carrito,
+        "id_usuario": cart.id_usuario,
+        "estado": cart.estado,
+        "subtotal": cart.subtotal,
+        "fecha_creacion": cart.fecha_creacion.isoformat() if cart.fecha_creacion else None,
+        "fecha_actualizacion": cart.fecha_actualizacion.isoformat() if cart.fecha_actualizacion else None,
+        "items": items.get(cart.id_carrito, []),
+    } for cart in carts]
+
+# Función para archivar y borrar los carritos abandonados hace tiempo
+def purge_abandoned(db: Session, cutoff: datetime, batch_size: int, max_batches: int, archive_dir: str = None):
+    """
+    Por lote: se leen los carritos (y sus items) para el archivo, se escriben y después se borran
+    items y carritos en la misma transacción. Si el borrado falla, el lote se vuelve a archivar
+    en la corrida siguiente. Devuelve cuántos carritos archivó y borró, cuántos items y cuántos lotes.
+    """
+    archived, deleted, deleted_items, batches = 0, 0, 0, 0
+    archive = gzip.open(_archive_path(archive_dir), "at", encoding="utf-8") if archive_dir else None
+    try:
+        while batches < max_batches:
+            cart_ids = db.execute(
+                select(CarritoCompra.id_carrito)
+                .where(CarritoCompra.estado == "abandonado", CarritoCompra.fecha_actualizacion < cutoff)
+                .order_by(CarritoCompra.id_carrito)
+                .limit(batch_size)
+            ).scalars().all()
+            batches += 1
+            if not cart_ids:
+                break
+
+            if archive is not None:
+                rows = _archive_rows(db, cart_ids)
+                archive.writelines(json.dumps(row) + "\n" for row in rows)
+                archive.flush()
+                archived += len(rows)
+
+            deleted_items += db.execute(
+                delete(DetalleCarrito).where(DetalleCarrito.id_carrito.in_(cart_ids))
+            ).rowcount
+            deleted += db.execute(
+                delete(CarritoCompra)
+                .where(CarritoCompra.id_carrito.in_(cart_ids), CarritoCompra.estado == "abandonado")
+            ).rowcount
+            db.commit()
+            if len(cart_ids) < batch_size:
+                break
+            _pause()
+    finally:
+        if archive is not None:
+            archive.close()
+    return archived, deleted, deleted_items, batches
+
+# Función para ejecutar una corrida completa del barrido
+def sweep(db: Session):
+    """
+    Marca los abandonados y, si está configurado, archiva y borra los viejos. Cada paso hace a lo
+    sumo cart_sweep_max_batches lotes; lo que quede sigue en la corrida siguiente.
+    Devuelve el resumen de la corrida.
+    """
+    if not _lock.acquire(blocking=False):
+        return {"en_curso": True}
+    try:
+        inicio = time.time()
+        now = datetime.utcnow()
+        batch_size = settings.cart_sweep_batch_size
+        max_batches = settings.cart_sweep_max_batches
+
+        # Los cambios en memoria se escriben antes, para que fecha_actualizacion esté al día
+        store = cart_store.get_store()
+        if store is not None:
+            store.flush()
+
+        marked, batches = mark_abandoned(db, now - timedelta(hours=settings.cart_abandon_after_hours), batch_size, max_batches)
+        archived = deleted = deleted_items = 0
+        if settings.cart_purge_after_days > 0:
+            archived, deleted, deleted_items, purge_batches = purge_abandoned(
+                db, now - timedelta(days=settings.cart_purge_after_days), batch_size, max_batches,
+                archive_dir=settings.cart_archive_dir or None
+            )
+            batches += purge_batches
+
+        result = {
+            "abandonados": marked,
+            "archivados": archived,
+            "borrados": deleted,
+            "items_borrados": deleted_items,
+            "lotes": batches,
+        }
+        _metrics["corridas"] += 1
+        _metrics["lotes"] += batches
+        _metrics["carritos_abandonados"] += marked
+        _metrics["carritos_archivados"] += archived
+        _metrics["carritos_borrados"] += deleted
+        _metrics["items_borrados"] += deleted_items
+        _metrics["ultima_corrida"] = datetime.now()
+        _metrics["duracion_segundos"] = time.time() - inicio
+        _metrics["ultimo_resultado"] = result
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        _lock.release()
+
+def stats():
+    return {
+        **_metrics,
+        "en_curso": _lock.locked(),
+        "abandonar_despues_de_horas": settings.cart_abandon_after_hours,
+        "borrar_despues_de_dias": settings.cart_purge_after_days,
+    }
@@ -0,0 +1,208 @@
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from itertools import combinations
+import heapq
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+from app.services.sales_cursor import SalesCursor, iter_new_sales
+from app.services.sales_history import iter_baskets
+
+# Conteos de soporte que se actualizan ticket a ticket
+class ItemsetCounts:
+    """
+    Guarda el soporte (número de tickets) de cada producto, de cada par y opcionalmente de cada trío.
+    La confianza y el lift se derivan al momento de consultar, así que registrar una venta cuesta
+    lo que mide su ticket y no todo el historial.
+    """
+    def __init__(self, track_triples: bool = False):
+        self.track_triples = track_triples
+        self.num_transacciones = 0
+        self.sales = SalesCursor()  # ventas ya contadas, para no contar dos veces un ticket
+        self._items = {}
+        self._pairs = defaultdict(dict)  # a -> {b: conteo}, guardado en ambos sentidos
+        self._triples = defaultdict(dict)  # (a, b) con a < b -> {c: conteo}
+        self._lock = threading.Lock()
+
+    def add_transaction(self, product_ids, id_venta: int = None):
+        items = sorted(set(product_ids))
+        if not items:
+            return
+        with self._lock:
+            if id_venta is not None and not self.sales.remember(id_venta):
+                return  # Ya contada
+            self.num_transacciones += 1
+            for a in items:
+                self._items[a] = self._items.get(a, 0) + 1
+            for a, b in combinations(items, 2):
+                self._pairs[a][b] = self._pairs[a].get(b, 0) + 1
+                self._pairs[b][a] = self._pairs[b].get(a, 0) + 1
+            if self.track_triples:
+                for a, b, c in combinations(items, 3):
+                    for pair, rest in (((a, b), c), ((a, c), b), ((b, c), a)):
+                        self._triples[pair][rest] = self._triples[pair].get(rest, 0) + 1
+
+    @property
+    def last_id_venta(self):
+        return self.sales.last_id_venta
+
+    @property
+    def version(self):
+        return f"incremental-{self.last_id_venta}"
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def __contains__(self, product_id: int):
+        return product_id in self._pairs
+
+    def _rules_for(self, antecedent_count: int, consequents: dict):
+        """
+        Deriva (lift, confianza) de cada consecuente y descarta los que no llegan a los umbrales
+        """
+        n = self.num_transacciones
+        min_count = settings.recommendation_min_support * n
+        rules = []
+        for rec_id, count in consequents.items():
+            if count < min_count:
+                continue
+            confidence = count / antecedent_count
+            if confidence < settings.recommendation_min_confidence:
+                continue
+            lift = confidence * n / self._items[rec_id]
+            rules.append((-lift, -confidence, rec_id))
+        rules.sort()
+        return rules
+
+    def recommend(self, product_ids, exclude=None, max_recommendations: int = 4):
+        """
+        Reglas {a}->{b} (y {a,b}->{c} si se cuentan tríos) de los productos dados, combinadas por lift y confianza
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        streams = []
+        with self._lock:
+            for a in product_ids:
+                if a in self._pairs:
+                    streams.append(self._rules_for(self._items[a], dict(self._pairs[a])))
+            if self.track_triples:
+                for pair in combinations(sorted(product_ids), 2):
+                    pair_count = self._pairs.get(pair[0], {}).get(pair[1])
+                    if pair_count and pair in self._triples:
+                        streams.append(self._rules_for(pair_count, dict(self._triples[pair])))
+
+        recommended = []
+        seen = set(exclude or ())
+        for _, _, rec_id in heapq.merge(*streams):
+            if rec_id in seen:
+                continue
+            seen.add(rec_id)
+            recommended.append(rec_id)
+            if len(recommended) >= max_recommendations:
+                break
+        return recommended
+
+    def stats(self):
+        with self._lock:
+            return {
+                "productos": len(self._items),
+                "pares": sum(len(v) for v in self._pairs.values()) // 2,
+                "trios": sum(len(v) for v in self._triples.values()) // 3,
+            }
+
+# Adaptador para servir los conteos con la misma interfaz que el modelo precalculado
+class IncrementalRuleModel:
+    def __init__(self, counts: ItemsetCounts):
+        self.counts = counts
+        self.index = counts
+
+    @property
+    def version(self):
+        return self.counts.version
+
+    def info(self):
+        return {
+            "version": self.version,
+            "modo": "incremental",
+            "num_transacciones": self.counts.num_transacciones,
+            "indice": self.counts.stats(),
+        }
+
+_counts = None
+_pending = None  # ventas registradas mientras se reconstruyen los conteos
+_last_sync = 0.0
+_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+# Función para reconstruir los conteos desde todo el historial
+def rebuild(db: Session):
+    """
+    Recorre una vez el historial de ventas completadas y publica conteos nuevos
+    """
+    with _rebuild_lock:
+        return _rebuild(db)
+
+def _rebuild(db: Session):
+    global _counts, _pending, _last_sync
+    with _lock:
+        _pending = []
+    counts = ItemsetCounts(track_triples=settings.recommendation_track_triples)
+    try:
+        for id_venta, product_ids in iter_new_sales(db, counts.sales, iter_baskets):
+            counts.add_transaction(product_ids, id_venta)
+    except Exception:
+        with _lock:
+            _pending = None
+        raise
+    with _lock:
+        for id_venta, product_ids in _pending:
+            counts.add_transaction(product_ids, id_venta)
+        _pending = None
+        _counts = counts
+        _last_sync = time.monotonic()
+    return counts
+
+# Función para agregar una venta recién completada
+def record_sale(id_venta: int, product_ids):
+    """
+    Suma el ticket a los conteos en memoria; si aún no se construyeron no hace nada
+    """
+    with _lock:
+        if _pending is not None:
+            _pending.append((id_venta, list(product_ids)))
+            return
+        counts = _counts
+    if counts is not None:
+        counts.add_transaction(product_ids, id_venta)
+
+def _sync(db: Session, counts: ItemsetCounts):
+    # Ventas registradas por otros procesos o completadas tarde
+    for id_venta, product_ids in iter_new_sales(db, counts.sales, iter_baskets):
+        counts.add_transaction(product_ids, id_venta)
+
+def get_counts(db: Session):
+    """
+    Devuelve los conteos en memoria, construyéndolos la primera vez y poniéndose al día cada
+    recommendation_incremental_sync_seconds con las ventas de otros procesos
+    """
+    global _last_sync
+    counts = _counts
+    if counts is None:
+        with _rebuild_lock:
+            if _counts is None:
+                return _rebuild(db)
+            return _counts
+
+    now = time.monotonic()
+    if now - _last_sync >= settings.recommendation_incremental_sync_seconds:
+        _last_sync = now
+        try:
+            _sync(db, counts)
+        except Exception as e:
+            print(f"Error en itemset_counts.get_counts: {str(e)}")
+            print(traceback.format_exc())
+    return counts
+
+def get_incremental_model(db: Session):
+    return IncrementalRuleModel(get_counts(db))
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import apriori, fpgrowth, association_rules
+
+from app.core.config import settings
+from app.services.basket_matrix import BasketMatrix
+
+# Motores de minería de reglas intercambiables.
+# Todos reciben la matriz de canastas y devuelven (reglas, conjuntos frecuentes): las reglas con
+# RULE_COLUMNS, donde antecedents y consequents son listas de ids de producto, y los conjuntos
+# frecuentes de 2 a MAX_ITEMSET_SIZE productos con ITEMSET_COLUMNS (items es una lista de ids).
+
+RULE_COLUMNS = ['antecedents', 'consequents', 'support', 'confidence', 'lift']
+ITEMSET_COLUMNS = ['items', 'support']
+MAX_ITEMSET_SIZE = 4
+
+def empty_rules():
+    return pd.DataFrame(columns=RULE_COLUMNS)
+
+def empty_itemsets():
+    return pd.DataFrame(columns=ITEMSET_COLUMNS)
+
+def _itemsets_to_ids(frequent_itemsets: pd.DataFrame, product_ids: np.ndarray):
+    # Solo combos (2 a MAX_ITEMSET_SIZE productos), con las columnas convertidas a ids de producto
+    sizes = frequent_itemsets['itemsets'].apply(len)
+    combos = frequent_itemsets[(sizes >= 2) & (sizes <= MAX_ITEMSET_SIZE)]
+    if combos.empty:
+        return empty_itemsets()
+    return pd.DataFrame({
+        'items': [sorted(int(product_ids[i]) for i in items) for items in combos['itemsets']],
+        'support': combos['support'].to_numpy(dtype=np.float64),
+    }, columns=ITEMSET_COLUMNS)
+
+def _mine_frequent_itemsets(finder, basket: BasketMatrix, min_support: float, min_confidence: float):
+    if basket.weights is not None:
+        # La configuración ya lo impide (Settings.check_decay_engine); por si se llama con otro motor
+        raise ValueError("apriori y fpgrowth no admiten pesos por venta: usar el motor pairwise con decaimiento")
+    frequent_itemsets = finder(basket.to_dataframe(), min_support=min_support, use_colnames=True)
+    if frequent_itemsets.empty:
+        return empty_rules(), empty_itemsets()
+
+    product_ids = basket.product_ids
+    itemsets = _itemsets_to_ids(frequent_itemsets, product_ids)
+    rules = association_rules(frequent_itemsets, num_itemsets=len(basket),
+                              metric="confidence", min_threshold=min_confidence)
+    if rules.empty:
+        return empty_rules(), itemsets
+
+    # Convertir los frozensets de columnas a listas de ids de producto
+    rules['antecedents'] = rules['antecedents'].apply(lambda x: [int(product_ids[i]) for i in x])
+    rules['consequents'] = rules['consequents'].apply(lambda x: [int(product_ids[i]) for i in x])
+    return rules[RULE_COLUMNS].reset_index(drop=True), itemsets
+
+# Apriori de mlxtend (comportamiento original)
+def mine_apriori(basket: BasketMatrix, min_support: float, min_confidence: float):
+    return _mine_frequent_itemsets(apriori, basket, min_support, min_confidence)
+
+# FP-Growth de mlxtend: mismos conjuntos frecuentes sin generar candidatos
+def mine_fpgrowth(basket: BasketMatrix, min_support: float, min_confidence: float):
+    return _mine_frequent_itemsets(fpgrowth, basket, min_support, min_confidence)
+
+# Co-ocurrencia de pares con NumPy/scipy: solo reglas {a} -> {b}
+def mine_pairwise(basket: BasketMatrix, min_support: float, min_confidence: float):
+    """
+    Calcula soporte, confianza y lift de todos los pares con un producto de matrices dispersas (X^T X).
+    No genera reglas con más de un producto en el antecedente ni conjuntos de más de dos productos,
+    a cambio de un costo que no depende de la explosión de candidatos. Si la matriz tiene pesos por
+    venta, los conteos son ponderados.
+    """
+    if len(basket) == 0:
+        return empty_rules(), empty_itemsets()
+    n = basket.total_weight()
+
+    counts = basket.pair_counts().tocoo()
+    item_counts = counts.diagonal().astype(np.float64) if counts.shape[0] else np.empty(0)
+    mask = (counts.row != counts.col) & (counts.data >= min_support * n)
+    rows, cols, pair_counts = counts.row[mask], counts.col[mask], counts.data[mask].astype(np.float64)
+
+    # Cada par frecuente una sola vez como conjunto {a, b}
+    upper = rows < cols
+    product_ids = basket.product_ids
+    itemsets = pd.DataFrame({
+        'items': [sorted((int(a), int(b))) for a, b in zip(product_ids[rows[upper]], product_ids[cols[upper]])],
+        'support': pair_counts[upper] / n,
+    }, columns=ITEMSET_COLUMNS)
+
+    confidence = pair_counts / item_counts[rows]
+    keep = confidence >= min_confidence
+    rows, cols, pair_counts, confidence = rows[keep], cols[keep], pair_counts[keep], confidence[keep]
+    lift = confidence / (item_counts[cols] / n)
+
+    rules = pd.DataFrame({
+        'antecedents': [[int(p)] for p in product_ids[rows]],
+        'consequents': [[int(p)] for p in product_ids[cols]],
+        'support': pair_counts / n,
+        'confidence': confidence,
+        'lift': lift,
+    }, columns=RULE_COLUMNS)
+    return rules, itemsets
+
+ENGINES = {
+    "apriori": mine_apriori,
+    "fpgrowth": mine_fpgrowth,
+    "pairwise": mine_pairwise,
+}
+
+def get_engine(name: str = None):
+    """
+    Devuelve el motor configurado (recommendation_engine) o el indicado por nombre
+    """
+    name = name or settings.recommendation_engine
+    if name not in ENGINES:
+        raise ValueError(f"Motor de reglas desconocido: {name}. Opciones: {', '.join(ENGINES)}")
+    return ENGINES[name]
@@ -0,0 +1,151 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+from app.services.basket_matrix import build_basket_matrix
+from app.services.sales_history import iter_user_product_pairs
+
+# Recomendaciones personalizadas: similitud coseno ítem-ítem sobre la matriz usuarios x productos
+# y candidatos por cliente calculados por lotes fuera del request.
+
+def _top_k_per_row(matrix: sparse.csr_matrix, k: int):
+    """
+    Deja en cada fila solo los k valores más altos (argpartition sobre los datos de la fila)
+    """
+    indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+    keep = np.zeros(len(data), dtype=bool)
+    for row in range(matrix.shape[0]):
+        start, end = indptr[row], indptr[row + 1]
+        if end - start <= k:
+            keep[start:end] = True
+        else:
+            keep[start + np.argpartition(-data[start:end], k)[:k]] = True
+    kept = np.concatenate([[0], np.cumsum(keep)])
+    new_indptr = kept[indptr]
+    return sparse.csr_matrix((data[keep], indices[keep], new_indptr), shape=matrix.shape)
+
+def _sorted_row(matrix: sparse.csr_matrix, row: int):
+    start, end = matrix.indptr[row], matrix.indptr[row + 1]
+    data, cols = matrix.data[start:end], matrix.indices[start:end]
+    order = np.lexsort((cols, -data))
+    return cols[order], data[order]
+
+# Vecinos más parecidos de cada producto según quién los compra
+class ItemSimilarity:
+    """
+    Coseno entre las columnas de la matriz usuarios x productos (binaria), podado a los
+    `neighbors` vecinos más parecidos por producto. Filas y columnas son posiciones en product_ids.
+    """
+    def __init__(self, neighbors: sparse.csr_matrix, product_ids: np.ndarray):
+        self.neighbors = neighbors
+        self.product_ids = product_ids
+        self._positions = {int(pid): i for i, pid in enumerate(product_ids)}
+
+    @classmethod
+    def from_user_items(cls, user_items: sparse.csr_matrix, product_ids: np.ndarray, neighbors: int):
+        x = user_items.astype(np.float32)
+        co = (x.T @ x).tocsr()
+        norms = np.sqrt(co.diagonal())
+        norms[norms == 0] = 1.0
+        inv = sparse.diags(1.0 / norms)
+        cosine = (inv @ co @ inv).tocsr()
+        cosine.setdiag(0)
+        cosine.eliminate_zeros()
+        return cls(_top_k_per_row(cosine, neighbors).astype(np.float32), product_ids)
+
+    def similar(self, product_id: int, k: int):
+        """
+        [(id_producto, similitud)] de los k productos más parecidos
+        """
+        row = self._positions.get(product_id)
+        if row is None:
+            return []
+        cols, data = _sorted_row(self.neighbors, row)
+        return [(int(self.product_ids[c]), float(s)) for c, s in zip(cols[:k], data[:k])]
+
+# Candidatos por cliente guardados en arreglos contiguos (sin objetos por cliente)
+class UserCandidateStore:
+    """
+    user_ids ordenado; los candidatos del cliente i son product_ids[indptr[i]:indptr[i+1]],
+    ya ordenados por puntaje
+    """
+    def __init__(self, user_ids: np.ndarray, indptr: np.ndarray, product_ids: np.ndarray, scores: np.ndarray,
+                 similarity: ItemSimilarity = None):
+        self.user_ids = user_ids
+        self.indptr = indptr
+        self.product_ids = product_ids
+        self.scores = scores
+        self.similarity = similarity
+        self.fecha_creacion = datetime.now()
+        self.version = f"{self.fecha_creacion:%Y%m%d%H%M%S}"
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def candidates(self, user_id: int):
+        i = np.searchsorted(self.user_ids, user_id)
+        if i >= len(self.user_ids) or self.user_ids[i] != user_id:
+            return []
+        return self.product_ids[self.indptr[i]:self.indptr[i + 1]].tolist()
+
+    def nbytes(self):
+        return self.user_ids.nbytes + self.indptr.nbytes + self.product_ids.nbytes + self.scores.nbytes
+
+    def info(self):
+        return {
+            "version": self.version,
+            "fecha_creacion": self.fecha_creacion,
+            "clientes": len(self),
+            "candidatos": len(self.product_ids),
+            "memoria_bytes": self.nbytes(),
+        }
+
+# Función para calcular los candidatos de todos los clientes por lotes
+def build_user_candidates(pair_chunks, neighbors: int, candidates: int, batch_users: int = 5000):
+    """
+    pair_chunks: bloques (ids_usuario, ids_producto). Puntaje de un producto para un cliente =
+    suma de su similitud con los productos que el cliente compró.
+    """
+    user_items = build_basket_matrix(pair_chunks)  # filas = clientes
+    if len(user_items) == 0:
+        return UserCandidateStore(np.empty(0, np.int64), np.zeros(1, np.int64), np.empty(0, np.int32), np.empty(0, np.float32))
+
+    similarity = ItemSimilarity.from_user_items(user_items.matrix, user_items.product_ids, neighbors)
+    x = user_items.matrix.astype(np.float32)
+    counts, items, scores = [], [], []
+    for start in range(0, x.shape[0], batch_users):
+        block = _top_k_per_row((x[start:start + batch_users] @ similarity.neighbors).tocsr(), candidates)
+        for row in range(block.shape[0]):
+            cols, data = _sorted_row(block, row)
+            counts.append(len(cols))
+            items.append(user_items.product_ids[cols].astype(np.int32))
+            scores.append(data.astype(np.float32))
+
+    indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return UserCandidateStore(
+        user_items.venta_ids, indptr,
+        np.concatenate(items) if items else np.empty(0, np.int32),
+        np.concatenate(scores) if scores else np.empty(0, np.float32),
+        similarity
+    )
+
+def build_store(db: Session):
+    return build_user_candidates(
+        iter_user_product_pairs(db), settings.personalization_neighbors, settings.personalization_candidates
+    )
+
+_store = None
+
+def publish(store: UserCandidateStore):
+    global _store
+    _store = store
+
+def get_store():
+    """
+    Candidatos ya calculados, o None si todavía no se construyeron (nunca se calculan en el request)
+    """
+    if not settings.personalization_enabled:
+        return None
+    return _store
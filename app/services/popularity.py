@@ -0,0 +1,258 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from itertools import groupby
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+from app.models.product import Product
+from app.services import product_hydration, single_flight
+from app.services.sales_cursor import SalesCursor, iter_new_sales
+from app.services.sales_history import iter_sale_lines
+# Con decaimiento, los pesos se reescalan cuando superan 2**RESCALE_EXPONENT
+RESCALE_EXPONENT = 64
+
+# Lista de productos ordenada por puntaje que se mantiene al día con cada incremento
+class _Ranking:
+    """
+    Los puntajes solo crecen, así que al sumarle a un producto basta con subirlo
+    posiciones hasta su lugar: el costo es lo que se mueve, no el tamaño de la lista.
+    """
+    def __init__(self, scores: dict, product_ids=()):
+        self._scores = scores
+        self._order = sorted(product_ids, key=lambda pid: (-scores[pid], pid))
+        self._pos = {pid: i for i, pid in enumerate(self._order)}
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def bump(self, product_id: int):
+        i = self._pos.get(product_id)
+        if i is None:
+            i = len(self._order)
+            self._order.append(product_id)
+        scores, order, pos = self._scores, self._order, self._pos
+        score = scores[product_id]
+        while i > 0:
+            prev = order[i - 1]
+            if scores[prev] > score or (scores[prev] == score and prev < product_id):
+                break
+            order[i] = prev
+            pos[prev] = i
+            i -= 1
+        order[i] = product_id
+        pos[product_id] = i
+
+# Ranking de productos más vendidos, global y por categoría
+class PopularityRanking:
+    """
+    Cuenta las líneas vendidas de cada producto. Si half_life_days > 0, cada venta pesa
+    la mitad cada half_life_days (decaimiento hacia adelante: las ventas nuevas pesan más
+    en lugar de envejecer todos los puntajes).
+    """
+    def __init__(self, half_life_days: float = 0.0):
+        self.half_life_seconds = half_life_days * 86400
+        self.landmark = datetime.now()
+        self.sales = SalesCursor()
+        self.num_lineas = 0
+        self.catalog_version = None
+        self.catalog_loaded_at = 0.0
+        self._scores = {}
+        self._categories = {}
+        self._active_ids = frozenset()
+        self._global = _Ranking(self._scores)
+        self._by_category = {}
+        self._lock = threading.Lock()
+
+    def _weight(self, fecha_venta: datetime):
+        if not self.half_life_seconds:
+            return 1.0
+        # Venta sin fecha (registrada sin fecha_venta): cuenta como de ahora
+        fecha_venta = fecha_venta or datetime.now()
+        exponent = (fecha_venta - self.landmark).total_seconds() / self.half_life_seconds
+        if exponent > RESCALE_EXPONENT:
+            self._rescale(fecha_venta)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _rescale(self, landmark: datetime):
+        # Multiplicar todos los puntajes por el mismo factor no cambia el orden
+        factor = 2.0 ** -((landmark - self.landmark).total_seconds() / self.half_life_seconds)
+        for product_id in self._scores:
+            self._scores[product_id] *= factor
+        self.landmark = landmark
+
+    def _add_line(self, product_id: int, weight: float):
+        self._scores[product_id] = self._scores.get(product_id, 0.0) + weight
+        self._global.bump(product_id)
+        id_categoria = self._categories.get(product_id)
+        if id_categoria is not None:
+            ranking = self._by_category.get(id_categoria)
+            if ranking is None:
+                ranking = self._by_category[id_categoria] = _Ranking(self._scores)
+            ranking.bump(product_id)
+        self.num_lineas += 1
+
+    def add_sale(self, id_venta: int, product_ids, fecha_venta: datetime = None):
+        """
+        Suma cada línea del ticket (un producto repetido cuenta una vez por línea)
+        """
+        with self._lock:
+            if id_venta is not None and not self.sales.remember(id_venta):
+                return  # Ya contada
+            weight = self._weight(fecha_venta)
+            for product_id in product_ids:
+                self._add_line(product_id, weight)
+
+    def set_catalog(self, categories: dict, active_ids, catalog_version: int):
+        """
+        Actualiza categorías y productos activos, y reordena los rankings por categoría
+        con los puntajes actuales (no vuelve a leer el historial)
+        """
+        with self._lock:
+            self._categories = categories
+            self._active_ids = frozenset(active_ids)
+            grouped = {}
+            for product_id in self._scores:
+                id_categoria = categories.get(product_id)
+                if id_categoria is not None:
+                    grouped.setdefault(id_categoria, []).append(product_id)
+            self._by_category = {c: _Ranking(self._scores, ids) for c, ids in grouped.items()}
+            self.catalog_version = catalog_version
+            self.catalog_loaded_at = time.monotonic()
+
+    def _take(self, ranking, limit: int, exclude, exclude_categories=()):
+        result = []
+        if limit <= 0 or ranking is None:
+            return result
+        for product_id in ranking:
+            if product_id not in self._active_ids or product_id in exclude:
+                continue
+            if exclude_categories and self._categories.get(product_id) in exclude_categories:
+                continue
+            result.append(product_id)
+            if len(result) >= limit:
+                break
+        return result
+
+    def top(self, limit: int, exclude=(), exclude_categories=()):
+        """
+        Los limit productos activos más vendidos, salteando los excluidos
+        """
+        with self._lock:
+            return self._take(self._global, limit, set(exclude), set(exclude_categories))
+
+    def top_in_category(self, id_categoria: int, limit: int, exclude=()):
+        with self._lock:
+            return self._take(self._by_category.get(id_categoria), limit, set(exclude))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "productos": len(self._scores),
+                "categorias": len(self._by_category),
+                "lineas": self.num_lineas,
+                "ultima_venta": self.sales.last_id_venta,
+                "vida_media_dias": self.half_life_seconds / 86400,
+            }
+
+BUILD_FLIGHT = "popularidad"
+SYNC_FLIGHT = "popularidad_sync"
+
+_ranking = None
+_pending = None  # ventas registradas mientras se reconstruye el ranking
+_last_sync = 0.0
+_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+def _load_catalog(db: Session, ranking: PopularityRanking):
+    version = product_hydration.catalog_version()
+    snapshot = product_hydration.get_snapshot(db)
+    if snapshot is not None:
+        categories = {pid: p["id_categoria"] for pid, p in snapshot.products.items()}
+        active_ids = snapshot.active_ids
+    else:
+        rows = db.query(Product.id, Product.id_categoria, Product.estado).all()
+        categories = {row.id: row.id_categoria for row in rows}
+        active_ids = [row.id for row in rows if row.estado]
+    ranking.set_catalog(categories, active_ids, version)
+
+def _add_lines(ranking: PopularityRanking, lines):
+    for id_venta, rows in groupby(lines, key=lambda row: row[0]):
+        rows = list(rows)
+        ranking.add_sale(id_venta, [row[2] for row in rows], rows[0][1])
+
+# Función para reconstruir el ranking desde todo el historial
+def rebuild(db: Session):
+    """
+    Recorre una vez las líneas de ventas completadas y publica un ranking nuevo
+    """
+    with _rebuild_lock:
+        return _rebuild(db)
+
+def _rebuild(db: Session):
+    global _ranking, _pending, _last_sync
+    with _lock:
+        _pending = []
+    ranking = PopularityRanking(settings.recommendation_popularity_half_life_days)
+    try:
+        _load_catalog(db, ranking)
+        _add_lines(ranking, iter_new_sales(db, ranking.sales, iter_sale_lines))
+    except Exception:
+        with _lock:
+            _pending = None
+        raise
+    with _lock:
+        for id_venta, product_ids, fecha_venta in _pending:
+            ranking.add_sale(id_venta, product_ids, fecha_venta)
+        _pending = None
+        _ranking = ranking
+        _last_sync = time.monotonic()
+    return ranking
+
+# Función para agregar una venta recién completada
+def record_sale(id_venta: int, product_ids, fecha_venta: datetime = None):
+    """
+    Suma el ticket al ranking en memoria; si aún no se construyó no hace nada
+    """
+    with _lock:
+        if _pending is not None:
+            _pending.append((id_venta, list(product_ids), fecha_venta))
+            return
+        ranking = _ranking
+    if ranking is not None:
+        ranking.add_sale(id_venta, product_ids, fecha_venta)
+
+def _sync(db: Session, ranking: PopularityRanking):
+    # Ventas registradas por otros procesos o completadas tarde
+    _add_lines(ranking, iter_new_sales(db, ranking.sales, iter_sale_lines))
+    # Productos nuevos, modificados o dados de baja
+    if (ranking.catalog_version != product_hydration.catalog_version()
+            or time.monotonic() - ranking.catalog_loaded_at >= settings.product_snapshot_ttl_seconds):
+        _load_catalog(db, ranking)
+
+def get_ranking(db: Session):
+    """
+    Devuelve el ranking en memoria, construyéndolo la primera vez y poniéndose al día cada
+    recommendation_incremental_sync_seconds con las ventas de otros procesos y los cambios del catálogo
+    """
+    global _last_sync
+    ranking = _ranking
+    if ranking is None:
+        # Los requests que llegan durante la primera construcción esperan ese mismo ranking
+        return single_flight.do(BUILD_FLIGHT, lambda: _ranking or rebuild(db))
+
+    now = time.monotonic()
+    if (now - _last_sync >= settings.recommendation_incremental_sync_seconds
+            or ranking.catalog_version != product_hydration.catalog_version()):
+        _last_sync = now
+        try:
+            single_flight.do(SYNC_FLIGHT, lambda: _sync(db, ranking))
+        except Exception as e:
+            print(f"Error en popularity.get_ranking: {str(e)}")
+            print(traceback.format_exc())
+    return ranking
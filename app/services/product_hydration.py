@@ -0,0 +1,107 @@
+from sqlalchemy.orm import Session
+import threading
+import time
+
+from app.core.config import settings
+from app.models.product import Product
+
+# Campos que muestran las recomendaciones
+_FIELDS = (Product.id, Product.nombre, Product.precio_venta, Product.imagen, Product.id_categoria, Product.estado)
+
+def _to_dict(row):
+    return {
+        "id": row.id,
+        "nombre": row.nombre,
+        "precio_venta": row.precio_venta,
+        "imagen": row.imagen,
+        "id_categoria": row.id_categoria
+    }
+
+# Copia en memoria del catálogo para armar las respuestas sin ir a la base
+class ProductSnapshot:
+    """
+    Foto del catálogo: id -> campos de la respuesta, los productos activos y los activos por categoría
+    """
+    def __init__(self, products: dict, active_ids: frozenset, catalog_version: int):
+        self.products = products
+        self.active_ids = active_ids
+        self.catalog_version = catalog_version
+        self.loaded_at = time.monotonic()
+        by_category = {}
+        for pid in sorted(active_ids):
+            by_category.setdefault(products[pid]["id_categoria"], []).append(pid)
+        self.by_category = by_category
+
+    def is_fresh(self):
+        return (self.catalog_version == _catalog_version
+                and time.monotonic() - self.loaded_at < settings.product_snapshot_ttl_seconds)
+
+_snapshot = None
+_catalog_version = 0
+_lock = threading.Lock()
+
+# Función para descartar la copia del catálogo
+def invalidate():
+    """
+    Se llama al crear, modificar o eliminar productos. En otros procesos la copia expira
+    a los product_snapshot_ttl_seconds.
+    """
+    global _snapshot, _catalog_version
+    _catalog_version += 1
+    _snapshot = None
+
+def catalog_version():
+    return _catalog_version
+
+def get_snapshot(db: Session):
+    """
+    Devuelve la copia del catálogo, cargándola con una sola consulta si no existe o expiró.
+    Devuelve None si product_snapshot_enabled está desactivado.
+    """
+    global _snapshot
+    if not settings.product_snapshot_enabled:
+        return None
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_fresh():
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.is_fresh():
+            return snapshot
+        version = _catalog_version
+        rows = db.query(*_FIELDS).all()
+        snapshot = ProductSnapshot(
+            {row.id: _to_dict(row) for row in rows},
+            frozenset(row.id for row in rows if row.estado),
+            version
+        )
+        _snapshot = snapshot
+    return snapshot
+
+# Función para obtener los datos de varios productos respetando el orden del ranking
+def hydrate_products(db: Session, product_ids):
+    """
+    Devuelve los productos en el mismo orden que product_ids (sin repetidos ni inexistentes),
+    con a lo sumo una consulta al catálogo
+    """
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return []
+
+    found = {}
+    snapshot = get_snapshot(db)
+    if snapshot is not None:
+        found = {pid: snapshot.products[pid] for pid in ids if pid in snapshot.products}
+
+    # Productos que no están en la copia (creados en otro proceso) o caché desactivada
+    missing = [pid for pid in ids if pid not in found]
+    if missing:
+        found.update({row.id: _to_dict(row) for row in db.query(*_FIELDS).filter(Product.id.in_(missing)).all()})
+
+    return [dict(found[pid]) for pid in ids if pid in found]
+
+def get_product(db: Session, product_id: int):
+    products = hydrate_products(db, [product_id])
+    return products[0] if products else None
@@ -0,0 +1,109 @@
+from sqlalchemy.orm import Session
+from bisect import bisect_right
+import random
+import threading
+import time
+
+from app.core.config import settings
+from app.models.product import Product
+from app.services import product_hydration
+
+# Intentos de muestreo por rechazo antes de recorrer las listas en orden
+REJECTION_ATTEMPTS_PER_ITEM = 8
+
+# Ids de productos activos agrupados por categoría para elegir al azar sin ORDER BY random()
+class ProductSampler:
+    """
+    Elige productos activos al azar (uniforme) con muestreo por rechazo: cada intento es un
+    índice aleatorio, así que el costo depende de cuántos se piden y no del tamaño del catálogo.
+    Si las exclusiones cubren casi todo, termina recorriendo las listas desde un punto al azar.
+    """
+    def __init__(self, by_category: dict, catalog_version: int, source=None):
+        self.by_category = {c: ids for c, ids in by_category.items() if ids}
+        self.catalog_version = catalog_version
+        self.source = source
+        self.loaded_at = time.monotonic()
+        self.num_productos = sum(len(ids) for ids in self.by_category.values())
+
+    def is_fresh(self, snapshot):
+        if snapshot is not None:
+            return self.source is snapshot
+        return (self.source is None
+                and self.catalog_version == product_hydration.catalog_version()
+                and time.monotonic() - self.loaded_at < settings.product_snapshot_ttl_seconds)
+
+    def sample(self, limit: int, exclude=(), exclude_categories=(), rng=random):
+        """
+        Hasta limit ids distintos, fuera de exclude y de las categorías excluidas
+        """
+        if limit <= 0:
+            return []
+        exclude = set(exclude)
+        pools = [ids for c, ids in self.by_category.items() if c not in exclude_categories]
+        if not pools:
+            return []
+
+        # Tamaños acumulados para que cada producto tenga la misma probabilidad
+        cumulative = []
+        total = 0
+        for ids in pools:
+            total += len(ids)
+            cumulative.append(total)
+
+        result = []
+        for _ in range(REJECTION_ATTEMPTS_PER_ITEM * limit):
+            r = rng.randrange(total)
+            i = bisect_right(cumulative, r)
+            product_id = pools[i][r - (cumulative[i - 1] if i else 0)]
+            if product_id in exclude:
+                continue
+            exclude.add(product_id)
+            result.append(product_id)
+            if len(result) >= limit:
+                return result
+
+        # Muchos rechazos: casi todo está excluido, se recorre desde una posición al azar
+        start = rng.randrange(total)
+        for offset in range(total):
+            r = (start + offset) % total
+            i = bisect_right(cumulative, r)
+            product_id = pools[i][r - (cumulative[i - 1] if i else 0)]
+            if product_id in exclude:
+                continue
+            exclude.add(product_id)
+            result.append(product_id)
+            if len(result) >= limit:
+                break
+        return result
+
+_sampler = None
+_lock = threading.Lock()
+
+def get_sampler(db: Session):
+    """
+    Devuelve el muestreador, armado sobre la copia del catálogo (se renueva junto con ella)
+    o, si está desactivada, con una consulta de los productos activos
+    """
+    global _sampler
+    snapshot = product_hydration.get_snapshot(db)
+    sampler = _sampler
+    if sampler is not None and sampler.is_fresh(snapshot):
+        return sampler
+
+    with _lock:
+        sampler = _sampler
+        if sampler is not None and sampler.is_fresh(snapshot):
+            return sampler
+        if snapshot is not None:
+            sampler = ProductSampler(snapshot.by_category, snapshot.catalog_version, source=snapshot)
+        else:
+            version = product_hydration.catalog_version()
+            by_category = {}
+            for row in db.query(Product.id, Product.id_categoria)\
+                    .filter(Product.estado.is_(True))\
+                    .order_by(Product.id)\
+                    .all():
+                by_category.setdefault(row.id_categoria, []).append(row.id)
+            sampler = ProductSampler(by_category, version)
+        _sampler = sampler
+    return sampler
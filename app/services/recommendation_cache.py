@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import threading
+import time
+
+from app.core.config import settings
+from app.services import product_hydration
+
+# Caché LRU con vencimiento de respuestas de recomendaciones
+class RecommendationCache:
+    """
+    Guarda la lista de recomendaciones por clave (producto o carrito + max_recommendations).
+    Todas las entradas pertenecen a una generación (versión del modelo, versión del catálogo):
+    cuando cambia alguna, la caché se vacía entera.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_generation(self, generation):
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.generation = generation
+
+    def get(self, key, generation):
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return [dict(p) for p in value]
+
+    def put(self, key, generation, value):
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, [dict(p) for p in value])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entries),
+                "max_entradas": self.max_entries,
+                "ttl_segundos": self.ttl_seconds,
+                "aciertos": self.hits,
+                "fallos": self.misses,
+                "tasa_aciertos": self.hits / total if total else 0.0,
+                "vencidas": self.expirations,
+                "desalojadas": self.evictions,
+                "invalidaciones": self.invalidations,
+            }
+
+_cache = RecommendationCache(settings.recommendation_cache_max_entries, settings.recommendation_cache_ttl_seconds)
+
+def generation(model):
+    return (model.version if model else None, product_hydration.catalog_version())
+
+def product_key(product_id: int, max_recommendations: int):
+    return ("producto", product_id, max_recommendations)
+
+def cart_key(cart_item_ids, max_recommendations: int):
+    return ("carrito", tuple(sorted(set(cart_item_ids))), max_recommendations)
+
+def bundle_key(product_id: int, max_bundles: int):
+    return ("combos", product_id, max_bundles)
+
+def personal_key(user_id: int, cart_item_ids, max_recommendations: int, store_version: str):
+    return ("cliente", user_id, tuple(sorted(set(cart_item_ids))), max_recommendations, store_version)
+
+# Función para leer una respuesta guardada (None si no está, venció o cambió el modelo o el catálogo)
+def get(key, model):
+    if not settings.recommendation_cache_enabled:
+        return None
+    return _cache.get(key, generation(model))
+
+def put(key, model, value):
+    if settings.recommendation_cache_enabled:
+        _cache.put(key, generation(model), value)
+
+def clear():
+    _cache.clear()
+
+def stats():
+    return {"activa": settings.recommendation_cache_enabled, **_cache.stats()}
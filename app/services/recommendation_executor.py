@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+import asyncio
+import threading
+import time
+
+from app.core.config import settings
+
+# Pool propio para el trabajo de CPU de las recomendaciones
+class BoundedExecutor:
+    """
+    Corre el cálculo de recomendaciones en max_workers hilos propios, fuera del threadpool por defecto
+    de FastAPI (que comparten el resto de las rutas, por ejemplo el checkout). Si ya hay max_queue
+    tareas esperando, rechaza la nueva con 503 en lugar de acumular requests.
+    Son hilos y no procesos porque el modelo, la caché y los índices viven en memoria de este proceso;
+    el minado, que sí es largo, ya corre en el pool de procesos de recommendation_jobs.
+    """
+    def __init__(self, max_workers: int, max_queue: int, name: str = "recomendaciones"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_waiting = 0
+        self._wait_seconds = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def _task(self, enqueued: float, func, args, kwargs):
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self._wait_seconds += time.monotonic() - enqueued
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Ejecuta func(*args, **kwargs) en el pool y espera el resultado sin bloquear el event loop
+        """
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Servicio de recomendaciones saturado, intente nuevamente",
+                    headers={"Retry-After": "1"}
+                )
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            future = self._get_executor().submit(self._task, time.monotonic(), func, args, kwargs)
+        except Exception:
+            self._unqueue()
+            raise
+        # Si se cancela antes de empezar (cliente desconectado o shutdown) _task no corre: se saca de la cola acá
+        future.add_done_callback(lambda f: self._unqueue() if f.cancelled() else None)
+        return await asyncio.wrap_future(future)
+
+    def _unqueue(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "hilos": self.max_workers,
+                "max_en_cola": self.max_queue,
+                "en_cola": self.waiting,
+                "en_curso": self.running,
+                "completadas": self.completed,
+                "fallidas": self.failed,
+                "rechazadas": self.rejected,
+                "pico_en_cola": self.max_waiting,
+                "espera_promedio_ms": self._wait_seconds / started * 1000 if started else 0.0,
+            }
+
+executor = BoundedExecutor(settings.recommendation_executor_workers, settings.recommendation_executor_max_queue)
+
+async def run(func, *args, **kwargs):
+    return await executor.run(func, *args, **kwargs)
+
+def shutdown():
+    executor.shutdown()
+
+def stats():
+    return executor.stats()
@@ -0,0 +1,187 @@
+from app.db.session import SessionLocal
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import func
+import multiprocessing
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+from app.models.recommendation_model import ModeloRecomendacion
+from app.models.sale import Venta
+from app.services import personalization, popularity, recommendation_model, recommendation_service, sales_export
+from app.services.scheduler import scheduler
+
+# Trabajos en segundo plano del modelo de recomendaciones
+
+RETRAIN_JOB = "reentrenar_reglas"
+PERSONALIZATION_JOB = "candidatos_por_cliente"
+EXPORT_JOB = "exportar_ventas"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el proceso hijo no hereda conexiones ni hilos del servidor
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.recommendation_training_processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+# Se ejecuta en el proceso del pool: abre su propia sesión y devuelve las reglas minadas
+def _mine_rules_in_worker():
+    db = SessionLocal()
+    try:
+        return recommendation_service.mine_rules(db)
+    finally:
+        db.close()
+
+def _mine_in_pool():
+    return _get_pool().submit(_mine_rules_in_worker).result()
+
+def _build_personalization_in_worker():
+    db = SessionLocal()
+    try:
+        return personalization.build_store(db)
+    finally:
+        db.close()
+
+# Función para reentrenar el modelo de reglas fuera del request
+def retrain_rules():
+    """
+    Mina en un proceso aparte (si recommendation_training_processes > 0) y guarda y publica
+    la versión nueva en este proceso. Devuelve la versión publicada; si ya había un entrenamiento
+    en curso, espera y devuelve esa misma versión.
+    """
+    db = SessionLocal()
+    try:
+        if settings.recommendation_data_source == "exportacion":
+            # El trainer lee los archivos: primero se agregan las ventas nuevas
+            sales_export.export_sales(db)
+        miner = _mine_in_pool if settings.recommendation_training_processes > 0 else None
+        model = recommendation_service.train_rule_model(db, miner=miner)
+        return model.version if model else None
+    finally:
+        db.close()
+
+# Función para recalcular los candidatos personalizados de todos los clientes
+def refresh_personalization():
+    """
+    Construye la similitud ítem-ítem y los candidatos por cliente (en un proceso aparte si
+    recommendation_training_processes > 0) y los publica. Devuelve la versión publicada.
+    """
+    if settings.recommendation_training_processes > 0:
+        store = _get_pool().submit(_build_personalization_in_worker).result()
+    else:
+        store = _build_personalization_in_worker()
+    personalization.publish(store)
+    return store.version
+
+# Función para construir al iniciar las estructuras en memoria que recorren todo el historial
+def warm_up():
+    """
+    Modelo activo según el modo (conteos incrementales, índice de similitud o reglas guardadas)
+    y ranking de populares. Un request que llega mientras tanto espera esta misma construcción
+    en lugar de empezar otra.
+    """
+    db = SessionLocal()
+    try:
+        inicio = time.time()
+        recommendation_model.get_active_model(db)
+        popularity.get_ranking(db)
+        print(f"Recomendaciones precargadas en {time.time() - inicio:.1f} s")
+    except Exception as e:
+        print(f"Error precargando las recomendaciones: {str(e)}")
+        print(traceback.format_exc())
+    finally:
+        db.close()
+
+def start_warm_up():
+    # En cada worker (la memoria no se comparte), sin demorar el arranque de la app
+    if settings.recommendation_warm_up:
+        threading.Thread(target=warm_up, name="recommendation-warm-up", daemon=True).start()
+
+# Función para agregar las ventas nuevas a la exportación columnar
+def export_sales():
+    db = SessionLocal()
+    try:
+        return sales_export.export_sales(db)
+    finally:
+        db.close()
+
+# Disparador: hay al menos recommendation_retrain_after_sales ventas nuevas desde el último modelo
+def has_enough_new_sales():
+    db = SessionLocal()
+    try:
+        ultimo = db.query(ModeloRecomendacion.num_transacciones, ModeloRecomendacion.fecha_creacion)\
+            .order_by(ModeloRecomendacion.id_modelo.desc())\
+            .first()
+        query = db.query(func.count(Venta.id_venta)).filter(Venta.estado == 'completada')
+        if ultimo and settings.recommendation_window_days:
+            # Con ventana, num_transacciones cuenta solo las ventas minadas: se cuentan las posteriores al modelo
+            nuevas = query.filter(Venta.fecha_venta >= ultimo.fecha_creacion).scalar() or 0
+        else:
+            nuevas = (query.scalar() or 0) - (ultimo.num_transacciones if ultimo else 0)
+        return nuevas >= settings.recommendation_retrain_after_sales
+    finally:
+        db.close()
+
+# Disparador: todavía no hay ningún modelo de reglas guardado (primer uso)
+def has_no_saved_model():
+    db = SessionLocal()
+    try:
+        return db.query(ModeloRecomendacion.id_modelo).filter(ModeloRecomendacion.estado == "activo").first() is None
+    finally:
+        db.close()
+
+# Función para pedir un reentrenamiento desde un request sin esperarlo
+def request_retrain(reason: str):
+    """
+    Lo lanza el planificador, y solo si este worker es el que corre los trabajos (en los demás lo
+    lanza el disparador has_no_saved_model). No hace nada si ya está en curso o terminó hace menos
+    de scheduler_check_seconds. Devuelve si lo lanzó.
+    """
+    job = scheduler.jobs.get(RETRAIN_JOB)
+    if job is None or not scheduler.is_running():
+        return False
+    if job.last_run and time.time() - job.last_run < settings.scheduler_check_seconds:
+        return False
+    return scheduler.run_now(RETRAIN_JOB, reason)
+
+def register_jobs(scheduler):
+    """
+    Registra el reentrenamiento del primer modelo, por intervalo y/o por ventas nuevas según la
+    configuración (solo en modo "modelo"; el modo incremental se actualiza con cada venta) y la exportación
+    columnar de ventas cada sales_export_interval_seconds
+    """
+    if settings.sales_export_interval_seconds:
+        scheduler.register(EXPORT_JOB, export_sales, interval_seconds=settings.sales_export_interval_seconds)
+    if settings.recommendation_mode != "modelo":
+        return
+    interval = settings.recommendation_retrain_interval_seconds
+    # Siempre se registra: sin modelo guardado se entrena el primero
+    if settings.recommendation_retrain_after_sales > 0:
+        trigger = lambda: has_no_saved_model() or has_enough_new_sales()
+    else:
+        trigger = has_no_saved_model
+    scheduler.register(RETRAIN_JOB, retrain_rules, interval_seconds=interval, trigger=trigger)
+
+def register_worker_jobs(scheduler):
+    """
+    Trabajos de cada worker (lo que construyen vive en la memoria del proceso): si está activa, la
+    personalización, que se calcula al iniciar y cada personalization_refresh_seconds
+    """
+    if settings.personalization_enabled:
+        scheduler.register(PERSONALIZATION_JOB, refresh_personalization,
+                           interval_seconds=settings.personalization_refresh_seconds, run_at_start=True)
@@ -0,0 +1,213 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+import pandas as pd
+import datetime
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+from app.models.recommendation_model import ModeloRecomendacion
+from app.models.association_rule import ReglaAsociacion
+from app.models.frequent_itemset import ConjuntoFrecuente
+from app.services import itemset_counts, similarity_index
+from app.services.bundle_index import BundleIndex
+from app.services.rule_index import RuleIndex
+
+# Modelo de reglas en memoria, inmutable una vez publicado
+class RuleModel:
+    """
+    Versión de las reglas de asociación cargada en memoria para servir recomendaciones
+    """
+    def __init__(self, version: str, rules: pd.DataFrame, fecha_creacion=None, num_transacciones: int = 0,
+                 itemsets: pd.DataFrame = None):
+        self.version = version
+        self.fecha_creacion = fecha_creacion
+        self.num_transacciones = num_transacciones
+        self.num_reglas = len(rules)
+        # Solo se conservan los índices compilados; los DataFrames de reglas y conjuntos se descartan
+        self.index = RuleIndex.from_rules(rules, settings.recommendation_index_max_per_product)
+        self.bundles = BundleIndex.from_itemsets(itemsets, settings.recommendation_bundles_per_product)
+
+    def info(self):
+        return {
+            "version": self.version,
+            "fecha_creacion": self.fecha_creacion,
+            "num_transacciones": self.num_transacciones,
+            "num_reglas": self.num_reglas,
+            "indice": self.index.stats(),
+            "combos": self.bundles.stats(),
+        }
+
+# Estado del proceso: el modelo publicado se reemplaza por asignación (hot-swap atómico)
+_active_model = None
+_last_check = 0.0
+_load_lock = threading.Lock()
+training_lock = threading.Lock()  # evita dos entrenamientos simultáneos en el proceso
+
+def _join_ids(ids):
+    return ",".join(str(int(i)) for i in sorted(ids))
+
+def _split_ids(value: str):
+    return [int(i) for i in value.split(",") if i]
+
+# Función para persistir una versión nueva del modelo
+def save_model(db: Session, rules: pd.DataFrame, num_transacciones: int, duracion_segundos: float = None,
+               itemsets: pd.DataFrame = None):
+    """
+    Guarda las reglas y los conjuntos frecuentes como una versión nueva y desactiva las anteriores
+    en la misma transacción
+    """
+    try:
+        modelo = ModeloRecomendacion(
+            fecha_creacion=datetime.datetime.utcnow(),
+            num_transacciones=num_transacciones,
+            num_reglas=len(rules),
+            duracion_segundos=duracion_segundos,
+            estado="activo"
+        )
+        db.add(modelo)
+        db.flush()  # Obtener el id_modelo generado
+        modelo.version = f"{modelo.fecha_creacion:%Y%m%d%H%M%S}-{modelo.id_modelo}"
+
+        rows = [{
+            "id_modelo": modelo.id_modelo,
+            "antecedentes": _join_ids(rule.antecedents),
+            "consecuentes": _join_ids(rule.consequents),
+            "soporte": float(rule.support),
+            "confianza": float(rule.confidence),
+            "lift": float(rule.lift)
+        } for rule in rules.itertuples()]
+        if rows:
+            db.execute(insert(ReglaAsociacion), rows)
+
+        if itemsets is not None and not itemsets.empty:
+            db.execute(insert(ConjuntoFrecuente), [{
+                "id_modelo": modelo.id_modelo,
+                "productos": _join_ids(itemset.items),
+                "tamano": len(itemset.items),
+                "soporte": float(itemset.support)
+            } for itemset in itemsets.itertuples()])
+
+        # Solo una versión queda activa
+        db.query(ModeloRecomendacion).filter(
+            ModeloRecomendacion.id_modelo != modelo.id_modelo,
+            ModeloRecomendacion.estado == "activo"
+        ).update({"estado": "inactivo"}, synchronize_session=False)
+
+        _prune_old_models(db)
+
+        db.commit()
+        db.refresh(modelo)
+        return modelo
+    except Exception:
+        db.rollback()
+        raise
+
+def _prune_old_models(db: Session):
+    old_ids = [row.id_modelo for row in db.query(ModeloRecomendacion.id_modelo)
+               .order_by(ModeloRecomendacion.id_modelo.desc())
+               .offset(settings.recommendation_models_to_keep)
+               .all()]
+    if old_ids:
+        db.query(ReglaAsociacion).filter(ReglaAsociacion.id_modelo.in_(old_ids)).delete(synchronize_session=False)
+        db.query(ConjuntoFrecuente).filter(ConjuntoFrecuente.id_modelo.in_(old_ids)).delete(synchronize_session=False)
+        db.query(ModeloRecomendacion).filter(ModeloRecomendacion.id_modelo.in_(old_ids)).delete(synchronize_session=False)
+
+# Función para cargar una versión guardada en memoria
+def load_model(db: Session, id_modelo: int):
+    """
+    Lee las reglas y los conjuntos frecuentes de una versión guardada y devuelve el modelo listo para servir
+    """
+    modelo = db.query(ModeloRecomendacion).filter(ModeloRecomendacion.id_modelo == id_modelo).first()
+    if not modelo:
+        return None
+
+    rows = db.query(
+        ReglaAsociacion.antecedentes,
+        ReglaAsociacion.consecuentes,
+        ReglaAsociacion.soporte,
+        ReglaAsociacion.confianza,
+        ReglaAsociacion.lift
+    ).filter(ReglaAsociacion.id_modelo == id_modelo).all()
+
+    rules = pd.DataFrame({
+        "antecedents": [_split_ids(r.antecedentes) for r in rows],
+        "consequents": [_split_ids(r.consecuentes) for r in rows],
+        "support": [r.soporte for r in rows],
+        "confidence": [r.confianza for r in rows],
+        "lift": [r.lift for r in rows],
+    })
+
+    itemset_rows = db.query(ConjuntoFrecuente.productos, ConjuntoFrecuente.soporte)\
+        .filter(ConjuntoFrecuente.id_modelo == id_modelo).all()
+    itemsets = pd.DataFrame({
+        "items": [_split_ids(r.productos) for r in itemset_rows],
+        "support": [r.soporte for r in itemset_rows],
+    })
+
+    return RuleModel(modelo.version, rules, modelo.fecha_creacion, modelo.num_transacciones, itemsets=itemsets)
+
+# Función para publicar un modelo en el proceso
+def swap_active_model(model: RuleModel):
+    """
+    Reemplaza el modelo que sirve las recomendaciones; los requests en curso conservan la versión anterior
+    """
+    global _active_model, _last_check
+    _active_model = model
+    _last_check = time.monotonic()
+
+def _is_fresh(now: float):
+    return _last_check and now - _last_check < settings.recommendation_model_refresh_seconds
+
+def get_active_model(db: Session):
+    """
+    Devuelve el modelo publicado. Cada cierto tiempo revisa si otro proceso guardó una versión más nueva.
+    Nunca mina reglas: si no hay ninguna versión guardada devuelve None.
+    En modo incremental devuelve los conteos por venta con la misma interfaz, y en modo
+    similitud el índice aproximado de productos comprados juntos.
+    """
+    if settings.recommendation_mode == "incremental":
+        return itemset_counts.get_incremental_model(db)
+    if settings.recommendation_mode == "similitud":
+        return similarity_index.get_similarity_model(db)
+    return get_rule_model(db)
+
+# Función para obtener el modelo de reglas guardado, sea cual sea el modo de recomendación
+def get_rule_model(db: Session):
+    """
+    Devuelve la última versión de reglas y combos publicada, revisando cada
+    recommendation_model_refresh_seconds si otro proceso guardó una más nueva
+    """
+    global _last_check
+    now = time.monotonic()
+    if _is_fresh(now):
+        return _active_model
+
+    # Mientras otro request recarga, se sigue sirviendo la versión actual
+    if not _load_lock.acquire(blocking=_active_model is None):
+        return _active_model
+    try:
+        if _is_fresh(now):
+            return _active_model
+        _last_check = now
+
+        latest = db.query(ModeloRecomendacion.id_modelo, ModeloRecomendacion.version)\
+            .filter(ModeloRecomendacion.estado == "activo")\
+            .order_by(ModeloRecomendacion.id_modelo.desc())\
+            .first()
+
+        if latest and (_active_model is None or _active_model.version != latest.version):
+            model = load_model(db, latest.id_modelo)
+            if model:
+                swap_active_model(model)
+    except Exception as e:
+        print(f"Error en get_active_model: {str(e)}")
+        print(traceback.format_exc())
+    finally:
+        _load_lock.release()
+
+    return _active_model
+
+def is_training():
+    return training_lock.locked()
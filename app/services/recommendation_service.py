@@ -1,149 +1,243 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 import pandas as pd
 import numpy as np
-from mlxtend.frequent_patterns import apriori, association_rules
 from fastapi import HTTPException
+from datetime import datetime, timedelta
+from itertools import zip_longest
+import time
 import traceback
 
+from app.core.config import settings
 from app.models.product import Product
 from app.models.sale import Venta
-from app.models.sale_detail import DetalleVenta
+from app.services import basket_matrix, mining_engines, personalization, popularity, product_hydration, product_sampler, recommendation_cache, recommendation_model, single_flight
 
 # Función principal para obtener recomendaciones basadas en un producto
-def get_recommendations_for_product(db: Session, product_id: int, max_recommendations: int = 4):
+def get_recommendations_for_product(db: Session, product_id: int, max_recommendations: int = 4, model=None):
     """
     Genera recomendaciones para un producto específico utilizando el algoritmo Apriori
     """
+    # Obtener el índice de reglas del modelo precalculado (nunca se minan durante el request)
+    if model is None:
+        model = recommendation_model.get_active_model(db)
+    
+    # Respuesta ya calculada para este producto con el mismo modelo y catálogo
+    cache_key = recommendation_cache.product_key(product_id, max_recommendations)
+    cached = recommendation_cache.get(cache_key, model)
+    if cached is not None:
+        return cached
+    
+    # Verificar que el producto existe
+    product = product_hydration.get_product(db, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    
     try:
-        # Verificar que el producto existe
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail="Producto no encontrado")
-        
-        # Obtener las reglas de asociación
-        rules_df = _generate_association_rules(db)
-        
-        if rules_df.empty:
-            # Si no hay suficientes datos para generar reglas, usar recomendaciones por categoría
-            return get_recommendations_by_category(db, product_id, max_recommendations)
-        
-        # Filtrar las reglas donde el producto actual está en los antecedentes
-        product_recommendations = rules_df[rules_df['antecedents'].apply(lambda x: product_id in x)]
-        
-        if product_recommendations.empty:
-            # Si no hay recomendaciones específicas para este producto
-            return get_recommendations_by_category(db, product_id, max_recommendations)
-        
-        # Ordenar por la métrica lift (mayor relevancia)
-        product_recommendations = product_recommendations.sort_values('lift', ascending=False)
-        
-        # Extraer los IDs de productos recomendados
         recommended_product_ids = []
-        for _, row in product_recommendations.iterrows():
-            for prod_id in row['consequents']:
-                if prod_id not in recommended_product_ids and prod_id != product_id:
-                    recommended_product_ids.append(prod_id)
-                    if len(recommended_product_ids) >= max_recommendations:
-                        break
-            if len(recommended_product_ids) >= max_recommendations:
-                break
+        if model is not None and product_id in model.index:
+            # Consecuentes ya ordenados por lift y confianza
+            recommended_product_ids = model.index.recommend(
+                [product_id], exclude={product_id}, max_recommendations=max_recommendations
+            )
         
         # Si no tenemos suficientes recomendaciones, complementar con productos de la misma categoría
         if len(recommended_product_ids) < max_recommendations:
-            category_recommendations = get_recommendations_by_category(
-                db, product_id, max_recommendations - len(recommended_product_ids)
+            recommended_product_ids += _category_fallback_ids(
+                db, product, max_recommendations - len(recommended_product_ids),
+                exclude={product_id, *recommended_product_ids}
             )
-            # Filtrar para evitar duplicados
-            for rec in category_recommendations:
-                if rec['id'] not in recommended_product_ids and rec['id'] != product_id:
-                    recommended_product_ids.append(rec['id'])
-                    if len(recommended_product_ids) >= max_recommendations:
-                        break
         
-        # Obtener los detalles completos de los productos recomendados
-        recommended_products = []
-        for prod_id in recommended_product_ids:
-            product = db.query(Product).filter(Product.id == prod_id).first()
-            if product:
-                recommended_products.append({
-                    "id": product.id,
-                    "nombre": product.nombre,
-                    "precio_venta": product.precio_venta,
-                    "imagen": product.imagen,
-                    "id_categoria": product.id_categoria
-                })
-        
-        return recommended_products
+        # Los detalles de todos los productos recomendados salen de una sola consulta (o de la copia del catálogo)
+        recommendations = product_hydration.hydrate_products(db, recommended_product_ids)
+        recommendation_cache.put(cache_key, model, recommendations)
+        return recommendations
         
-    except HTTPException:
-        raise
     except Exception as e:
         print(f"Error en get_recommendations_for_product: {str(e)}")
         print(traceback.format_exc())
         # En caso de error, devolver recomendaciones alternativas
         return get_recommendations_by_category(db, product_id, max_recommendations)
 
-# Función para generar las reglas de asociación usando Apriori
-def _generate_association_rules(db: Session, min_support=0.01, min_confidence=0.1):
+# Función para obtener recomendaciones de varios productos en una sola llamada
+def get_recommendations_for_products(db: Session, product_ids: list, max_recommendations: int = 4, model=None):
     """
-    Genera reglas de asociación a partir del historial de ventas usando Apriori
+    Genera recomendaciones para una lista de productos (por ejemplo, una página de categoría)
+    con una pasada por el índice de reglas y una sola hidratación para los productos recomendados.
+    Los ids que no existen reciben una lista vacía.
     """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+    
     try:
-        # Obtener todas las ventas y sus detalles
-        ventas = db.query(Venta).filter(Venta.estado == 'completada').all()
-        
-        if not ventas:
-            return pd.DataFrame()  # No hay datos suficientes
-            
-        # Crear un dataframe con las transacciones (venta_id, producto_id)
-        transactions = []
-        for venta in ventas:
-            detalles = db.query(DetalleVenta).filter(DetalleVenta.id_venta == venta.id_venta).all()
-            if detalles:
-                transaction = {
-                    'venta_id': venta.id_venta,
-                    'productos': [detalle.id_producto for detalle in detalles]
-                }
-                transactions.append(transaction)
+        # Productos solicitados: existencia y categoría
+        requested = {
+            p["id"]: p["id_categoria"] for p in product_hydration.hydrate_products(db, product_ids)
+        }
+        
+        if model is None:
+            model = recommendation_model.get_active_model(db)
+        
+        # Una pasada por el índice de reglas
+        recommended = {}
+        for product_id in product_ids:
+            if product_id not in requested:
+                continue
+            recommended[product_id] = model.index.recommend(
+                [product_id], exclude={product_id}, max_recommendations=max_recommendations
+            ) if model else []
+        
+        # Completar con productos de la misma categoría, a lo sumo una consulta para todas las categorías
+        short = [pid for pid, ids in recommended.items() if len(ids) < max_recommendations]
+        if short:
+            by_category = _category_candidates_bulk(
+                db, {requested[pid] for pid in short}, max_recommendations * 2 + 1
+            )
+            for pid in short:
+                ids = recommended[pid]
+                for rec_id in by_category.get(requested[pid], []):
+                    if len(ids) >= max_recommendations:
+                        break
+                    if rec_id != pid and rec_id not in ids:
+                        ids.append(rec_id)
         
-        if not transactions:
-            return pd.DataFrame()  # No hay datos suficientes
-            
-        # Crear matriz de incidencia (cada fila es una venta, cada columna es un producto)
-        # 1 si el producto está en la venta, 0 en caso contrario
-        all_products = set()
-        for t in transactions:
-            all_products.update(t['productos'])
+        # Obtener los detalles de todos los productos recomendados de una vez
+        all_ids = {rec_id for ids in recommended.values() for rec_id in ids}
+        products = {p["id"]: p for p in product_hydration.hydrate_products(db, all_ids)}
         
-        # Crear la matriz de incidencia
-        basket = pd.DataFrame(0, index=range(len(transactions)), 
-                             columns=list(all_products))
+        return {
+            product_id: [dict(products[rec_id]) for rec_id in recommended.get(product_id, []) if rec_id in products]
+            for product_id in product_ids
+        }
         
-        for i, t in enumerate(transactions):
-            basket.loc[i, t['productos']] = 1
+    except Exception as e:
+        print(f"Error en get_recommendations_for_products: {str(e)}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error obteniendo recomendaciones: {str(e)}")
+
+# Inicio de la ventana de minado (None = todo el historial)
+def _mining_since():
+    if settings.recommendation_window_days:
+        return datetime.now() - timedelta(days=settings.recommendation_window_days)
+    return None
+
+# Función para generar las reglas de asociación con el motor configurado
+def _generate_association_rules(db: Session, min_support=0.01, min_confidence=0.1, engine: str = None,
+                                since: datetime = None):
+    """
+    Genera reglas de asociación a partir del historial de ventas usando el motor configurado
+    (apriori, fpgrowth o pairwise). Devuelve (reglas, conjuntos frecuentes de 2 a 4 productos).
+    """
+    try:
+        # Matriz de canastas dispersa (ventas x productos) leída por bloques desde detalleventa,
+        # limitada a la ventana (since) y ponderada por antigüedad si corresponde
+        basket = basket_matrix.load_basket_matrix(
+            db, since=since, half_life_days=settings.recommendation_decay_half_life_days
+        )
         
-        # Aplicar Apriori para encontrar conjuntos frecuentes
-        frequent_itemsets = apriori(basket, min_support=min_support, use_colnames=True)
+        if len(basket) == 0:
+            return pd.DataFrame(), pd.DataFrame()  # No hay datos suficientes
         
-        if frequent_itemsets.empty:
-            return pd.DataFrame()  # No hay conjuntos frecuentes suficientes
-            
-        # Generar reglas de asociación
-        rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
+        rules, itemsets = mining_engines.get_engine(engine)(basket, min_support, min_confidence)
         
         if rules.empty:
-            return pd.DataFrame()  # No hay reglas suficientes
-            
-        # Convertir los frozensets a listas para facilitar su manejo
-        rules['antecedents'] = rules['antecedents'].apply(lambda x: list(x))
-        rules['consequents'] = rules['consequents'].apply(lambda x: list(x))
+            return pd.DataFrame(), itemsets  # No hay reglas suficientes
         
-        return rules
+        return rules, itemsets
         
     except Exception as e:
         print(f"Error en _generate_association_rules: {str(e)}")
         print(traceback.format_exc())
-        return pd.DataFrame()  # En caso de error devolver un dataframe vacío
+        return pd.DataFrame(), pd.DataFrame()  # En caso de error devolver dataframes vacíos
+
+# Función para minar las reglas con los parámetros configurados
+def mine_rules(db: Session):
+    """
+    Devuelve (reglas, conjuntos frecuentes, número de ventas completadas minadas). Es la parte costosa
+    del entrenamiento y puede correr en otro proceso (ver recommendation_jobs).
+    """
+    since = _mining_since()
+    query = db.query(func.count(Venta.id_venta)).filter(Venta.estado == 'completada')
+    if since is not None:
+        # Solo las ventas de la ventana, las mismas que entran en la matriz de canastas
+        query = query.filter(Venta.fecha_venta >= since)
+    num_transacciones = query.scalar() or 0
+    rules_df, itemsets_df = _generate_association_rules(
+        db,
+        min_support=settings.recommendation_min_support,
+        min_confidence=settings.recommendation_min_confidence,
+        since=since
+    )
+    if rules_df.empty:
+        rules_df = mining_engines.empty_rules()
+    if itemsets_df.empty:
+        itemsets_df = mining_engines.empty_itemsets()
+    return rules_df, itemsets_df, num_transacciones
+
+TRAIN_FLIGHT = "entrenar_reglas"
+
+# Función para entrenar y publicar una versión nueva del modelo de reglas
+def train_rule_model(db: Session, miner=None):
+    """
+    Mina las reglas fuera del camino del request, las guarda como versión nueva y las publica en memoria.
+    miner() reemplaza a mine_rules(db) (por ejemplo, para minar en un pool de procesos).
+    Las llamadas que llegan con un entrenamiento en curso en este proceso esperan y reciben ese mismo modelo.
+    """
+    return single_flight.do(TRAIN_FLIGHT, lambda: _train_rule_model(db, miner))
+
+def _train_rule_model(db: Session, miner=None):
+    with recommendation_model.training_lock:
+        inicio = time.perf_counter()
+        rules_df, itemsets_df, num_transacciones = miner() if miner else mine_rules(db)
+
+        modelo = recommendation_model.save_model(
+            db, rules_df, num_transacciones, duracion_segundos=time.perf_counter() - inicio, itemsets=itemsets_df
+        )
+        model = recommendation_model.RuleModel(
+            modelo.version, rules_df, modelo.fecha_creacion, modelo.num_transacciones, itemsets=itemsets_df
+        )
+        recommendation_model.swap_active_model(model)
+        return model
+
+# Función para obtener los combos que suelen comprarse junto con un producto
+def get_bundles_for_product(db: Session, product_id: int, max_bundles: int = 5, model=None):
+    """
+    Devuelve los combos (conjuntos frecuentes de 2 a 4 productos) que contienen el producto,
+    de mayor a menor soporte, con sus productos y el precio del combo completo.
+    Salen de los conjuntos guardados con el modelo de reglas: no se mina nada en el request.
+    """
+    if getattr(model, "bundles", None) is None:
+        model = recommendation_model.get_rule_model(db)
+    
+    cache_key = recommendation_cache.bundle_key(product_id, max_bundles)
+    cached = recommendation_cache.get(cache_key, model)
+    if cached is not None:
+        return cached
+    
+    if not product_hydration.get_product(db, product_id):
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    
+    # Se piden algunos combos de más por si alguno incluye productos que ya no existen
+    bundles = model.bundles.bundles_for(product_id, max_bundles * 2) if model is not None else []
+    products = {
+        p["id"]: p for p in product_hydration.hydrate_products(db, [pid for items, _ in bundles for pid in items])
+    }
+    
+    result = []
+    for items, support in bundles:
+        if not all(pid in products for pid in items):
+            continue
+        result.append({
+            "productos": [products[pid] for pid in items],
+            "soporte": support,
+            "precio_total": float(sum(products[pid]["precio_venta"] or 0 for pid in items)),
+        })
+        if len(result) >= max_bundles:
+            break
+    
+    recommendation_cache.put(cache_key, model, result)
+    return result
 
 # Función alternativa para obtener recomendaciones por categoría
 def get_recommendations_by_category(db: Session, product_id: int, max_recommendations: int = 4):
@@ -151,158 +245,126 @@ def get_recommendations_by_category(db: Session, product_id: int, max_recommenda
     Genera recomendaciones basadas en la categoría del producto
     Útil cuando no hay suficientes datos para el algoritmo Apriori
     """
+    # Obtener el producto actual
+    product = product_hydration.get_product(db, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    
     try:
-        # Obtener el producto actual
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if not product:
-            raise HTTPException(status_code=404, detail="Producto no encontrado")
-        
-        # Obtener otros productos de la misma categoría
-        similar_products = db.query(Product).filter(
-            Product.id_categoria == product.id_categoria,
-            Product.id != product_id,
-            Product.estado == 'activo'  # Asumiendo que los productos tienen un campo 'estado'
-        ).limit(max_recommendations).all()
+        recommended_ids = _category_fallback_ids(db, product, max_recommendations, exclude={product_id})
+        return product_hydration.hydrate_products(db, recommended_ids)
         
-        # Si no hay suficientes productos en la misma categoría, obtener productos populares
-        if len(similar_products) < max_recommendations:
-            # Complementar con productos de otras categorías (los más vendidos)
-            popular_products = db.query(Product, db.func.count(DetalleVenta.id_producto).label('count'))\
-                .join(DetalleVenta, DetalleVenta.id_producto == Product.id)\
-                .filter(Product.id != product_id)\
-                .filter(Product.id_categoria != product.id_categoria)\
-                .group_by(Product.id)\
-                .order_by(db.desc('count'))\
-                .limit(max_recommendations - len(similar_products))\
-                .all()
-            
-            # Agregar productos populares a la lista
-            similar_products.extend([p[0] for p in popular_products])
-        
-        # Formatear la respuesta
-        recommendations = []
-        for p in similar_products:
-            recommendations.append({
-                "id": p.id,
-                "nombre": p.nombre,
-                "precio_venta": p.precio_venta,
-                "imagen": p.imagen,
-                "id_categoria": p.id_categoria
-            })
-        
-        return recommendations
-        
-    except HTTPException:
-        raise
     except Exception as e:
         print(f"Error en get_recommendations_by_category: {str(e)}")
         print(traceback.format_exc())
         
         # En caso de error, intentar devolver algunos productos aleatorios
         try:
-            random_products = db.query(Product).filter(
-                Product.id != product_id
-            ).order_by(db.func.random()).limit(max_recommendations).all()
-            
-            return [{
-                "id": p.id,
-                "nombre": p.nombre,
-                "precio_venta": p.precio_venta,
-                "imagen": p.imagen,
-                "id_categoria": p.id_categoria
-            } for p in random_products]
-            
+            return product_hydration.hydrate_products(
+                db, _random_candidates(db, max_recommendations, exclude={product_id})
+            )
         except:
             return []  # Si todo falla, devolver lista vacía
 
 # Función para obtener recomendaciones basadas en el carrito actual
-def get_recommendations_for_cart(db: Session, cart_item_ids: list, max_recommendations: int = 4):
+def get_recommendations_for_cart(db: Session, cart_item_ids: list, max_recommendations: int = 4, model=None):
     """
     Genera recomendaciones basadas en los productos que ya están en el carrito
     """
     try:
-        if not cart_item_ids:
-            # Si el carrito está vacío, devolver productos populares
-            popular_products = db.query(Product, db.func.count(DetalleVenta.id_producto).label('count'))\
-                .join(DetalleVenta, DetalleVenta.id_producto == Product.id)\
-                .group_by(Product.id)\
-                .order_by(db.desc('count'))\
-                .limit(max_recommendations)\
-                .all()
-                
-            return [{
-                "id": p[0].id,
-                "nombre": p[0].nombre,
-                "precio_venta": p[0].precio_venta,
-                "imagen": p[0].imagen,
-                "id_categoria": p[0].id_categoria
-            } for p in popular_products]
+        # Obtener el índice de reglas del modelo precalculado (nunca se minan durante el request)
+        if model is None:
+            model = recommendation_model.get_active_model(db)
         
-        # Obtener las reglas de asociación
-        rules_df = _generate_association_rules(db)
+        # Respuesta ya calculada para el mismo conjunto de productos con el mismo modelo y catálogo
+        cache_key = recommendation_cache.cart_key(cart_item_ids, max_recommendations)
+        cached = recommendation_cache.get(cache_key, model)
+        if cached is not None:
+            return cached
         
-        if rules_df.empty:
+        if not cart_item_ids:
+            # Si el carrito está vacío, devolver productos populares
+            recommendations = product_hydration.hydrate_products(db, _popular_candidates(db, max_recommendations))
+        elif model is None or len(model.index) == 0:
             # Si no hay suficientes datos para reglas, usar el algoritmo más simple
-            return get_diverse_recommendations(db, cart_item_ids, max_recommendations)
+            recommendations = get_diverse_recommendations(db, cart_item_ids, max_recommendations)
+        else:
+            recommendations = _rule_based_cart_recommendations(db, model, cart_item_ids, max_recommendations)
         
-        # Para cada producto en el carrito, encontrar productos recomendados
-        all_recommendations = []
-        recommended_ids = set()
+        recommendation_cache.put(cache_key, model, recommendations)
+        return recommendations
         
-        for product_id in cart_item_ids:
-            # Filtrar reglas donde el producto actual está en los antecedentes
-            product_rules = rules_df[rules_df['antecedents'].apply(lambda x: product_id in x)]
-            
-            if not product_rules.empty:
-                # Ordenar por la métrica lift (mayor relevancia)
-                product_rules = product_rules.sort_values('lift', ascending=False)
-                
-                # Extraer los IDs de productos recomendados
-                for _, row in product_rules.iterrows():
-                    for rec_id in row['consequents']:
-                        if rec_id not in cart_item_ids and rec_id not in recommended_ids:
-                            recommended_ids.add(rec_id)
-                            all_recommendations.append(rec_id)
-                            if len(all_recommendations) >= max_recommendations:
-                                break
-                    if len(all_recommendations) >= max_recommendations:
-                        break
+    except Exception as e:
+        print(f"Error en get_recommendations_for_cart: {str(e)}")
+        print(traceback.format_exc())
+        # En caso de error, devolver recomendaciones alternativas
+        return get_diverse_recommendations(db, cart_item_ids, max_recommendations)
+
+# Función para recomendar a partir de las reglas de los productos del carrito
+def _rule_based_cart_recommendations(db: Session, model, cart_item_ids: list, max_recommendations: int):
+    # Un acceso al índice por producto del carrito y un merge de las listas ordenadas
+    all_recommendations = model.index.recommend(
+        cart_item_ids, exclude=cart_item_ids, max_recommendations=max_recommendations
+    )
+    
+    # Si no tenemos suficientes recomendaciones, complementar con productos diversos
+    if len(all_recommendations) < max_recommendations:
+        all_recommendations += _diverse_candidates(
+            db,
+            cart_item_ids,
+            max_recommendations - len(all_recommendations),
+            exclude={*cart_item_ids, *all_recommendations}
+        )
+    
+    # Obtener los detalles completos de los productos recomendados
+    return product_hydration.hydrate_products(db, all_recommendations[:max_recommendations])
+
+# Función para obtener recomendaciones personalizadas para un cliente
+def get_personalized_recommendations(db: Session, user_id: int, cart_item_ids: list, max_recommendations: int = 4, model=None):
+    """
+    Alterna las reglas del carrito con los candidatos precalculados del cliente (según lo que compró).
+    Si la personalización está desactivada o el cliente no tiene historial, son las recomendaciones del carrito.
+    """
+    store = personalization.get_store()
+    personal = store.candidates(user_id) if store is not None else []
+    if not personal:
+        return get_recommendations_for_cart(db, cart_item_ids, max_recommendations, model=model)
+    
+    try:
+        if model is None:
+            model = recommendation_model.get_active_model(db)
+        
+        cache_key = recommendation_cache.personal_key(user_id, cart_item_ids, max_recommendations, store.version)
+        cached = recommendation_cache.get(cache_key, model)
+        if cached is not None:
+            return cached
+        
+        rules = []
+        if model is not None and cart_item_ids:
+            rules = model.index.recommend(cart_item_ids, exclude=cart_item_ids, max_recommendations=max_recommendations)
+        
+        recommended_ids = []
+        seen = set(cart_item_ids)
+        for rec_id in (rec_id for pair in zip_longest(rules, personal) for rec_id in pair if rec_id is not None):
+            if rec_id in seen:
+                continue
+            seen.add(rec_id)
+            recommended_ids.append(rec_id)
+            if len(recommended_ids) >= max_recommendations:
+                break
         
         # Si no tenemos suficientes recomendaciones, complementar con productos diversos
-        if len(all_recommendations) < max_recommendations:
-            diverse_recs = get_diverse_recommendations(
-                db, 
-                cart_item_ids, 
-                max_recommendations - len(all_recommendations)
-            )
-            
-            # Agregar solo los que no están ya recomendados
-            for rec in diverse_recs:
-                if rec['id'] not in recommended_ids and rec['id'] not in cart_item_ids:
-                    all_recommendations.append(rec['id'])
-                    if len(all_recommendations) >= max_recommendations:
-                        break
-        
-        # Obtener los detalles completos de los productos recomendados
-        final_recommendations = []
-        for rec_id in all_recommendations[:max_recommendations]:
-            product = db.query(Product).filter(Product.id == rec_id).first()
-            if product:
-                final_recommendations.append({
-                    "id": product.id,
-                    "nombre": product.nombre,
-                    "precio_venta": product.precio_venta,
-                    "imagen": product.imagen,
-                    "id_categoria": product.id_categoria
-                })
+        if len(recommended_ids) < max_recommendations:
+            recommended_ids += _diverse_candidates(db, cart_item_ids, max_recommendations - len(recommended_ids), exclude=seen)
         
-        return final_recommendations
+        recommendations = product_hydration.hydrate_products(db, recommended_ids)
+        recommendation_cache.put(cache_key, model, recommendations)
+        return recommendations
         
     except Exception as e:
-        print(f"Error en get_recommendations_for_cart: {str(e)}")
+        print(f"Error en get_personalized_recommendations: {str(e)}")
         print(traceback.format_exc())
-        # En caso de error, devolver recomendaciones alternativas
-        return get_diverse_recommendations(db, cart_item_ids, max_recommendations)
+        return get_recommendations_for_cart(db, cart_item_ids, max_recommendations, model=model)
 
 # Función para obtener recomendaciones diversas 
 def get_diverse_recommendations(db: Session, exclude_ids: list, max_recommendations: int = 4):
@@ -311,63 +373,94 @@ def get_diverse_recommendations(db: Session, exclude_ids: list, max_recommendati
     Útil cuando no hay suficientes datos para el algoritmo Apriori
     """
     try:
-        # Obtener las categorías de los productos a excluir
-        exclude_categories = []
-        if exclude_ids:
-            products = db.query(Product).filter(Product.id.in_(exclude_ids)).all()
-            exclude_categories = [p.id_categoria for p in products]
-        
-        # Primero, obtener productos de categorías diferentes a las de los productos excluidos
-        diverse_products = []
-        
-        if exclude_categories:
-            diverse_query = db.query(Product)\
-                .filter(Product.id.notin_(exclude_ids))\
-                .filter(Product.id_categoria.notin_(exclude_categories))\
-                .order_by(db.func.random())\
-                .limit(max_recommendations // 2)
-                
-            diverse_products = diverse_query.all()
-        
-        # Completar con productos populares
-        remaining = max_recommendations - len(diverse_products)
-        if remaining > 0:
-            popular_query = db.query(Product, db.func.count(DetalleVenta.id_producto).label('count'))\
-                .join(DetalleVenta, DetalleVenta.id_producto == Product.id)\
-                .filter(Product.id.notin_(exclude_ids))\
-                .group_by(Product.id)\
-                .order_by(db.desc('count'))\
-                .limit(remaining)
-                
-            popular_products = [p[0] for p in popular_query.all()]
-            diverse_products.extend(popular_products)
-        
-        # Si aún no tenemos suficientes, añadir algunos productos aleatorios
-        remaining = max_recommendations - len(diverse_products)
-        if remaining > 0:
-            random_query = db.query(Product)\
-                .filter(Product.id.notin_(exclude_ids))\
-                .filter(Product.id.notin_([p.id for p in diverse_products]))\
-                .order_by(db.func.random())\
-                .limit(remaining)
-                
-            random_products = random_query.all()
-            diverse_products.extend(random_products)
-        
-        # Formatear la respuesta
-        recommendations = []
-        for p in diverse_products:
-            recommendations.append({
-                "id": p.id,
-                "nombre": p.nombre,
-                "precio_venta": p.precio_venta,
-                "imagen": p.imagen,
-                "id_categoria": p.id_categoria
-            })
-        
-        return recommendations
+        recommended_ids = _diverse_candidates(db, exclude_ids, max_recommendations, exclude=set(exclude_ids))
+        return product_hydration.hydrate_products(db, recommended_ids)
         
     except Exception as e:
         print(f"Error en get_diverse_recommendations: {str(e)}")
         print(traceback.format_exc())
-        return []  # En caso de error, devolver lista vacía 
\ No newline at end of file
+        return []  # En caso de error, devolver lista vacía
+
+# Las funciones siguientes solo eligen ids; la hidratación se hace una vez al final de cada recomendación
+
+# Función para elegir productos de la misma categoría y completar con los más vendidos de otras
+def _category_fallback_ids(db: Session, product: dict, limit: int, exclude: set):
+    recommended_ids = _category_candidates_bulk(db, [product["id_categoria"]], limit + len(exclude))\
+        .get(product["id_categoria"], [])
+    recommended_ids = [pid for pid in recommended_ids if pid not in exclude][:limit]
+    
+    # Si no hay suficientes productos en la misma categoría, complementar con los más vendidos de otras
+    if len(recommended_ids) < limit:
+        recommended_ids += _popular_candidates(
+            db, limit - len(recommended_ids),
+            exclude=exclude | set(recommended_ids),
+            exclude_categories=[product["id_categoria"]]
+        )
+    return recommended_ids
+
+# Función para obtener los productos activos de varias categorías
+def _category_candidates_bulk(db: Session, categories, per_category: int):
+    """
+    Devuelve {id_categoria: [ids activos]} con a lo sumo per_category ids por categoría:
+    primero los más vendidos de la categoría y después el resto por id. El resto sale de la
+    copia del catálogo si está disponible; si no, de una consulta con ROW_NUMBER.
+    """
+    ranking = popularity.get_ranking(db)
+    by_category = {c: ranking.top_in_category(c, per_category) for c in categories}
+    short = {c for c, ids in by_category.items() if len(ids) < per_category}
+    if not short:
+        return by_category
+    
+    snapshot = product_hydration.get_snapshot(db)
+    if snapshot is not None:
+        rest = {c: snapshot.by_category.get(c, []) for c in short}
+    else:
+        ranked = db.query(
+            Product.id,
+            Product.id_categoria,
+            func.row_number().over(partition_by=Product.id_categoria, order_by=Product.id).label('rn')
+        ).filter(
+            Product.id_categoria.in_(short),
+            Product.estado.is_(True)
+        ).subquery()
+        rest = {}
+        for rec_id, id_categoria in db.query(ranked.c.id, ranked.c.id_categoria)\
+                .filter(ranked.c.rn <= per_category * 2)\
+                .order_by(ranked.c.id_categoria, ranked.c.rn)\
+                .all():
+            rest.setdefault(id_categoria, []).append(rec_id)
+    
+    for c in short:
+        ids = by_category[c]
+        seen = set(ids)
+        for rec_id in rest.get(c, []):
+            if len(ids) >= per_category:
+                break
+            if rec_id not in seen:
+                ids.append(rec_id)
+    return by_category
+
+# Función para obtener los ids más vendidos (ranking en memoria, sin recorrer el historial)
+def _popular_candidates(db: Session, limit: int, exclude=(), exclude_categories=()):
+    return popularity.get_ranking(db).top(limit, exclude=exclude, exclude_categories=exclude_categories)
+
+# Función para obtener ids al azar (muestreo en memoria, sin ordenar la tabla de productos)
+def _random_candidates(db: Session, limit: int, exclude=(), exclude_categories=()):
+    return product_sampler.get_sampler(db).sample(limit, exclude=exclude, exclude_categories=set(exclude_categories))
+
+# Función para elegir productos de otras categorías, populares y al azar
+def _diverse_candidates(db: Session, cart_item_ids: list, limit: int, exclude: set):
+    # Categorías de los productos del carrito
+    exclude_categories = {p["id_categoria"] for p in product_hydration.hydrate_products(db, cart_item_ids)}
+    
+    # Primero, productos de categorías diferentes a las del carrito
+    recommended_ids = []
+    if exclude_categories:
+        recommended_ids = _random_candidates(db, limit // 2, exclude=exclude, exclude_categories=exclude_categories)
+    
+    # Completar con productos populares
+    recommended_ids += _popular_candidates(db, limit - len(recommended_ids), exclude=exclude | set(recommended_ids))
+    
+    # Si aún no tenemos suficientes, añadir algunos productos aleatorios
+    recommended_ids += _random_candidates(db, limit - len(recommended_ids), exclude=exclude | set(recommended_ids))
+    return recommended_ids
@@ -0,0 +1,104 @@
+import heapq
+import sys
+import numpy as np
+import pandas as pd
+
+# Índice invertido de reglas: producto antecedente -> consecuentes ordenados
+class RuleIndex:
+    """
+    Compila las reglas de asociación en un índice por producto antecedente.
+    Cada entrada guarda sus consecuentes ya ordenados por lift y confianza, de modo que
+    un carrito de N productos se resuelve con N accesos al diccionario y un merge de N listas.
+    Los arreglos son contiguos (int32/float32) y cada producto guarda como máximo
+    `max_per_product` consecuentes, lo que acota la memoria a productos x max_per_product.
+    """
+    def __init__(self, offsets: dict, consequents: np.ndarray, lifts: np.ndarray, confidences: np.ndarray):
+        self._offsets = offsets
+        self._consequents = consequents
+        self._lifts = lifts
+        self._confidences = confidences
+
+    @classmethod
+    def from_rules(cls, rules: pd.DataFrame, max_per_product: int = 50):
+        if rules is None or rules.empty:
+            return cls({}, np.empty(0, np.int32), np.empty(0, np.float32), np.empty(0, np.float32))
+
+        # Una fila por par (antecedente, consecuente); se conserva la mejor regla de cada par
+        pairs = rules[['antecedents', 'consequents', 'lift', 'confidence']]\
+            .explode('antecedents')\
+            .explode('consequents')
+        pairs = pairs[pairs['antecedents'] != pairs['consequents']]
+        pairs = pairs.sort_values(['antecedents', 'lift', 'confidence'], ascending=[True, False, False])
+        pairs = pairs.drop_duplicates(['antecedents', 'consequents'])
+        pairs = pairs.groupby('antecedents', sort=False).head(max_per_product)
+
+        antecedents = pairs['antecedents'].to_numpy(dtype=np.int64)
+        keys, starts, counts = np.unique(antecedents, return_index=True, return_counts=True)
+        offsets = {
+            int(key): (int(start), int(start + count))
+            for key, start, count in zip(keys, starts, counts)
+        }
+        return cls(
+            offsets,
+            pairs['consequents'].to_numpy(dtype=np.int32),
+            pairs['lift'].to_numpy(dtype=np.float32),
+            pairs['confidence'].to_numpy(dtype=np.float32),
+        )
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, product_id: int):
+        return product_id in self._offsets
+
+    def lookup(self, product_id: int):
+        """
+        Devuelve (consecuentes, lift, confianza) del producto, ordenados de mayor a menor relevancia
+        """
+        bounds = self._offsets.get(product_id)
+        if bounds is None:
+            return self._consequents[:0], self._lifts[:0], self._confidences[:0]
+        start, end = bounds
+        return self._consequents[start:end], self._lifts[start:end], self._confidences[start:end]
+
+    def _entries(self, product_id: int):
+        consequents, lifts, confidences = self.lookup(product_id)
+        for rec_id, lift, confidence in zip(consequents.tolist(), lifts.tolist(), confidences.tolist()):
+            yield (-lift, -confidence, rec_id)
+
+    def recommend(self, product_ids, exclude=None, max_recommendations: int = 4):
+        """
+        Combina (k-way merge) las listas ordenadas de cada producto y devuelve los ids sin repetir
+        """
+        exclude = set(exclude or ())
+        streams = [self._entries(pid) for pid in dict.fromkeys(product_ids) if pid in self._offsets]
+        if not streams:
+            return []
+
+        recommended = []
+        seen = set(exclude)
+        for _, _, rec_id in heapq.merge(*streams):
+            if rec_id in seen:
+                continue
+            seen.add(rec_id)
+            recommended.append(rec_id)
+            if len(recommended) >= max_recommendations:
+                break
+        return recommended
+
+    def memory_bytes(self):
+        """
+        Memoria aproximada del índice: arreglos más el diccionario de offsets
+        """
+        arrays = self._consequents.nbytes + self._lifts.nbytes + self._confidences.nbytes
+        offsets = sys.getsizeof(self._offsets) + sum(
+            sys.getsizeof(key) + sys.getsizeof(bounds) for key, bounds in self._offsets.items()
+        )
+        return arrays + offsets
+
+    def stats(self):
+        return {
+            "productos": len(self._offsets),
+            "entradas": int(self._consequents.size),
+            "memoria_bytes": self.memory_bytes(),
+        }
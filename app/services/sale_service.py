@@ -3,12 +3,14 @@ from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import date, datetime
+import traceback
 
 from app.models.product import Product
 from app.models.sale import Venta
 from app.models.sale_detail import DetalleVenta  # ← import correcto
 from app.models.user import User
 from app.schemas.sale import VentaCreate
+from app.services import itemset_counts, popularity, similarity_index
 
 def generar_numero_factura(db: Session) -> str:
     """
@@ -50,6 +52,20 @@ def crear_venta(db: Session, venta_data: VentaCreate):
 
     db.commit()
     db.refresh(venta)
+
+    # Mantener al día los conteos de recomendaciones con el ticket recién completado.
+    # La venta ya está guardada: un error aquí no debe fallar el request (la sincronización la recupera)
+    product_ids = [d.id_producto for d in venta_data.detalles]
+    for name, record in (
+        ("itemset_counts", lambda: itemset_counts.record_sale(venta.id_venta, product_ids)),
+        ("popularity", lambda: popularity.record_sale(venta.id_venta, product_ids, venta.fecha_venta)),
+        ("similarity_index", lambda: similarity_index.record_sale(venta.id_venta, product_ids)),
+    ):
+        try:
+            record()
+        except Exception as e:
+            print(f"Error en sale_service.crear_venta ({name}.record_sale): {str(e)}")
+            print(traceback.format_exc())
     return venta
 
 
@@ -0,0 +1,84 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from collections import deque
+import threading
+
+from app.models.sale import Venta
+
+# Ventas recientes que se recuerdan para no contarlas dos veces (record_sale y sincronización)
+RECENT_SALES_WINDOW = 10000
+# Margen de ids que se vuelven a leer al sincronizar, por ventas que se confirman fuera de orden
+SYNC_OVERLAP = 100
+# Ids por consulta al revisar las ventas pendientes
+PENDING_BATCH_SIZE = 1000
+
+# Posición de lectura del historial para las estructuras que se actualizan venta a venta
+class SalesCursor:
+    """
+    Recuerda qué ventas ya se contaron y qué ventas quedaron pendientes por debajo de la última
+    leída. Una venta que se completa tarde conserva su id viejo, así que no la cubre la lectura
+    por id: en cada sincronización se revisan esas pendientes por clave primaria y las que ya se
+    completaron se leen aparte.
+    """
+    def __init__(self):
+        self.last_id_venta = 0
+        self._recent = deque()
+        self._recent_ids = set()
+        self._pending_ids = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, id_venta: int):
+        return id_venta in self._recent_ids
+
+    def remember(self, id_venta: int):
+        """
+        Marca la venta como contada; devuelve False si ya lo estaba
+        """
+        if id_venta in self._recent_ids:
+            return False
+        self._recent.append(id_venta)
+        self._recent_ids.add(id_venta)
+        if len(self._recent) > RECENT_SALES_WINDOW:
+            self._recent_ids.discard(self._recent.popleft())
+        self.last_id_venta = max(self.last_id_venta, id_venta)
+        return True
+
+    def begin_sync(self, db: Session):
+        """
+        Devuelve (after_id_venta, ids de ventas completadas tarde) para la próxima lectura y
+        anota las pendientes posteriores a after_id_venta. Se llama antes de leer, así una venta
+        que se completa durante la lectura queda anotada y se lee en la siguiente.
+        """
+        with self._lock:
+            after = max(self.last_id_venta - SYNC_OVERLAP, 0)
+            # Las posteriores a after las vuelve a cubrir la lectura por id
+            known = sorted(i for i in self._pending_ids if i <= after)
+            late, still_pending = [], set()
+            for start in range(0, len(known), PENDING_BATCH_SIZE):
+                rows = db.execute(select(Venta.id_venta, Venta.estado)
+                                  .where(Venta.id_venta.in_(known[start:start + PENDING_BATCH_SIZE])))
+                for id_venta, estado in rows:
+                    if estado == 'pendiente':
+                        still_pending.add(id_venta)
+                    elif estado == 'completada':
+                        late.append(id_venta)
+            still_pending.update(db.scalars(select(Venta.id_venta)
+                                            .where(Venta.estado == 'pendiente', Venta.id_venta > after)))
+            self._pending_ids = still_pending
+            return after, late
+
+    def stats(self):
+        with self._lock:
+            return {"ultima_venta": self.last_id_venta, "pendientes": len(self._pending_ids)}
+
+# Función para recorrer las ventas que faltan contar
+def iter_new_sales(db: Session, cursor: SalesCursor, read):
+    """
+    read es una función de sales_history (iter_baskets, iter_sale_lines, ...): primero las ventas
+    posteriores a la última leída (menos SYNC_OVERLAP) y después las que se completaron tarde.
+    Las que ya se contaron vuelven a aparecer y se descartan con SalesCursor.remember.
+    """
+    after, late = cursor.begin_sync(db)
+    yield from read(db, after)
+    if late:
+        yield from read(db, venta_ids=late)
@@ -0,0 +1,247 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+import json
+import os
+import threading
+import numpy as np
+
+from app.core.config import settings
+from app.services.sales_history import iter_sale_dates as iter_db_sale_dates, iter_sale_export_batches, whole_sale_blocks
+
+# Exportación columnar de las líneas de ventas completadas para minería y análisis fuera de la base.
+# Un archivo Arrow IPC (sin comprimir, se puede mapear en memoria) por mes y por corrida:
+#   <sales_export_dir>/mes=AAAA-MM/part-<primer id_venta>-<último id_venta>.arrow
+# manifest.json guarda los archivos y la marca de agua (último id_venta exportado); cada corrida
+# agrega solo las ventas completadas con id mayor a la marca.
+# Una venta puede cambiar de estado después (pendiente que se completa, completada que se anula) con
+# id menor a la marca: cada archivo guarda cuántas ventas tiene y la suma de sus ids, y los meses cuyas
+# ventas completadas hasta la marca ya no coinciden con eso se vuelven a exportar enteros.
+
+MANIFEST_FILE = "manifest.json"
+COLUMNS = ["id_venta", "fecha_venta", "id_usuario", "id_producto", "cantidad", "precio_unitario", "subtotal"]
+
+_lock = threading.Lock()
+
+def _pyarrow():
+    # Está en requirements.txt, pero se importa recién acá: solo la usan la exportación y el trainer con
+    # recommendation_data_source = "exportacion"
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError as e:
+        raise RuntimeError("La exportación columnar de ventas requiere pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+def _schema(pa):
+    return pa.schema([
+        ("id_venta", pa.int64()),
+        ("fecha_venta", pa.timestamp("s")),
+        ("id_usuario", pa.int64()),
+        ("id_producto", pa.int64()),
+        ("cantidad", pa.int32()),
+        ("precio_unitario", pa.float64()),
+        ("subtotal", pa.float64()),
+    ])
+
+def _export_dir(export_dir: str = None):
+    return export_dir or settings.sales_export_dir
+
+def read_manifest(export_dir: str = None):
+    path = os.path.join(_export_dir(export_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"columnas": COLUMNS, "ultimo_id_venta": 0, "filas": 0, "archivos": [], "fecha_actualizacion": None}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_manifest(export_dir: str, manifest: dict):
+    # Se escribe aparte y se reemplaza: un lector nunca ve un manifest a medias
+    path = os.path.join(export_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+# Archivo de un mes en escritura durante una corrida
+class _MonthWriter:
+    def __init__(self, pa, export_dir: str, month: str, schema):
+        self.month = month
+        self.directory = os.path.join(export_dir, f"mes={month}")
+        os.makedirs(self.directory, exist_ok=True)
+        self.tmp_path = os.path.join(self.directory, f".part-{os.getpid()}-{threading.get_ident()}.tmp")
+        self.writer = pa.ipc.new_file(self.tmp_path, schema)
+        self.rows = 0
+        self.sales = 0
+        self.id_sum = 0
+        self.first_id = None
+        self.last_id = None
+
+    def write(self, batch, ids: np.ndarray):
+        self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+        # Las líneas de una venta son consecutivas y pueden seguir desde el bloque anterior
+        new = ids[np.concatenate([[ids[0] != self.last_id], ids[1:] != ids[:-1]])]
+        self.sales += len(new)
+        self.id_sum += int(new.sum())
+        self.first_id = int(ids[0]) if self.first_id is None else self.first_id
+        self.last_id = int(ids[-1])
+
+    def close(self):
+        self.writer.close()
+        name = f"part-{self.first_id:010d}-{self.last_id:010d}.arrow"
+        os.replace(self.tmp_path, os.path.join(self.directory, name))
+        return {
+            "archivo": f"mes={self.month}/{name}",
+            "mes": self.month,
+            "filas": self.rows,
+            "ventas": self.sales,
+            "suma_ids": self.id_sum,
+            "desde_id_venta": self.first_id,
+            "hasta_id_venta": self.last_id,
+        }
+
+    def discard(self):
+        try:
+            self.writer.close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+def _write_blocks(pa, export_dir: str, schema, blocks, writers: dict):
+    # Reparte cada bloque (ordenado por id_venta) en el archivo de su mes
+    for block in blocks:
+        months = block["fecha_venta"].astype("datetime64[M]")
+        for month in np.unique(months):
+            mask = months == month
+            batch = pa.record_batch([pa.array(block[name][mask], type=schema.field(name).type) for name in COLUMNS],
+                                    schema=schema)
+            key = str(month)
+            if key not in writers:
+                writers[key] = _MonthWriter(pa, export_dir, key, schema)
+            writers[key].write(batch, block["id_venta"][mask])
+
+# Función para calcular, por mes, cuántas ventas completadas hay hasta un id y la suma de sus ids
+def _month_fingerprints(db: Session, up_to_id_venta: int):
+    totals = {}
+    for venta_ids, fechas in iter_db_sale_dates(db):
+        mask = venta_ids <= up_to_id_venta
+        months, inverse = np.unique(fechas[mask].astype("datetime64[M]"), return_inverse=True)
+        id_sums = np.zeros(len(months), dtype=np.int64)
+        np.add.at(id_sums, inverse, venta_ids[mask])
+        for month, count, id_sum in zip(months, np.bincount(inverse, minlength=len(months)), id_sums):
+            sales, total = totals.get(str(month), (0, 0))
+            totals[str(month)] = (sales + int(count), total + int(id_sum))
+    return totals
+
+def _changed_months(db: Session, manifest: dict):
+    exported = {}
+    for entry in manifest["archivos"]:
+        sales, total = exported.get(entry["mes"], (0, 0))
+        # Los archivos de manifests anteriores no tienen la huella: su mes se vuelve a exportar una vez
+        exported[entry["mes"]] = (sales + entry.get("ventas", -1), total + entry.get("suma_ids", -1))
+    current = _month_fingerprints(db, manifest["ultimo_id_venta"])
+    return sorted(month for month in set(current) | set(exported) if current.get(month) != exported.get(month))
+
+def _month_range(month: str):
+    start = np.datetime64(month, "M")
+    return start.astype("datetime64[s]").item(), (start + 1).astype("datetime64[s]").item()
+
+# Función para agregar a la exportación las ventas completadas nuevas
+def export_sales(db: Session, export_dir: str = None, batch_size: int = 50000):
+    """
+    Vuelve a exportar enteros los meses cuyas ventas completadas hasta la marca de agua cambiaron y
+    lee en streaming las líneas de ventas completadas posteriores a la marca, en archivos nuevos, uno
+    por mes. Los archivos y el manifest se publican solo si la corrida termina bien; los archivos
+    reemplazados se borran después. Devuelve un resumen de la corrida.
+    """
+    pa = _pyarrow()
+    export_dir = _export_dir(export_dir)
+    with _lock:
+        os.makedirs(export_dir, exist_ok=True)
+        manifest = read_manifest(export_dir)
+        watermark = manifest["ultimo_id_venta"]
+        schema = _schema(pa)
+        changed = _changed_months(db, manifest) if watermark else []
+        rewriters, writers = {}, {}
+        try:
+            for month in changed:
+                since, until = _month_range(month)
+                _write_blocks(pa, export_dir, schema, iter_sale_export_batches(
+                    db, batch_size=batch_size, since=since, until=until, up_to_id_venta=watermark), rewriters)
+            _write_blocks(pa, export_dir, schema, iter_sale_export_batches(db, watermark, batch_size), writers)
+            rewritten = [writer.close() for writer in rewriters.values()]
+            files = [writer.close() for writer in writers.values()]
+        except Exception:
+            for writer in [*rewriters.values(), *writers.values()]:
+                writer.discard()
+            raise
+
+        replaced = [entry for entry in manifest["archivos"] if entry["mes"] in changed]
+        if files or changed:
+            kept = [entry for entry in manifest["archivos"] if entry["mes"] not in changed]
+            manifest["archivos"] = kept + rewritten + files
+            manifest["ultimo_id_venta"] = max(watermark, *(f["hasta_id_venta"] for f in files)) if files else watermark
+            manifest["filas"] = sum(entry["filas"] for entry in manifest["archivos"])
+            manifest["fecha_actualizacion"] = datetime.now().isoformat()
+            _write_manifest(export_dir, manifest)
+        # Un archivo reexportado puede tener el mismo nombre que el que reemplaza
+        current = {entry["archivo"] for entry in manifest["archivos"]}
+        for entry in replaced:
+            path = os.path.join(export_dir, entry["archivo"])
+            if entry["archivo"] not in current and os.path.exists(path):
+                os.remove(path)
+        return {
+            "archivos_nuevos": len(files),
+            "filas_nuevas": sum(f["filas"] for f in files),
+            "meses_reexportados": changed,
+            "ultimo_id_venta": manifest["ultimo_id_venta"],
+            "filas": manifest["filas"],
+        }
+
+def _open_files(export_dir: str = None, since: datetime = None):
+    pa = _pyarrow()
+    export_dir = _export_dir(export_dir)
+    first_month = f"{since:%Y-%m}" if since is not None else None
+    for entry in read_manifest(export_dir)["archivos"]:
+        if first_month and entry["mes"] < first_month:
+            continue
+        # El mapa se libera cuando ya nadie usa los datos leídos
+        yield pa.ipc.open_file(pa.memory_map(os.path.join(export_dir, entry["archivo"]), "r"))
+
+# Función para abrir los archivos exportados mapeados en memoria
+def iter_tables(export_dir: str = None, since: datetime = None):
+    """
+    Devuelve una tabla de pyarrow por archivo (sin copiar: los datos quedan en el archivo mapeado),
+    solo de los meses desde since si se indica
+    """
+    for reader in _open_files(export_dir, since):
+        yield reader.read_all()
+
+def read_table(export_dir: str = None, since: datetime = None):
+    """
+    Todas las líneas exportadas (desde since) en una sola tabla de pyarrow, para análisis
+    """
+    pa = _pyarrow()
+    tables = list(iter_tables(export_dir, since))
+    return pa.concat_tables(tables) if tables else _schema(pa).empty_table()
+
+def _iter_columns(export_dir: str, since: datetime, names):
+    # Columnas de cada bloque como arreglos NumPy sin copia, filtradas por fecha si se indica since
+    for reader in _open_files(export_dir, since):
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            columns = [batch.column(name).to_numpy() for name in names]
+            if since is not None:
+                mask = batch.column("fecha_venta").to_numpy() >= np.datetime64(since, "s")
+                columns = [column[mask] for column in columns]
+            if len(columns[0]):
+                yield columns
+
+# Mismos bloques que sales_history.iter_sale_product_pairs, leídos de la exportación
+def iter_sale_product_pairs(export_dir: str = None, since: datetime = None):
+    yield from whole_sale_blocks(_iter_columns(export_dir, since, ("id_venta", "id_producto")))
+
+# Mismos bloques que sales_history.iter_sale_dates (una fila por venta), leídos de la exportación
+def iter_sale_dates(export_dir: str = None, since: datetime = None):
+    for venta_ids, fechas in _iter_columns(export_dir, since, ("id_venta", "fecha_venta")):
+        # Las líneas de una venta son consecutivas (archivos ordenados por id_venta)
+        first = np.flatnonzero(np.concatenate([[True], venta_ids[1:] != venta_ids[:-1]]))
+        yield venta_ids[first], fechas[first].astype('datetime64[s]')
@@ -0,0 +1,153 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from datetime import datetime
+from itertools import groupby
+import numpy as np
+
+from app.models.sale import Venta
+from app.models.sale_detail import DetalleVenta
+
+# Lectura en streaming del historial de ventas completadas para procesos analíticos.
+# Todas las funciones hacen una sola consulta con cursor del lado del servidor (yield_per),
+# así que la memoria no depende del tamaño del historial.
+
+def _completed_sales_filter(after_id_venta: int = 0, since: datetime = None, venta_ids=None):
+    conditions = [Venta.estado == 'completada']
+    if after_id_venta:
+        conditions.append(Venta.id_venta > after_id_venta)
+    if venta_ids is not None:
+        conditions.append(Venta.id_venta.in_(venta_ids))
+    if since is not None:
+        # Usa el índice de venta.fecha_venta
+        conditions.append(Venta.fecha_venta >= since)
+    return conditions
+
+# Función para recorrer las canastas (id_venta, [id_producto, ...])
+def iter_baskets(db: Session, after_id_venta: int = 0, batch_size: int = 10000, venta_ids=None):
+    """
+    Devuelve cada venta completada con la lista de sus productos, ordenadas por id_venta
+    (con venta_ids, solo esas ventas).
+    En PostgreSQL agrupa con array_agg en la base; en otros motores agrupa los pares ordenados.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = select(DetalleVenta.id_venta, func.array_agg(DetalleVenta.id_producto))\
+            .join(Venta, Venta.id_venta == DetalleVenta.id_venta)\
+            .where(*_completed_sales_filter(after_id_venta, venta_ids=venta_ids))\
+            .group_by(DetalleVenta.id_venta)\
+            .order_by(DetalleVenta.id_venta)\
+            .execution_options(yield_per=batch_size)
+        for id_venta, product_ids in db.execute(stmt):
+            yield id_venta, list(product_ids)
+        return
+
+    stmt = select(DetalleVenta.id_venta, DetalleVenta.id_producto)\
+        .join(Venta, Venta.id_venta == DetalleVenta.id_venta)\
+        .where(*_completed_sales_filter(after_id_venta, venta_ids=venta_ids))\
+        .order_by(DetalleVenta.id_venta)\
+        .execution_options(yield_per=batch_size)
+    for id_venta, rows in groupby(db.execute(stmt), key=lambda row: row[0]):
+        yield id_venta, [row[1] for row in rows]
+
+# Función para recorrer los pares (id_venta, id_producto) en bloques NumPy
+def iter_sale_product_pairs(db: Session, after_id_venta: int = 0, batch_size: int = 50000, since: datetime = None,
+                            venta_ids=None):
+    """
+    Devuelve bloques (ids_venta, ids_producto) de las líneas de ventas completadas, ordenados
+    por id_venta y sin materializar objetos ORM. Cada venta queda entera en un solo bloque.
+    Con since, solo las ventas desde esa fecha; con venta_ids, solo esas ventas.
+    """
+    stmt = select(DetalleVenta.id_venta, DetalleVenta.id_producto)\
+        .join(Venta, Venta.id_venta == DetalleVenta.id_venta)\
+        .where(*_completed_sales_filter(after_id_venta, since, venta_ids))\
+        .order_by(DetalleVenta.id_venta)\
+        .execution_options(yield_per=batch_size)
+    blocks = (np.asarray(partition, dtype=np.int64).reshape(-1, 2).T for partition in db.execute(stmt).partitions())
+    yield from whole_sale_blocks(blocks)
+
+# Función para reagrupar bloques de líneas de modo que cada venta quede en uno solo
+def whole_sale_blocks(blocks):
+    """
+    Recibe bloques de columnas (ids_venta, ...) con las líneas de cada venta consecutivas. La última
+    venta de cada bloque puede seguir en el siguiente, así que se guarda y se entrega junto con ese bloque.
+    """
+    carry = None
+    for columns in blocks:
+        if carry is not None:
+            columns = [np.concatenate([previous, column]) for previous, column in zip(carry, columns)]
+        others = np.flatnonzero(columns[0] != columns[0][-1]) if len(columns[0]) else []
+        cut = int(others[-1]) + 1 if len(others) else 0
+        carry = [column[cut:] for column in columns]
+        if cut:
+            yield tuple(column[:cut] for column in columns)
+    if carry is not None and len(carry[0]):
+        yield tuple(carry)
+
+# Función para recorrer las fechas de las ventas completadas en bloques NumPy
+def iter_sale_dates(db: Session, since: datetime = None, batch_size: int = 50000):
+    """
+    Devuelve bloques (ids_venta, fechas datetime64[s]), una fila por venta (no por línea)
+    """
+    stmt = select(Venta.id_venta, Venta.fecha_venta)\
+        .where(*_completed_sales_filter(since=since))\
+        .execution_options(yield_per=batch_size)
+    for partition in db.execute(stmt).partitions():
+        yield (np.fromiter((row[0] for row in partition), dtype=np.int64, count=len(partition)),
+               np.array([row[1] for row in partition], dtype='datetime64[s]'))
+
+# Función para recorrer las líneas vendidas con su fecha (id_venta, fecha_venta, id_producto)
+def iter_sale_lines(db: Session, after_id_venta: int = 0, batch_size: int = 50000, venta_ids=None):
+    """
+    Devuelve una fila por línea de venta completada, ordenadas por id_venta (con venta_ids, solo esas ventas)
+    """
+    stmt = select(DetalleVenta.id_venta, Venta.fecha_venta, DetalleVenta.id_producto)\
+        .join(Venta, Venta.id_venta == DetalleVenta.id_venta)\
+        .where(*_completed_sales_filter(after_id_venta, venta_ids=venta_ids))\
+        .order_by(DetalleVenta.id_venta)\
+        .execution_options(yield_per=batch_size)
+    for row in db.execute(stmt):
+        yield row[0], row[1], row[2]
+
+# Función para recorrer los pares (id_usuario, id_producto) en bloques NumPy
+def iter_user_product_pairs(db: Session, batch_size: int = 50000, since: datetime = None):
+    """
+    Devuelve bloques (ids_usuario, ids_producto) de las líneas de ventas completadas:
+    qué productos compró cada cliente
+    """
+    stmt = select(Venta.id_usuario, DetalleVenta.id_producto)\
+        .join(Venta, Venta.id_venta == DetalleVenta.id_venta)\
+        .where(*_completed_sales_filter(since=since))\
+        .execution_options(yield_per=batch_size)
+    for partition in db.execute(stmt).partitions():
+        block = np.asarray(partition, dtype=np.int64).reshape(-1, 2)
+        yield block[:, 0], block[:, 1]
+
+# Función para recorrer las líneas de ventas completadas con todas sus columnas, en bloques NumPy
+def iter_sale_export_batches(db: Session, after_id_venta: int = 0, batch_size: int = 50000,
+                             since: datetime = None, until: datetime = None, up_to_id_venta: int = None):
+    """
+    Devuelve bloques {columna: arreglo} de las líneas de ventas completadas con id mayor a
+    after_id_venta, ordenadas por id_venta (para exportarlas a archivos columnares).
+    Con since/until (until excluido) y up_to_id_venta se limita a un período y a un id máximo.
+    """
+    conditions = _completed_sales_filter(after_id_venta, since)
+    if until is not None:
+        conditions.append(Venta.fecha_venta < until)
+    if up_to_id_venta is not None:
+        conditions.append(Venta.id_venta <= up_to_id_venta)
+    stmt = select(DetalleVenta.id_venta, Venta.fecha_venta, Venta.id_usuario, DetalleVenta.id_producto,
+                  DetalleVenta.cantidad, DetalleVenta.precio_unitario, DetalleVenta.subtotal)\
+        .join(Venta, Venta.id_venta == DetalleVenta.id_venta)\
+        .where(*conditions)\
+        .order_by(DetalleVenta.id_venta)\
+        .execution_options(yield_per=batch_size)
+    for partition in db.execute(stmt).partitions():
+        columns = list(zip(*partition))
+        yield {
+            "id_venta": np.asarray(columns[0], dtype=np.int64),
+            "fecha_venta": np.array(columns[1], dtype='datetime64[s]'),
+            "id_usuario": np.asarray(columns[2], dtype=np.int64),
+            "id_producto": np.asarray(columns[3], dtype=np.int64),
+            "cantidad": np.asarray(columns[4], dtype=np.int32),
+            "precio_unitario": np.asarray(columns[5], dtype=np.float64),
+            "subtotal": np.asarray(columns[6], dtype=np.float64),
+        }
@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+import threading
+import time
+import traceback
+
+from app.core.config import settings
+
+# Trabajo periódico: corre cada interval_seconds y/o cuando trigger() devuelve True
+class Job:
+    """
+    trigger() se consulta cada check_seconds; sirve para disparar por volumen (por ejemplo,
+    después de N ventas nuevas) además de, o en lugar de, por intervalo.
+    """
+    def __init__(self, name: str, func, interval_seconds: float = None, trigger=None, check_seconds: float = None,
+                 run_at_start: bool = False):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds or None
+        self.trigger = trigger
+        self.check_seconds = check_seconds or settings.scheduler_check_seconds
+        now = time.time()
+        self.next_run = now + self.interval_seconds if self.interval_seconds else None
+        if run_at_start:
+            self.next_run = now
+        self.next_check = now if trigger else None
+        self.last_run = None
+        self.last_duration = None
+        self.last_reason = None
+        self.last_error = None
+        self.runs = 0
+        self.running = False
+        self.result = None
+
+    def due_reason(self, now: float):
+        if self.running:
+            return None
+        if self.next_run is not None and now >= self.next_run:
+            return "intervalo"
+        if self.next_check is not None and now >= self.next_check:
+            self.next_check = now + self.check_seconds
+            try:
+                if self.trigger():
+                    return "disparador"
+            except Exception as e:
+                print(f"Error en el disparador de {self.name}: {str(e)}")
+                print(traceback.format_exc())
+        return None
+
+    def run(self, reason: str):
+        inicio = time.time()
+        self.last_run = inicio
+        self.last_reason = reason
+        try:
+            self.result = self.func()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error en el trabajo {self.name}: {str(e)}")
+            print(traceback.format_exc())
+        finally:
+            self.last_duration = time.time() - inicio
+            self.runs += 1
+            # Sin intervalo (por ejemplo run_at_start solo) no vuelve a correr por horario
+            self.next_run = time.time() + self.interval_seconds if self.interval_seconds else None
+            self.running = False
+
+    def status(self):
+        def fecha(ts):
+            return datetime.fromtimestamp(ts) if ts else None
+        return {
+            "nombre": self.name,
+            "intervalo_segundos": self.interval_seconds,
+            "en_curso": self.running,
+            "ejecuciones": self.runs,
+            "ultima_ejecucion": fecha(self.last_run),
+            "ultimo_motivo": self.last_reason,
+            "duracion_segundos": self.last_duration,
+            "ultimo_error": self.last_error,
+            "proxima_ejecucion": fecha(self.next_run),
+            "proxima_revision": fecha(self.next_check),
+        }
+
+# Planificador de trabajos en segundo plano (se inicia y se detiene con el lifespan de la app)
+class Scheduler:
+    """
+    Un hilo revisa cada tick_seconds qué trabajos tocan y los corre en un pool de hilos propio,
+    así nunca ocupan el event loop ni los hilos que atienden requests. Un trabajo no se vuelve
+    a lanzar mientras sigue en curso. Con lock_file, solo el worker que toma el archivo corre
+    los trabajos (uvicorn/gunicorn con varios workers en la misma máquina).
+    """
+    def __init__(self, tick_seconds: float = 1.0, max_workers: int = 2, lock_file: str = None):
+        self.tick_seconds = tick_seconds
+        self.max_workers = max_workers
+        self.lock_file = lock_file
+        self._lock_fd = None
+        self.jobs = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def register(self, name: str, func, interval_seconds: float = None, trigger=None, check_seconds: float = None,
+                 run_at_start: bool = False):
+        job = Job(name, func, interval_seconds, trigger, check_seconds, run_at_start)
+        with self._lock:
+            self.jobs[name] = job
+        return job
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _acquire_lock_file(self):
+        if not self.lock_file:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            # Sin flock (Windows): cada proceso corre sus trabajos
+            return True
+        fd = os.open(self.lock_file, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # El lock dura lo que el proceso (o hasta stop)
+        self._lock_fd = fd
+        return True
+
+    def _release_lock_file(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def start(self):
+        """
+        Devuelve False si otro worker ya tiene el lock_file y corre los trabajos
+        """
+        if self.is_running():
+            return True
+        if not self._acquire_lock_file():
+            print(f"Trabajos en segundo plano a cargo de otro worker (pid {os.getpid()} no los corre)")
+            return False
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scheduler")
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+        self._release_lock_file()
+
+    def run_now(self, name: str, reason: str = "manual"):
+        """
+        Lanza un trabajo fuera de su horario; devuelve False si ya estaba en curso
+        """
+        with self._lock:
+            job = self.jobs[name]
+            if job.running or self._executor is None:
+                return False
+            job.running = True
+        self._executor.submit(job.run, reason)
+        return True
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = time.time()
+            for job in list(self.jobs.values()):
+                reason = job.due_reason(now)
+                if reason:
+                    self.run_now(job.name, reason)
+            self._stop.wait(self.tick_seconds)
+
+    def status(self):
+        return {
+            "activo": self.is_running(),
+            "trabajos": [job.status() for job in self.jobs.values()],
+        }
+
+scheduler = Scheduler(max_workers=settings.scheduler_workers, lock_file=settings.scheduler_lock_file or None)
+
+# Trabajos que reconstruyen estructuras en memoria del proceso: corren en cada worker (sin lock_file)
+worker_scheduler = Scheduler(max_workers=1)
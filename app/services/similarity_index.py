@@ -0,0 +1,281 @@
+from sqlalchemy.orm import Session
+import heapq
+import threading
+import time
+import traceback
+import numpy as np
+
+from app.core.config import settings
+from app.services.sales_cursor import SalesCursor, iter_new_sales
+from app.services.sales_history import iter_sale_product_pairs
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+def _splitmix64(x: np.ndarray):
+    # Mezcla de bits de splitmix64: el mismo id da siempre el mismo valor, sin guardar tablas
+    z = x + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def _min_hashes(venta_ids: np.ndarray, dims: int, seed: int):
+    """
+    dims hashes de cada venta, derivados de su id (no dependen del orden de llegada)
+    """
+    keys = venta_ids.astype(np.uint64)[:, None] * np.uint64(dims) + np.arange(dims, dtype=np.uint64)
+    return _splitmix64(keys ^ np.uint64(seed))
+
+# Índice aproximado de productos comprados juntos (MinHash LSH sobre las ventas de cada producto)
+class CoPurchaseLSH:
+    """
+    Cada producto se representa por el conjunto de ventas en las que aparece y su firma MinHash
+    guarda, por cada una de bands * rows funciones hash, el menor hash de esas ventas. Agregar una
+    venta solo puede bajar los mínimos de los productos del ticket (construcción incremental).
+    Cada banda agrupa los productos con las mismas `rows` posiciones de la firma y una consulta solo
+    compara contra los productos de sus cubetas, no contra todo el catálogo. La fracción de posiciones
+    iguales estima el Jaccard, que con el número de ventas de cada producto da el coseno.
+    """
+    def __init__(self, bands: int = 32, rows: int = 1, seed: int = 17):
+        self.bands = bands
+        self.rows = rows
+        self.dims = bands * rows
+        self.seed = seed
+        self.num_transacciones = 0
+        self.sales = SalesCursor()
+        self.product_ids = []
+        self._positions = {}
+        self._signatures = np.zeros((0, self.dims), dtype=np.uint64)
+        self._keys = np.zeros((0, bands), dtype=np.uint64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._buckets = [dict() for _ in range(bands)]
+        self._lock = threading.Lock()
+
+    @property
+    def last_id_venta(self):
+        return self.sales.last_id_venta
+
+    @property
+    def version(self):
+        return f"similitud-{self.last_id_venta}"
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def __contains__(self, product_id: int):
+        return product_id in self._positions
+
+    def _position(self, product_id: int):
+        pos = self._positions.get(product_id)
+        if pos is None:
+            pos = len(self.product_ids)
+            self._positions[product_id] = pos
+            self.product_ids.append(product_id)
+        return pos
+
+    def _grow(self):
+        n = len(self.product_ids)
+        if n > len(self._signatures):
+            capacity = max(n, 2 * len(self._signatures), 64)
+            old = len(self._signatures)
+            signatures = np.full((capacity, self.dims), np.iinfo(np.uint64).max, dtype=np.uint64)
+            signatures[:old] = self._signatures
+            keys = np.zeros((capacity, self.bands), dtype=np.uint64)
+            keys[:old] = self._keys
+            counts = np.zeros(capacity, dtype=np.int64)
+            counts[:old] = self._counts
+            self._signatures, self._keys, self._counts = signatures, keys, counts
+
+    def _band_keys(self, positions: np.ndarray):
+        bands = self._signatures[positions].reshape(len(positions), self.bands, self.rows)
+        keys = bands[:, :, 0]
+        for r in range(1, self.rows):
+            keys = _splitmix64(keys ^ bands[:, :, r])
+        return keys
+
+    def _rebucket(self, positions: np.ndarray, fresh: np.ndarray):
+        new = self._band_keys(positions)
+        changed = (new != self._keys[positions]) | fresh[:, None]
+        for i, b in zip(*np.nonzero(changed)):
+            pos = int(positions[i])
+            if not fresh[i]:
+                old_key = int(self._keys[pos, b])
+                bucket = self._buckets[b].get(old_key)
+                if bucket is not None:
+                    bucket.remove(pos)
+                    if not bucket:
+                        del self._buckets[b][old_key]
+            self._buckets[b].setdefault(int(new[i, b]), []).append(pos)
+        self._keys[positions] = new
+
+    def add_pairs(self, venta_ids, product_ids):
+        """
+        Suma un bloque de líneas (ids_venta, ids_producto) con cada venta completa (como los devuelve
+        sales_history.iter_sale_product_pairs). Las líneas repetidas cuentan una vez y las ventas que
+        ya se sumaron hace poco (record_sale y sincronizaciones anteriores) se ignoran.
+        """
+        venta_ids = np.asarray(venta_ids, dtype=np.int64)
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        if len(venta_ids) == 0:
+            return
+        pairs = np.unique(np.stack([venta_ids, product_ids], axis=1), axis=0)
+        with self._lock:
+            ventas = np.unique(pairs[:, 0]).tolist()
+            repeated = [v for v in ventas if not self.sales.remember(v)]
+            if repeated:
+                pairs = pairs[~np.isin(pairs[:, 0], repeated)]
+                if len(pairs) == 0:
+                    return
+            positions = np.fromiter((self._position(int(p)) for p in pairs[:, 1]), dtype=np.int64, count=len(pairs))
+            self._grow()
+            touched = np.unique(positions)
+            fresh = self._counts[touched] == 0
+            np.minimum.at(self._signatures, positions, _min_hashes(pairs[:, 0], self.dims, self.seed))
+            np.add.at(self._counts, positions, 1)
+            self._rebucket(touched, fresh)
+            self.num_transacciones += len(ventas) - len(repeated)
+
+    def add_transaction(self, product_ids, id_venta: int):
+        product_ids = list(set(product_ids))
+        self.add_pairs([id_venta] * len(product_ids), product_ids)
+
+    def _candidates(self, pos: int):
+        candidates = set()
+        for b in range(self.bands):
+            candidates.update(self._buckets[b].get(int(self._keys[pos, b]), ()))
+        candidates.discard(pos)
+        return np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+
+    def _scored(self, pos: int):
+        """
+        (candidatos, coseno estimado) de un producto, comparando solo contra sus cubetas
+        """
+        candidates = self._candidates(pos)
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        jaccard = (self._signatures[candidates] == self._signatures[pos]).mean(axis=1)
+        a, b = self._counts[pos], self._counts[candidates]
+        # |A ∩ B| = J (|A| + |B|) / (1 + J)
+        return candidates, (jaccard * (a + b) / (1.0 + jaccard) / np.sqrt(a * b)).astype(np.float32)
+
+    def similar(self, product_id: int, k: int):
+        """
+        [(id_producto, coseno estimado)] de hasta k productos parecidos
+        """
+        with self._lock:
+            pos = self._positions.get(product_id)
+            if pos is None:
+                return []
+            candidates, scores = self._scored(pos)
+        keep = scores > 0
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(self.product_ids[c], float(s)) for c, s in zip(candidates[order], scores[order])]
+
+    def recommend(self, product_ids, exclude=None, max_recommendations: int = 4):
+        """
+        Misma interfaz que RuleIndex.recommend: productos parecidos a los dados, por coseno estimado
+        """
+        exclude = set(exclude or ())
+        best = {}
+        for product_id in dict.fromkeys(product_ids):
+            for rec_id, score in self.similar(product_id, max_recommendations + len(exclude)):
+                if rec_id not in exclude and score > best.get(rec_id, 0.0):
+                    best[rec_id] = score
+        top = heapq.nsmallest(max_recommendations, best.items(), key=lambda item: (-item[1], item[0]))
+        return [rec_id for rec_id, _ in top]
+
+    def stats(self):
+        with self._lock:
+            sizes = [len(b) for buckets in self._buckets for b in buckets.values()]
+            n = len(self.product_ids)
+            return {
+                "productos": n,
+                "ventas": self.num_transacciones,
+                "bandas": self.bands,
+                "filas_por_banda": self.rows,
+                "cubetas": len(sizes),
+                "cubeta_promedio": float(np.mean(sizes)) if sizes else 0.0,
+                "cubeta_maxima": max(sizes) if sizes else 0,
+                "memoria_bytes": int(self._signatures[:n].nbytes + self._keys[:n].nbytes + self._counts[:n].nbytes),
+            }
+
+# Mismo papel que RuleModel para el modo "similitud"
+class SimilarityModel:
+    def __init__(self, index: CoPurchaseLSH):
+        self.index = index
+
+    @property
+    def version(self):
+        return self.index.version
+
+    def info(self):
+        return {
+            "version": self.version,
+            "modo": "similitud",
+            "num_transacciones": self.index.num_transacciones,
+            "indice": self.index.stats(),
+        }
+
+_index = None
+_last_sync = 0.0
+_lock = threading.Lock()
+
+def _new_index():
+    return CoPurchaseLSH(settings.similarity_lsh_bands, settings.similarity_lsh_rows)
+
+# Función para construir el índice desde todo el historial
+def rebuild(db: Session):
+    """
+    Recorre una vez las líneas de ventas completadas y publica un índice nuevo
+    """
+    with _lock:
+        return _rebuild(db)
+
+def _rebuild(db: Session):
+    global _index, _last_sync
+    index = _new_index()
+    for venta_ids, product_ids in iter_new_sales(db, index.sales, iter_sale_product_pairs):
+        index.add_pairs(venta_ids, product_ids)
+    _index = index
+    _last_sync = time.monotonic()
+    return index
+
+# Función para agregar una venta recién completada
+def record_sale(id_venta: int, product_ids):
+    index = _index
+    if index is not None:
+        index.add_transaction(product_ids, id_venta)
+
+def _sync(db: Session, index: CoPurchaseLSH):
+    # Ventas de otros procesos o completadas tarde; las que ya se sumaron se descartan por id
+    for venta_ids, product_ids in iter_new_sales(db, index.sales, iter_sale_product_pairs):
+        index.add_pairs(venta_ids, product_ids)
+
+def get_index(db: Session):
+    """
+    Devuelve el índice, construyéndolo la primera vez y poniéndose al día cada
+    recommendation_incremental_sync_seconds con las ventas de otros procesos
+    """
+    global _last_sync
+    index = _index
+    if index is None:
+        with _lock:
+            if _index is None:
+                return _rebuild(db)
+            return _index
+
+    now = time.monotonic()
+    if now - _last_sync >= settings.recommendation_incremental_sync_seconds:
+        _last_sync = now
+        try:
+            _sync(db, index)
+        except Exception as e:
+            print(f"Error en similarity_index.get_index: {str(e)}")
+            print(traceback.format_exc())
+    return index
+
+def get_similarity_model(db: Session):
+    return SimilarityModel(get_index(db))
@@ -0,0 +1,66 @@
+from concurrent.futures import Future
+import threading
+
+# Coalescencia de cálculos caros: una sola ejecución por clave a la vez
+class SingleFlight:
+    """
+    Si llegan varias llamadas con la misma clave mientras una está en curso, solo la primera
+    ejecuta func(); las demás esperan su resultado (o su excepción) en lugar de repetir el trabajo.
+    Cuando termina, la siguiente llamada vuelve a ejecutar.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _counter(self, key):
+        return self._counters.setdefault(key, {"ejecuciones": 0, "coalescidas": 0, "errores": 0})
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+                self._counter(key)["ejecuciones"] += 1
+            else:
+                self._counter(key)["coalescidas"] += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                self._counter(key)["errores"] += 1
+                del self._calls[key]
+            call.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        call.set_result(result)
+        return result
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        with self._lock:
+            return {
+                str(key): {**counters, "en_curso": key in self._calls}
+                for key, counters in self._counters.items()
+            }
+
+_flights = SingleFlight()
+
+# Función para ejecutar func() una sola vez entre todas las llamadas concurrentes con la misma clave
+def do(key, func):
+    return _flights.do(key, func)
+
+def in_flight(key):
+    return _flights.in_flight(key)
+
+def stats():
+    return _flights.stats()
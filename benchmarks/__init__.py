@@ -0,0 +1,13 @@
+# Los módulos de app leen la configuración al importarse. Por defecto los benchmarks usan un
+# SQLite temporal; con DATABASE_URL se puede apuntar a un Postgres de pruebas.
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'pos_benchmark.db')}")
+os.environ.setdefault("FRONTEND_ORIGIN", "http://localhost:5173")
+os.environ.setdefault("secret_key", "benchmark")
+os.environ.setdefault("stripe_secret_key", "benchmark")
+os.environ.setdefault("stripe_publishable_key", "benchmark")
+
+# app.db debe importarse antes que cualquier modelo para evitar la importación circular con app.db.base
+import app.db.base  # noqa: E402,F401
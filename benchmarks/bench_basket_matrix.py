@@ -0,0 +1,55 @@
+"""
+Compara la matriz de canastas densa (pandas, fila por fila) contra la matriz CSR dispersa.
+
+Uso:
+    python -m benchmarks.bench_basket_matrix --tickets 100000 1000000 --products 2000
+"""
+import argparse
+import pandas as pd
+
+from app.services.basket_matrix import build_basket_matrix
+from benchmarks.common import measure
+from benchmarks.synthetic import synthetic_pairs
+
+
+def dense_basket(venta_ids, product_ids):
+    # Implementación anterior de _generate_association_rules
+    transactions = pd.Series(product_ids).groupby(venta_ids).apply(lambda s: list(set(s))).tolist()
+    all_products = set()
+    for t in transactions:
+        all_products.update(t)
+    basket = pd.DataFrame(0, index=range(len(transactions)), columns=list(all_products))
+    for i, t in enumerate(transactions):
+        basket.loc[i, t] = 1
+    return basket
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--dense-tickets", type=int, default=2000,
+                        help="tamaño para medir la versión densa (crece con ventas x productos)")
+    args = parser.parse_args()
+
+    print(f"{'método':<10}{'tickets':>10}{'líneas':>12}{'tiempo_s':>11}{'pico_MB':>10}{'matriz_MB':>11}")
+
+    venta_ids, product_ids = synthetic_pairs(args.dense_tickets, args.products)
+    basket, elapsed, peak = measure(lambda: dense_basket(venta_ids, product_ids))
+    dense_mb = basket.memory_usage(index=False).sum() / 1e6
+    print(f"{'densa':<10}{args.dense_tickets:>10}{len(venta_ids):>12}{elapsed:>11.2f}{peak / 1e6:>10.1f}{dense_mb:>11.1f}")
+
+    for num_tickets in args.tickets:
+        venta_ids, product_ids = synthetic_pairs(num_tickets, args.products)
+        basket, elapsed, peak = measure(lambda: build_basket_matrix([(venta_ids, product_ids)]))
+        print(f"{'csr':<10}{num_tickets:>10}{len(venta_ids):>12}{elapsed:>11.2f}{peak / 1e6:>10.1f}{basket.nbytes() / 1e6:>11.1f}")
+
+        pairs, elapsed, peak = measure(basket.pair_counts)
+        print(f"{'pares':<10}{num_tickets:>10}{pairs.nnz:>12}{elapsed:>11.2f}{peak / 1e6:>10.1f}{'':>11}")
+
+        estimated_dense = num_tickets * len(basket.product_ids) * 8 / 1e6
+        print(f"{'densa(est)':<10}{num_tickets:>10}{'':>12}{'':>11}{'':>10}{estimated_dense:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compara los motores de reglas (apriori, fpgrowth, pairwise) sobre canastas sintéticas:
+tiempo, pico de memoria y coincidencia del top-k por producto contra apriori.
+
+Uso:
+    python -m benchmarks.bench_mining_engines --tickets 20000 --products 500 --min-support 0.005
+"""
+import argparse
+import numpy as np
+
+from app.services.basket_matrix import build_basket_matrix
+from app.services.mining_engines import ENGINES
+from app.services.rule_index import RuleIndex
+from benchmarks.common import measure
+from benchmarks.synthetic import synthetic_pairs
+
+
+def top_k_overlap(reference: RuleIndex, candidate: RuleIndex, product_ids, k: int):
+    """
+    Promedio de |top-k referencia ∩ top-k candidato| / k sobre los productos con reglas en la referencia
+    """
+    overlaps = []
+    for pid in product_ids:
+        expected = reference.recommend([pid], exclude={pid}, max_recommendations=k)
+        if not expected:
+            continue
+        got = candidate.recommend([pid], exclude={pid}, max_recommendations=k)
+        overlaps.append(len(set(expected) & set(got)) / len(expected))
+    return float(np.mean(overlaps)) if overlaps else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--min-support", type=float, default=0.005)
+    parser.add_argument("--min-confidence", type=float, default=0.1)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES))
+    args = parser.parse_args()
+
+    basket = build_basket_matrix([synthetic_pairs(args.tickets, args.products)])
+    print(f"canastas={len(basket)} productos={len(basket.product_ids)} "
+          f"min_support={args.min_support} min_confidence={args.min_confidence}")
+    print(f"{'motor':<10}{'tiempo_s':>10}{'pico_MB':>10}{'reglas':>10}{f'top{args.k}_vs_apriori':>18}")
+
+    indexes = {}
+    for name in args.engines:
+        (rules, _), elapsed, peak = measure(lambda: ENGINES[name](basket, args.min_support, args.min_confidence))
+        indexes[name] = RuleIndex.from_rules(rules)
+        overlap = ""
+        if "apriori" in indexes:
+            overlap = f"{top_k_overlap(indexes['apriori'], indexes[name], basket.product_ids.tolist(), args.k):.3f}"
+        print(f"{name:<10}{elapsed:>10.2f}{peak / 1e6:>10.1f}{len(rules):>10}{overlap:>18}")
+
+
+if __name__ == "__main__":
+    main()
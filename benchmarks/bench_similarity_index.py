@@ -0,0 +1,94 @@
+"""
+Mide el índice aproximado de productos comprados juntos (MinHash LSH) contra el coseno exacto:
+tiempo de construcción, costo de agregar ventas una a una, latencia p50/p99 de consulta,
+candidatos comparados por consulta y recall@k respecto de los k vecinos exactos.
+
+Uso:
+    python -m benchmarks.bench_similarity_index --tickets 200000 --products 20000 --configs 32x1 64x1 32x2
+"""
+import argparse
+import time
+import numpy as np
+
+from app.services.basket_matrix import build_basket_matrix
+from app.services.personalization import ItemSimilarity
+from app.services.similarity_index import CoPurchaseLSH
+from benchmarks.common import measure
+from benchmarks.synthetic import synthetic_pairs
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def parse_config(text: str):
+    bands, rows = text.lower().split("x")
+    return int(bands), int(rows)
+
+
+def exact_neighbors(venta_ids, product_ids, k: int):
+    # Coseno exacto sobre la matriz ventas x productos (la misma similitud que aproxima el índice)
+    basket = build_basket_matrix([(venta_ids, product_ids)])
+    return ItemSimilarity.from_user_items(basket.matrix, basket.product_ids, neighbors=k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=200_000)
+    parser.add_argument("--products", type=int, default=20_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--incremental", type=int, default=5000,
+                        help="ventas finales que se agregan una a una para medir record_sale")
+    parser.add_argument("--configs", nargs="+", default=["16x1", "32x1", "64x1", "32x2"],
+                        help="bandas x filas por banda")
+    args = parser.parse_args()
+
+    venta_ids, product_ids = synthetic_pairs(args.tickets, args.products)
+    print(f"{len(venta_ids)} líneas, {args.tickets} tickets, {args.products} productos")
+
+    exact, elapsed, _ = measure(lambda: exact_neighbors(venta_ids, product_ids, args.k), trace_memory=False)
+    print(f"coseno exacto (todos los pares): {elapsed:.2f} s")
+
+    rng = np.random.default_rng(11)
+    queries = rng.choice(exact.product_ids, size=min(args.queries, len(exact.product_ids)), replace=False).tolist()
+    truth = {pid: {rec for rec, _ in exact.similar(pid, args.k)} for pid in queries}
+
+    cutoff = args.tickets - args.incremental
+    base = venta_ids <= cutoff
+    tail_ventas = np.unique(venta_ids[~base])
+
+    print(f"{'config':<8}{'build_s':>9}{'add_us':>9}{'p50_ms':>9}{'p99_ms':>9}{'cand':>8}{'recall@k':>10}{'MB':>8}")
+    for config in args.configs:
+        bands, rows = parse_config(config)
+        index = CoPurchaseLSH(bands, rows)
+        inicio = time.perf_counter()
+        index.add_pairs(venta_ids[base], product_ids[base])
+        build = time.perf_counter() - inicio
+
+        order = np.argsort(venta_ids[~base], kind="stable")
+        tail_pids = product_ids[~base][order]
+        bounds = np.searchsorted(venta_ids[~base][order], tail_ventas, side="left").tolist() + [len(tail_pids)]
+        inicio = time.perf_counter()
+        for i, id_venta in enumerate(tail_ventas.tolist()):
+            index.add_transaction(tail_pids[bounds[i]:bounds[i + 1]].tolist(), id_venta)
+        add = (time.perf_counter() - inicio) / max(len(tail_ventas), 1)
+
+        latencies, candidates, hits, total = [], [], 0, 0
+        for pid in queries:
+            inicio = time.perf_counter()
+            found = index.similar(pid, args.k)
+            latencies.append(time.perf_counter() - inicio)
+            candidates.append(len(index._candidates(index._positions[pid])) if pid in index else 0)
+            expected = truth[pid]
+            hits += len(expected & {rec for rec, _ in found})
+            total += len(expected)
+        p50, p99 = percentiles(latencies)
+        memoria = index.stats()["memoria_bytes"] / 1e6
+        print(f"{config:<8}{build:>9.2f}{add * 1e6:>9.1f}{p50:>9.3f}{p99:>9.3f}{np.mean(candidates):>8.0f}"
+              f"{hits / max(total, 1):>10.3f}{memoria:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import time
+import tracemalloc
+
+
+def measure(fn, trace_memory: bool = True):
+    """
+    Ejecuta fn y devuelve (resultado, segundos, pico de memoria en bytes según tracemalloc).
+    El tiempo se toma sin tracemalloc, que encarece mucho el código Python puro;
+    para la memoria se vuelve a ejecutar fn con el rastreo activo.
+    """
+    inicio = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - inicio
+    if not trace_memory:
+        return result, elapsed, 0
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
@@ -0,0 +1,118 @@
+"""
+Generadores de datos sintéticos de punto de venta para los benchmarks.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+import numpy as np
+
+from app.models.category import Category
+from app.models.product import Product
+from app.models.sale import Venta
+from app.models.sale_detail import DetalleVenta
+from app.models.user import User
+
+
+BASKET_DISTRIBUTIONS = ("geometrica", "poisson", "fija")
+
+
+def basket_sizes(rng, num_tickets: int, mean_basket: float, distribution: str = "geometrica"):
+    """
+    Tamaños de ticket (>= 1) con media aproximada mean_basket:
+    geometrica (cola larga), poisson (1 + Poisson(mean - 1)) o fija.
+    """
+    if distribution == "geometrica":
+        return rng.geometric(1.0 / mean_basket, size=num_tickets)
+    if distribution == "poisson":
+        return 1 + rng.poisson(max(mean_basket - 1.0, 0.0), size=num_tickets)
+    if distribution == "fija":
+        return np.full(num_tickets, max(int(round(mean_basket)), 1))
+    raise ValueError(f"Distribución desconocida: {distribution}. Opciones: {', '.join(BASKET_DISTRIBUTIONS)}")
+
+
+def synthetic_pairs(num_tickets: int, num_products: int, mean_basket: float = 3.0,
+                    num_bundles: int = 50, bundle_rate: float = 0.3, seed: int = 7,
+                    basket_distribution: str = "geometrica"):
+    """
+    Devuelve (ids_venta, ids_producto) con popularidad tipo Zipf y combos plantados:
+    una fracción `bundle_rate` de los tickets incluye además uno de `num_bundles` combos de 2-3 productos.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = basket_sizes(rng, num_tickets, mean_basket, basket_distribution)
+    venta_ids = np.repeat(np.arange(1, num_tickets + 1, dtype=np.int64), sizes)
+    weights = 1.0 / np.arange(1, num_products + 1)
+    product_ids = rng.choice(num_products, size=len(venta_ids), p=weights / weights.sum()) + 1
+
+    bundles = [rng.choice(num_products, size=rng.integers(2, 4), replace=False) + 1 for _ in range(num_bundles)]
+    with_bundle = np.flatnonzero(rng.random(num_tickets) < bundle_rate) + 1
+    chosen = rng.integers(0, num_bundles, size=len(with_bundle))
+    extra_ventas = np.concatenate([np.full(len(bundles[b]), v) for v, b in zip(with_bundle, chosen)] or [np.empty(0, np.int64)])
+    extra_products = np.concatenate([bundles[b] for b in chosen] or [np.empty(0, np.int64)])
+
+    return (np.concatenate([venta_ids, extra_ventas]).astype(np.int64),
+            np.concatenate([product_ids, extra_products]).astype(np.int64))
+
+
+def _insert_chunks(db, table, rows, chunk_size: int = 10000):
+    for i in range(0, len(rows), chunk_size):
+        db.execute(insert(table), rows[i:i + chunk_size])
+
+
+def populate_database(db, venta_ids, product_ids, num_products: int, num_categories: int = 20,
+                      num_users: int = 50, days: int = 365, end: datetime = None, seed: int = 7):
+    """
+    Inserta categorías, productos, usuarios y las ventas completadas dadas por los pares
+    (ids_venta, ids_producto), repartidas en orden de id a lo largo de `days` días hasta `end`.
+    Espera tablas vacías.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now()
+    precios = np.round(rng.uniform(1, 100, size=num_products), 2)
+
+    _insert_chunks(db, Category.__table__, [
+        {"id": c, "name": f"Categoría {c}"} for c in range(1, num_categories + 1)
+    ])
+    _insert_chunks(db, Product.__table__, [{
+        "id": p,
+        "nombre": f"Producto {p}",
+        "precio_compra": float(precios[p - 1]) * 0.6,
+        "precio_venta": float(precios[p - 1]),
+        "estado": True,
+        "id_categoria": (p - 1) % num_categories + 1,
+    } for p in range(1, num_products + 1)])
+    _insert_chunks(db, User.__table__, [{
+        "id": u,
+        "nombre": f"Cliente {u}",
+        "apellido": "Sintético",
+        "email": f"cliente{u}@example.com",
+        "hashed_password": "x",
+        "fecha_registro": end - timedelta(days=days),
+    } for u in range(1, num_users + 1)])
+
+    ventas = np.unique(venta_ids)
+    if len(ventas) == 0:
+        db.commit()
+        return
+    offsets = (ventas - ventas.min()) / max(ventas.max() - ventas.min(), 1) * days * 86400
+    totales = np.bincount(venta_ids, weights=precios[product_ids - 1], minlength=int(ventas.max()) + 1)
+    usuarios = rng.integers(1, num_users + 1, size=len(ventas))
+    inicio = end - timedelta(days=days)
+    _insert_chunks(db, Venta.__table__, [{
+        "id_venta": int(v),
+        "numero_factura": f"FACT-{int(v):06d}",
+        "id_usuario": int(u),
+        "fecha_venta": inicio + timedelta(seconds=float(o)),
+        "subtotal": float(totales[v]),
+        "descuento": 0,
+        "total": float(totales[v]),
+        "metodo_pago": "efectivo",
+        "estado": "completada",
+    } for v, u, o in zip(ventas, usuarios, offsets)])
+    _insert_chunks(db, DetalleVenta.__table__, [{
+        "id_venta": int(v),
+        "id_producto": int(p),
+        "cantidad": 1,
+        "precio_unitario": float(precios[p - 1]),
+        "descuento": 0,
+        "subtotal": float(precios[p - 1]),
+    } for v, p in zip(venta_ids, product_ids)])
+    db.commit()